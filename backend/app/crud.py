@@ -1,10 +1,13 @@
 from sqlalchemy .ext .asyncio import AsyncSession 
 from .import models ,schemas 
-from sqlalchemy import select ,delete 
+from sqlalchemy import select ,delete ,update 
 from sqlalchemy .exc import IntegrityError 
 from sqlalchemy .orm import selectinload 
-from typing import List ,Optional 
+from typing import Any ,List ,Optional 
 from datetime import datetime 
+from .utils .analytics_cache import mark_changed 
+from .utils .inventory_snapshots import record_snapshot 
+from .utils .sales_ingest import CLAIM_ATTEMPTS ,StockContentionError 
 
 
 async def get_category_by_name (db :AsyncSession ,name :str ,user_id :int )->Optional [models .ProductCategory ]:
@@ -63,9 +66,66 @@ quantity_before :Optional [int ]=None
     )
 
     db .add (movement )
+    await record_snapshot (db ,movement ,product .price )
     return movement 
 
 
+async def take_stock (db :AsyncSession ,product_id :int ,quantity :int )->Optional [Any ]:
+    """Atomically remove `quantity` units from a product that has at least that many in stock.
+
+    One conditional UPDATE ... RETURNING, so concurrent sales of the same product never
+    oversell or overwrite each other. Returns the product's (id, quantity, price) after
+    the update, or None when it does not exist or has too little stock.
+    """
+    p =models .Product 
+    stmt =(
+    update (p )
+    .where (p .id ==product_id ,p .quantity >=quantity )
+    .values (quantity =p .quantity -quantity )
+    .returning (p .id ,p .quantity ,p .price )
+    .execution_options (synchronize_session =False )
+    )
+    return (await db .execute (stmt )).first ()
+
+
+async def add_stock (db :AsyncSession ,product_id :int ,quantity :int )->Optional [Any ]:
+    """Atomically add `quantity` units to a product; returns its (id, quantity, price) afterwards, or None."""
+    p =models .Product 
+    stmt =(
+    update (p )
+    .where (p .id ==product_id )
+    .values (quantity =p .quantity +quantity )
+    .returning (p .id ,p .quantity ,p .price )
+    .execution_options (synchronize_session =False )
+    )
+    return (await db .execute (stmt )).first ()
+
+
+async def set_stock (db :AsyncSession ,product :models .Product ,quantity :int )->int :
+    """Set a product's quantity and return the quantity it replaced.
+
+    A compare-and-set against the quantity last seen, retried with the current one when
+    a concurrent sale or restock changed it in between, so movements computed from the
+    returned value always add up. Raises StockContentionError after CLAIM_ATTEMPTS misses.
+    """
+    p =models .Product 
+    expected =product .quantity 
+    for _ in range (CLAIM_ATTEMPTS ):
+        stmt =(
+        update (p )
+        .where (p .id ==product .id ,p .quantity ==expected )
+        .values (quantity =quantity )
+        .returning (p .id )
+        .execution_options (synchronize_session =False )
+        )
+        if (await db .execute (stmt )).first ():
+            return expected 
+        expected =(await db .execute (select (p .quantity ).where (p .id ==product .id ))).scalar ()
+        if expected is None :
+            raise ValueError ("Product not found")
+    raise StockContentionError ("Stock kept changing while the product was updated; please retry")
+
+
 async def get_product_by_sku (db :AsyncSession ,sku :str ,user_id :Optional [int ]=None )->Optional [models .Product ]:
     """Lookup a product by SKU. If user_id provided, scope lookup to that user."""
     if not sku :
@@ -101,7 +161,12 @@ async def get_products (db :AsyncSession ,skip :int =0 ,limit :int =100 ,user_id
     return result .scalars ().all ()
 
 
-async def create_product (db :AsyncSession ,product :schemas .ProductCreate )->models .Product :
+async def add_product (db :AsyncSession ,product :schemas .ProductCreate )->models .Product :
+    """Add and flush a product inside a savepoint, without committing.
+
+    A duplicate SKU only rolls back the savepoint and raises ValueError, so callers can
+    add many products in one transaction.
+    """
     data =product .model_dump ()
 
     sku =data .get ("sku")
@@ -115,19 +180,22 @@ async def create_product (db :AsyncSession ,product :schemas .ProductCreate )->m
         if result .scalars ().first ():
             raise ValueError ("SKU already exists for this user")
     db_product =models .Product (**data )
-    db .add (db_product )
     try :
-        await db .commit ()
-        await db .refresh (db_product )
+        async with db .begin_nested ():
+            db .add (db_product )
     except IntegrityError as e :
-
-        await db .rollback ()
         msg =str (e .orig )if getattr (e ,'orig',None )else str (e )
 
         if 'sku'in msg .lower ():
             raise ValueError ("SKU already exists for this user")
 
         raise ValueError (f"Database integrity error: {msg }")
+    return db_product 
+
+
+async def create_product (db :AsyncSession ,product :schemas .ProductCreate )->models .Product :
+    db_product =await add_product (db ,product )
+    await db .commit ()
 
     stmt =select (models .Product ).where (models .Product .id ==db_product .id ).options (
     selectinload (models .Product .supplier ),
@@ -137,7 +205,8 @@ async def create_product (db :AsyncSession ,product :schemas .ProductCreate )->m
     return result .scalars ().first ()
 
 
-async def create_category (db :AsyncSession ,category :schemas .ProductCategoryCreate )->models .ProductCategory :
+async def add_category (db :AsyncSession ,category :schemas .ProductCategoryCreate )->models .ProductCategory :
+    """Add and flush a category inside a savepoint, without committing (see `add_product`)."""
     data =category .model_dump ()
 
     stmt =select (models .ProductCategory ).where (models .ProductCategory .name ==data .get ('name'))
@@ -150,12 +219,10 @@ async def create_category (db :AsyncSession ,category :schemas .ProductCategoryC
 
     if data .get ('user_id')is not None :
         db_cat .user_id =data .get ('user_id')
-    db .add (db_cat )
     try :
-        await db .commit ()
-        await db .refresh (db_cat )
+        async with db .begin_nested ():
+            db .add (db_cat )
     except IntegrityError as e :
-        await db .rollback ()
         msg =str (e .orig )if getattr (e ,'orig',None )else str (e )
         if 'name'in msg .lower ():
             raise ValueError ('Category name already exists')
@@ -163,7 +230,15 @@ async def create_category (db :AsyncSession ,category :schemas .ProductCategoryC
     return db_cat 
 
 
-async def create_supplier (db :AsyncSession ,supplier :schemas .SupplierCreate )->models .Supplier :
+async def create_category (db :AsyncSession ,category :schemas .ProductCategoryCreate )->models .ProductCategory :
+    db_cat =await add_category (db ,category )
+    await db .commit ()
+    await db .refresh (db_cat )
+    return db_cat 
+
+
+async def add_supplier (db :AsyncSession ,supplier :schemas .SupplierCreate )->models .Supplier :
+    """Add and flush a supplier inside a savepoint, without committing (see `add_product`)."""
     data =supplier .model_dump ()
 
     stmt =select (models .Supplier ).where (models .Supplier .name ==data .get ('name'))
@@ -176,12 +251,10 @@ async def create_supplier (db :AsyncSession ,supplier :schemas .SupplierCreate )
 
     if data .get ('user_id')is not None :
         db_sup .user_id =data .get ('user_id')
-    db .add (db_sup )
     try :
-        await db .commit ()
-        await db .refresh (db_sup )
+        async with db .begin_nested ():
+            db .add (db_sup )
     except IntegrityError as e :
-        await db .rollback ()
         msg =str (e .orig )if getattr (e ,'orig',None )else str (e )
         if 'name'in msg .lower ():
             raise ValueError ('Supplier name already exists')
@@ -189,6 +262,13 @@ async def create_supplier (db :AsyncSession ,supplier :schemas .SupplierCreate )
     return db_sup 
 
 
+async def create_supplier (db :AsyncSession ,supplier :schemas .SupplierCreate )->models .Supplier :
+    db_sup =await add_supplier (db ,supplier )
+    await db .commit ()
+    await db .refresh (db_sup )
+    return db_sup 
+
+
 async def update_product (db :AsyncSession ,product_id :int ,updates :schemas .ProductUpdate ,user_id :Optional [int ]=None )->Optional [models .Product ]:
 
     stmt =select (models .Product ).where (models .Product .id ==product_id )
@@ -206,11 +286,6 @@ async def update_product (db :AsyncSession ,product_id :int ,updates :schemas .P
     updated_items =updates .model_dump (exclude_unset =True )
 
 
-    old_quantity =db_product .quantity 
-    new_quantity =updated_items .get ('quantity',old_quantity )
-    quantity_change =new_quantity -old_quantity 
-
-
     if 'supplier_id'in updated_items and updated_items .get ('supplier_id')is not None :
         stmt =select (models .Supplier ).where (models .Supplier .id ==updated_items .get ('supplier_id'))
         if user_id is not None :
@@ -239,6 +314,12 @@ async def update_product (db :AsyncSession ,product_id :int ,updates :schemas .P
                 raise ValueError ("SKU already exists for this user")
 
 
+    new_quantity =updated_items .pop ('quantity',None )
+    quantity_change =0 
+    if new_quantity is not None :
+        old_quantity =await set_stock (db ,db_product ,new_quantity )
+        quantity_change =new_quantity -old_quantity 
+
     for k ,v in updated_items .items ():
         setattr (db_product ,k ,v )
 
@@ -254,7 +335,8 @@ async def update_product (db :AsyncSession ,product_id :int ,updates :schemas .P
         quantity_change =quantity_change ,
         user_id =user_id ,
         reference_type ="product_edit",
-        notes =notes 
+        notes =notes ,
+        quantity_before =old_quantity 
         )
 
     db .add (db_product )
@@ -310,6 +392,7 @@ async def delete_all_products (db :AsyncSession ,user_id :Optional [int ]=None )
 
 
     await db .execute (delete (models .Product ).where (models .Product .id .in_ (product_ids )))
+    mark_changed (db ,user_id )
     await db .commit ()
     return len (product_ids )
 
@@ -14,6 +14,12 @@ engine =create_async_engine (DATABASE_URL ,echo =False ,future =True )
 async_session =async_sessionmaker (bind =engine ,expire_on_commit =False ,class_ =AsyncSession )
 Base =declarative_base ()
 
+def create_missing_indexes (conn )->None :
+    """Create indexes declared on tables that already existed (create_all skips those tables)."""
+    for table in Base .metadata .sorted_tables :
+        for index in table .indexes :
+            index .create (conn ,checkfirst =True )
+
 async def get_db ()->AsyncGenerator [AsyncSession ,None ]:
     """Async dependency that yields an AsyncSession."""
     async with async_session ()as session :
@@ -2,8 +2,11 @@ from fastapi import FastAPI ,Depends ,HTTPException
 from fastapi .middleware .cors import CORSMiddleware 
 from sqlalchemy .ext .asyncio import AsyncEngine 
 from .import crud ,models ,schemas 
-from .database import engine ,Base ,get_db 
-from .routers import products ,suppliers ,product_categories ,product_sales ,users ,restock ,analytics, email
+from .database import engine ,Base ,async_session ,get_db ,create_missing_indexes 
+from .routers import products ,suppliers ,product_categories ,product_sales ,users ,restock ,analytics ,dashboard ,email ,imports 
+from .utils .request_encoding import GzipRequestMiddleware 
+from .utils .inventory_snapshots import backfill_missing_snapshots 
+from .utils .sales_rollup import backfill_missing_rollup 
 import os 
 
 
@@ -15,6 +18,11 @@ app =FastAPI (title ="Stock Management API",debug =debug_mode )
 async def on_startup ():
     async with engine .begin ()as conn :
         await conn .run_sync (Base .metadata .create_all )
+        await conn .run_sync (create_missing_indexes )
+    async with async_session ()as db :
+        await backfill_missing_snapshots (db )
+        await backfill_missing_rollup (db )
+        await db .commit ()
 
 app .include_router (products .router )
 app .include_router (suppliers .router )
@@ -23,7 +31,11 @@ app .include_router (product_sales .router )
 app .include_router (users .router )
 app .include_router (restock .router )
 app .include_router (analytics .router )
+app .include_router (dashboard .router )
 app .include_router (email .router )
+app .include_router (imports .router )
+
+app .add_middleware (GzipRequestMiddleware )
 
 app .add_middleware (
 CORSMiddleware ,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column ,Integer ,String ,Numeric ,Text ,DateTime ,ForeignKey ,Boolean ,UniqueConstraint ,Float 
+from sqlalchemy import Column ,Integer ,String ,Numeric ,Text ,DateTime ,ForeignKey ,Boolean ,UniqueConstraint ,Float ,BigInteger ,JSON ,Date ,Index ,text 
 from sqlalchemy .sql import func 
 from sqlalchemy .orm import relationship 
 from .database import Base 
@@ -44,6 +44,8 @@ class Product (Base ):
 
     __table_args__ =(
     UniqueConstraint ('sku','user_id',name ='unique_sku_per_user'),
+    Index ('ix_products_low_stock','user_id',postgresql_where =text ('quantity <= low_stock_threshold AND quantity > 0')),
+    Index ('ix_products_out_of_stock','user_id',postgresql_where =text ('quantity = 0')),
     )
 
 
@@ -119,6 +121,91 @@ class PurchaseOrder (Base ):
     product =relationship ('Product',backref ='purchase_orders')
 
 
+    __table_args__ =(
+    Index ('ix_purchase_orders_pending','user_id','product_id',postgresql_where =text ("status = 'pending'"),
+    postgresql_include =['quantity_ordered']),
+    )
+
+
+class DailySales (Base ):
+    __tablename__ ='daily_sales'
+
+    id =Column (Integer ,primary_key =True ,index =True )
+    user_id =Column (Integer ,ForeignKey ('users.id'),nullable =False ,index =True )
+    product_id =Column (Integer ,ForeignKey ('products.id',ondelete ='CASCADE'),nullable =False ,index =True )
+    day =Column (Date ,nullable =False )
+    units =Column (Integer ,nullable =False ,default =0 )
+    revenue =Column (Numeric (16 ,2 ),nullable =False ,default =0 )
+
+
+    __table_args__ =(
+    UniqueConstraint ('user_id','product_id','day',name ='unique_daily_sales'),
+    )
+
+
+class InventorySnapshot (Base ):
+    __tablename__ ='inventory_snapshots'
+
+    id =Column (Integer ,primary_key =True ,index =True )
+    user_id =Column (Integer ,ForeignKey ('users.id'),nullable =False ,index =True )
+    product_id =Column (Integer ,ForeignKey ('products.id',ondelete ='CASCADE'),nullable =False ,index =True )
+    month =Column (Date ,nullable =False )
+    closing_quantity =Column (Integer ,nullable =False )
+    closing_value =Column (Float ,nullable =False )
+    movement_at =Column (DateTime (timezone =True ),nullable =False )
+    updated_at =Column (DateTime (timezone =True ),server_default =func .now (),onupdate =func .now ())
+
+
+    __table_args__ =(
+    UniqueConstraint ('user_id','product_id','month',name ='unique_snapshot_per_month'),
+    )
+
+
+class SalesUploadSession (Base ):
+    __tablename__ ='sales_upload_sessions'
+
+    id =Column (String (36 ),primary_key =True )
+    user_id =Column (Integer ,ForeignKey ('users.id'),nullable =False ,index =True )
+    filename =Column (String (255 ),nullable =True )
+    mode =Column (String (16 ),nullable =True )
+    product_id =Column (Integer ,nullable =True )
+    sku =Column (String (64 ),nullable =True )
+    status =Column (String (16 ),nullable =False ,default ='open')
+    header =Column (Text ,nullable =True )
+    parser =Column (JSON ,nullable =True )
+    ingested_offset =Column (BigInteger ,nullable =False ,default =0 )
+    rows_seen =Column (Integer ,nullable =False ,default =0 )
+    sales_created =Column (Integer ,nullable =False ,default =0 )
+    errors =Column (JSON ,nullable =False ,default =list )
+    error_count =Column (Integer ,nullable =False ,default =0 )
+    created_at =Column (DateTime (timezone =True ),server_default =func .now ())
+    updated_at =Column (DateTime (timezone =True ),server_default =func .now (),onupdate =func .now ())
+
+
+    user =relationship ('User',backref ='sales_upload_sessions')
+
+
+class CompletedImport (Base ):
+    __tablename__ ='completed_imports'
+
+    id =Column (Integer ,primary_key =True ,index =True )
+    user_id =Column (Integer ,ForeignKey ('users.id'),nullable =False ,index =True )
+    kind =Column (String (32 ),nullable =False )
+    content_hash =Column (String (64 ),nullable =False )
+    options =Column (String (255 ),nullable =False ,server_default ='')
+    filename =Column (String (255 ),nullable =True )
+    result =Column (JSON ,nullable =False )
+    created_at =Column (DateTime (timezone =True ),server_default =func .now ())
+
+
+    user =relationship ('User',backref ='completed_imports')
+
+
+    __table_args__ =(
+    UniqueConstraint ('user_id','kind','content_hash','options',name ='unique_import_per_user'),
+    )
+
+
 class User (Base ):
     __tablename__ ='users'
 
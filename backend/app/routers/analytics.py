@@ -1,80 +1,110 @@
 from fastapi import APIRouter ,Depends ,HTTPException 
 from sqlalchemy .ext .asyncio import AsyncSession 
-from sqlalchemy import select ,func 
+from sqlalchemy import DateTime ,select ,func ,and_ ,cast ,literal_column 
 from ..import models 
 from ..database import get_db 
 from ..security import get_current_user 
-from datetime import datetime ,timedelta 
-import calendar 
+from ..utils .analytics_cache import analytics_cache ,cached_analytics 
+from datetime import date ,datetime ,timedelta 
+from typing import Dict ,Optional 
 
 router =APIRouter (prefix ="/analytics",tags =["analytics"])
 
 
 @router .get ('/categories-revenue')
-async def categories_revenue (db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
-    """Return revenue, units sold and inventory aggregated by category for the current user."""
+@cached_analytics ('categories-revenue')
+async def categories_revenue (
+start_date :Optional [date ]=None ,
+end_date :Optional [date ]=None ,
+top :Optional [int ]=None ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user )
+):
+    """Return revenue, units sold and inventory aggregated by category for the current user.
+
+    Sales can be limited to the days `start_date`..`end_date` (inclusive) and the result to
+    the `top` categories by revenue; categories without sales are listed with zeros.
+    """
+    if start_date and end_date and start_date >end_date :
+        raise HTTPException (status_code =400 ,detail ="start_date must not be after end_date")
+    return await category_revenue_rows (db ,current_user .id ,start_date ,end_date ,top )
+
+
+async def category_revenue_rows (
+db :AsyncSession ,
+user_id :int ,
+start_date :Optional [date ]=None ,
+end_date :Optional [date ]=None ,
+top :Optional [int ]=None ,
+inventory :Optional [Dict [Optional [int ],int ]]=None 
+)->list :
+    """Rows of `categories_revenue`; pass `inventory` (units per category id) when it is already known."""
+    daily =models .DailySales 
+    p =models .Product 
+    cat =models .ProductCategory 
 
-    stmt =(
+    sales =(
     select (
-    models .ProductCategory .id .label ('category_id'),
-    models .ProductCategory .name .label ('category'),
-    func .coalesce (func .sum (models .ProductSale .sale_price *models .ProductSale .quantity ),0 ).label ('revenue'),
-    func .coalesce (func .sum (models .ProductSale .quantity ),0 ).label ('sales_units')
+    p .category_id ,
+    func .sum (daily .revenue ).label ('revenue'),
+    func .sum (daily .units ).label ('sales_units')
     )
-    .select_from (models .ProductSale )
-    .join (models .Product ,models .Product .id ==models .ProductSale .product_id )
-    .join (models .ProductCategory ,models .ProductCategory .id ==models .Product .category_id )
-    .where (models .ProductSale .user_id ==current_user .id )
-    .group_by (models .ProductCategory .id )
+    .join (p ,p .id ==daily .product_id )
+    .where (daily .user_id ==user_id )
+    .group_by (p .category_id )
     )
+    if start_date :
+        sales =sales .where (daily .day >=start_date )
+    if end_date :
+        sales =sales .where (daily .day <=end_date )
+    sales =sales .subquery ('sales')
 
-    result =await db .execute (stmt )
-    rows =result .all ()
-
-
-    inv_stmt =(
+    revenue =func .coalesce (sales .c .revenue ,0 )
+    stmt =(
     select (
-    models .ProductCategory .id .label ('category_id'),
-    func .coalesce (func .sum (models .Product .quantity ),0 ).label ('inventory')
+    cat .id .label ('category_id'),
+    cat .name .label ('category'),
+    revenue .label ('revenue'),
+    func .coalesce (sales .c .sales_units ,0 ).label ('sales_units')
     )
-    .select_from (models .Product )
-    .join (models .ProductCategory ,models .ProductCategory .id ==models .Product .category_id )
-    .where (models .Product .user_id ==current_user .id )
-    .group_by (models .ProductCategory .id )
+    .select_from (cat )
+    .outerjoin (sales ,sales .c .category_id ==cat .id )
+    .where (cat .user_id ==user_id )
+    .order_by (revenue .desc (),cat .id )
     )
-    inv_res =await db .execute (inv_stmt )
-    inv_rows ={r .category_id :int (r .inventory )for r in inv_res .all ()}
-
-    out =[]
-    for r in rows :
-        out .append ({
-        'category_id':int (r .category_id ),
-        'category':r .category ,
-        'revenue':float (r .revenue )if r .revenue is not None else 0.0 ,
-        'salesUnits':int (r .sales_units )if r .sales_units is not None else 0 ,
-        'inventory':inv_rows .get (int (r .category_id ),0 )
-        })
-
-
+    if inventory is None :
+        stock =(
+        select (p .category_id ,func .sum (p .quantity ).label ('inventory'))
+        .where (p .user_id ==user_id )
+        .group_by (p .category_id )
+        ).subquery ('inventory')
+        stmt =stmt .add_columns (func .coalesce (stock .c .inventory ,0 ).label ('inventory')).outerjoin (
+        stock ,stock .c .category_id ==cat .id 
+        )
+    if top is not None :
+        stmt =stmt .limit (max (top ,1 ))
 
-    cat_stmt =select (models .ProductCategory .id ,models .ProductCategory .name ).where (models .ProductCategory .user_id ==current_user .id )
-    cat_res =await db .execute (cat_stmt )
-    for cid ,cname in cat_res .all ():
-        if not any (item ['category_id']==cid for item in out ):
-            out .append ({
-            'category_id':int (cid ),
-            'category':cname ,
-            'revenue':0.0 ,
-            'salesUnits':0 ,
-            'inventory':inv_rows .get (int (cid ),0 )
-            })
-
-    return out 
+    return [
+    {
+    'category_id':r .category_id ,
+    'category':r .category ,
+    'revenue':float (r .revenue ),
+    'salesUnits':int (r .sales_units ),
+    'inventory':int (r .inventory )if inventory is None else inventory .get (r .category_id ,0 )
+    }
+    for r in (await db .execute (stmt )).all ()
+    ]
 
 
 @router .get ('/inventory-trend')
+@cached_analytics ('inventory-trend')
 async def inventory_trend (months :int =6 ,db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
-    """Return monthly inventory snapshots for the past `months` months (default 6)."""
+    """Return monthly inventory snapshots for the past `months` months (default 6).
+
+    Closing quantities come from the inventory_snapshots table (one row per product and
+    month with movements); months without a snapshot carry the previous one forward and
+    products never moved count with their current quantity.
+    """
     if months <1 :
         months =1 
     if months >24 :
@@ -93,57 +123,102 @@ async def inventory_trend (months :int =6 ,db :AsyncSession =Depends (get_db ),c
             y -=1 
         months_list .append ((y ,m ))
 
-    out =[]
-    sm =models .StockMovement 
+    snap =models .InventorySnapshot 
     p =models .Product 
-    ps =models .ProductSale 
-
-    for (y ,m )in months_list :
-        last_day =calendar .monthrange (y ,m )[1 ]
-        month_start =datetime (y ,m ,1 )
-        month_end =datetime (y ,m ,last_day ,23 ,59 ,59 )
+    daily =models .DailySales 
 
+    first_month =datetime (months_list [0 ][0 ],months_list [0 ][1 ],1 )
+    last_month =datetime (months_list [-1 ][0 ],months_list [-1 ][1 ],1 )
+    period_end =datetime (last_month .year +last_month .month //12 ,last_month .month %12 +1 ,1 )
 
-        subq =(
-        select (
-        sm .product_id .label ('product_id'),
-        sm .quantity_after .label ('quantity_after'),
-        func .row_number ().over (partition_by =sm .product_id ,order_by =sm .transaction_date .desc ()).label ('rn')
-        )
-        .where (sm .transaction_date <=month_end ,sm .user_id ==current_user .id )
-        ).subquery ()
-
-        latest =select (subq .c .product_id ,subq .c .quantity_after ).where (subq .c .rn ==1 ).subquery ()
+    month_series =select (
+    func .generate_series (first_month ,last_month ,literal_column ("interval '1 month'")).label ('month_start')
+    ).cte ('months')
 
+    snapshots =(
+    select (
+    snap .product_id ,
+    func .greatest (snap .month ,first_month ).label ('month_start'),
+    snap .month ,
+    snap .closing_quantity 
+    )
+    .where (snap .user_id ==current_user .id ,snap .month <=last_month )
+    ).subquery ('snapshots')
+    closing =(
+    select (snapshots .c .product_id ,snapshots .c .month_start ,snapshots .c .closing_quantity .label ('quantity_after'))
+    .distinct (snapshots .c .product_id ,snapshots .c .month_start )
+    .order_by (snapshots .c .product_id ,snapshots .c .month_start ,snapshots .c .month .desc ())
+    ).cte ('closing')
+
+    grid =(
+    select (
+    month_series .c .month_start ,
+    p .id .label ('product_id'),
+    p .price ,
+    p .quantity ,
+    closing .c .quantity_after ,
+    func .count (closing .c .quantity_after ).over (
+    partition_by =p .id ,order_by =month_series .c .month_start 
+    ).label ('run')
+    )
+    .select_from (month_series )
+    .join (p ,p .user_id ==current_user .id )
+    .outerjoin (closing ,and_ (
+    closing .c .product_id ==p .id ,
+    closing .c .month_start ==month_series .c .month_start 
+    ))
+    ).cte ('grid')
+
+    stock =select (
+    grid .c .month_start ,
+    grid .c .price ,
+    func .coalesce (
+    func .max (grid .c .quantity_after ).over (partition_by =(grid .c .product_id ,grid .c .run )),
+    grid .c .quantity 
+    ).label ('quantity')
+    ).cte ('stock')
+
+    inventory =(
+    select (
+    stock .c .month_start ,
+    func .sum (stock .c .quantity *stock .c .price ).label ('total_value'),
+    func .sum (stock .c .quantity ).label ('total_items')
+    )
+    .group_by (stock .c .month_start )
+    ).cte ('inventory')
+
+    sold =(
+    select (func .date_trunc ('month',cast (daily .day ,DateTime )).label ('month_start'),daily .units )
+    .where (daily .user_id ==current_user .id ,daily .day >=first_month ,daily .day <period_end )
+    ).subquery ('sold')
+    sales =(
+    select (sold .c .month_start ,func .sum (sold .c .units ).label ('units_sold'))
+    .group_by (sold .c .month_start )
+    ).cte ('sales')
 
-        stmt =(
-        select (
-        func .coalesce (func .sum (func .coalesce (latest .c .quantity_after ,p .quantity )*p .price ),0 ).label ('total_value'),
-        func .coalesce (func .sum (func .coalesce (latest .c .quantity_after ,p .quantity )),0 ).label ('total_items')
-        )
-        .select_from (p )
-        .outerjoin (latest ,latest .c .product_id ==p .id )
-        .where (p .user_id ==current_user .id )
-        )
-
-        res =await db .execute (stmt )
-        row =res .first ()
-        total_value =float (row .total_value )if row and row .total_value is not None else 0.0 
-        total_items =int (row .total_items )if row and row .total_items is not None else 0 
-
+    stmt =(
+    select (
+    month_series .c .month_start ,
+    func .coalesce (inventory .c .total_value ,0 ).label ('total_value'),
+    func .coalesce (inventory .c .total_items ,0 ).label ('total_items'),
+    func .coalesce (sales .c .units_sold ,0 ).label ('units_sold')
+    )
+    .select_from (month_series )
+    .outerjoin (inventory ,inventory .c .month_start ==month_series .c .month_start )
+    .outerjoin (sales ,sales .c .month_start ==month_series .c .month_start )
+    .order_by (month_series .c .month_start )
+    )
 
-        sales_stmt =(
-        select (func .coalesce (func .sum (ps .quantity ),0 ).label ('units_sold'))
-        .where (ps .user_id ==current_user .id ,ps .sale_date >=month_start ,ps .sale_date <=month_end )
-        )
-        sales_res =await db .execute (sales_stmt )
-        sold_row =sales_res .first ()
-        units_sold =int (sold_row .units_sold )if sold_row and sold_row .units_sold is not None else 0 
+    out =[]
+    for row in (await db .execute (stmt )).all ():
+        total_value =float (row .total_value )if row .total_value is not None else 0.0 
+        total_items =int (row .total_items )if row .total_items is not None else 0 
+        units_sold =int (row .units_sold )if row .units_sold is not None else 0 
 
         turnover =round ((units_sold /total_items )*100 )if total_items >0 else 0 
 
         out .append ({
-        'yearMonth':f"{y }-{m :02d}",
+        'yearMonth':f"{row .month_start .year }-{row .month_start .month :02d}",
         'totalValue':float (round (total_value ,2 )),
         'totalItems':int (total_items ),
         'unitsSold':int (units_sold ),
@@ -151,3 +226,9 @@ async def inventory_trend (months :int =6 ,db :AsyncSession =Depends (get_db ),c
         })
 
     return out 
+
+
+@router .get ('/cache')
+async def cache_stats (current_user :models .User =Depends (get_current_user )):
+    """Return hit/miss counters and the size of the analytics result cache."""
+    return analytics_cache .stats ()
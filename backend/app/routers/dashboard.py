@@ -0,0 +1,107 @@
+import asyncio 
+from datetime import date 
+from typing import Dict ,Optional 
+
+from fastapi import APIRouter ,Depends ,HTTPException 
+from sqlalchemy import and_ ,func ,select 
+
+from ..import models ,schemas 
+from ..database import async_session 
+from ..security import get_current_user 
+from ..utils .analytics_cache import cached_analytics 
+from .analytics import category_revenue_rows ,inventory_trend 
+from .product_sales import sales_summary 
+from .restock import pending_order_totals 
+
+router =APIRouter (tags =["dashboard"])
+
+WIDGETS =('restock_summary','sales_summary','categories_revenue','inventory_trend')
+
+
+async def category_stock (user_id :int )->Dict [Optional [int ],dict ]:
+    """Inventory, low-stock and out-of-stock counts per category id in one scan of the products."""
+    p =models .Product 
+    stmt =(
+    select (
+    p .category_id ,
+    func .coalesce (func .sum (p .quantity ),0 ).label ('inventory'),
+    func .count ().filter (and_ (p .quantity <=p .low_stock_threshold ,p .quantity >0 )).label ('low_stock'),
+    func .count ().filter (p .quantity ==0 ).label ('out_of_stock')
+    )
+    .where (p .user_id ==user_id )
+    .group_by (p .category_id )
+    )
+    async with async_session ()as db :
+        rows =(await db .execute (stmt )).all ()
+    return {
+    r .category_id :{'inventory':int (r .inventory ),'low_stock':r .low_stock ,'out_of_stock':r .out_of_stock }
+    for r in rows 
+    }
+
+
+@router .get ("/dashboard")
+@cached_analytics ('dashboard')
+async def dashboard (
+widgets :Optional [str ]=None ,
+months :int =6 ,
+start_date :Optional [date ]=None ,
+end_date :Optional [date ]=None ,
+top :Optional [int ]=None ,
+current_user :models .User =Depends (get_current_user )
+):
+    """Return the data of several dashboard widgets in one response.
+
+    `widgets` is a comma separated subset of restock_summary, sales_summary,
+    categories_revenue and inventory_trend (default: all). Widgets are computed
+    concurrently, each on its own session; the per-category stock scan is shared by the
+    restock summary and category revenue. `months` goes to the inventory trend and
+    `start_date`, `end_date` and `top` to category revenue.
+    """
+    wanted =WIDGETS if not widgets else tuple (dict .fromkeys (w .strip ()for w in widgets .split (',')if w .strip ()))
+    unknown =[w for w in wanted if w not in WIDGETS ]
+    if unknown :
+        raise HTTPException (status_code =400 ,detail =f"Unknown widgets: {', '.join (unknown )}")
+    if start_date and end_date and start_date >end_date :
+        raise HTTPException (status_code =400 ,detail ="start_date must not be after end_date")
+
+    user_id =current_user .id 
+    stock =None 
+    if 'restock_summary'in wanted or 'categories_revenue'in wanted :
+        stock =asyncio .ensure_future (category_stock (user_id ))
+
+    async def restock_summary ():
+        async with async_session ()as db :
+            pending_orders ,pending_value =await pending_order_totals (db ,user_id )
+        levels =(await stock ).values ()
+        return schemas .RestockSummary (
+        pending_orders =pending_orders ,
+        low_stock_items =sum (c ['low_stock']for c in levels ),
+        out_of_stock_items =sum (c ['out_of_stock']for c in levels ),
+        total_pending_value =float (pending_value )
+        )
+
+    async def categories_revenue ():
+        inventory ={cid :c ['inventory']for cid ,c in (await stock ).items ()}
+        async with async_session ()as db :
+            return await category_revenue_rows (db ,user_id ,start_date ,end_date ,top ,inventory =inventory )
+
+    async def sales ():
+        async with async_session ()as db :
+            return await sales_summary (db =db ,current_user =current_user )
+
+    async def trend ():
+        async with async_session ()as db :
+            return await inventory_trend (months =months ,db =db ,current_user =current_user )
+
+    compute ={
+    'restock_summary':restock_summary ,
+    'sales_summary':sales ,
+    'categories_revenue':categories_revenue ,
+    'inventory_trend':trend ,
+    }
+    try :
+        results =await asyncio .gather (*(compute [w ]()for w in wanted ))
+    finally :
+        if stock is not None and not stock .done ():
+            stock .cancel ()
+    return dict (zip (wanted ,results ))
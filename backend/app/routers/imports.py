@@ -0,0 +1,34 @@
+from fastapi import APIRouter ,Depends ,HTTPException ,UploadFile 
+from fastapi .responses import JSONResponse 
+from typing import List 
+from ..import models ,schemas 
+from ..security import get_current_user 
+from ..utils .import_jobs import ImportQuotaExceeded ,JobHandler ,import_jobs 
+
+router =APIRouter (prefix ="/imports",tags =["imports"])
+
+
+async def start_import_job (kind :str ,file :UploadFile ,current_user :models .User ,handler :JobHandler )->JSONResponse :
+    """Queue `handler` as a background import of `file`; responds 202 with the job id."""
+    try :
+        job =await import_jobs .submit (kind ,current_user .id ,file ,handler )
+    except ImportQuotaExceeded as exc :
+        raise HTTPException (status_code =429 ,detail =str (exc ))
+    return JSONResponse (status_code =202 ,content ={"job_id":job .id ,"status":job .status })
+
+
+@router .get ("/",response_model =List [schemas .ImportJobOut ])
+async def list_imports (current_user :models .User =Depends (get_current_user )):
+    """List the current user's recent import jobs (without their error lists)."""
+    return [job .summary (limit =0 )for job in import_jobs .for_user (current_user .id )]
+
+
+@router .get ("/{job_id}",response_model =schemas .ImportJobOut )
+async def get_import (job_id :str ,offset :int =0 ,limit :int =100 ,current_user :models .User =Depends (get_current_user )):
+    """Return status and progress of an import job with a page of its row errors."""
+    job =import_jobs .get (job_id ,current_user .id )
+    if not job :
+        raise HTTPException (status_code =404 ,detail ="Import job not found")
+    offset =max (offset ,0 )
+    limit =min (max (limit ,0 ),1000 )
+    return job .summary (offset =offset ,limit =limit )
@@ -1,11 +1,12 @@
-from fastapi import APIRouter ,Depends ,UploadFile ,File ,HTTPException 
+from fastapi import APIRouter ,Depends ,UploadFile ,File ,HTTPException ,Form 
 from sqlalchemy .ext .asyncio import AsyncSession 
 from typing import List 
 from ..import models ,schemas ,crud 
 from ..database import get_db 
 from sqlalchemy import select 
 from ..security import get_current_user 
-from ..utils .csv_upload import CSVUploadError ,read_csv_rows 
+from ..utils .csv_upload import CSVUploadError ,iter_csv_rows 
+from .imports import start_import_job 
 
 router =APIRouter (prefix ="/categories",tags =["categories"])
 
@@ -60,32 +61,51 @@ async def list_categories (db :AsyncSession =Depends (get_db ),current_user :mod
     result =await db .execute (select (models .ProductCategory ).where (models .ProductCategory .user_id ==current_user .id ))
     return result .scalars ().all ()
 
+async def _import_category_rows (db :AsyncSession ,rows ,user_id :int ,results :list )->None :
+    """Import every row in one transaction, with a savepoint per row; nothing is kept if the file is unreadable."""
+    try :
+        async for row_no ,row in rows :
+            data =dict (row )
+            data ['user_id']=user_id 
+            try :
+                c_schema =schemas .ProductCategoryCreate .model_validate (data )
+            except Exception as e :
+                results .append ({"row":row_no ,"ok":False ,"error":f"Validation error: {e }"})
+                continue 
+            try :
+                created =await crud .add_category (db ,c_schema )
+                results .append ({"row":row_no ,"ok":True ,"category_id":created .id ,"user_id":user_id })
+            except ValueError as e :
+                results .append ({"row":row_no ,"ok":False ,"error":str (e )})
+            except Exception as e :
+                results .append ({"row":row_no ,"ok":False ,"error":f"Unexpected error: {e }"})
+        await db .commit ()
+    except Exception :
+        await db .rollback ()
+        raise 
+
+
 @router .post ("/upload")
-async def upload_categories_csv (file :UploadFile =File (...),db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
-    """Upload a CSV file with category rows. Expected headers: name, description"""
+async def upload_categories_csv (file :UploadFile =File (...),background :bool =Form (False ),db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
+    """Upload a CSV file with category rows. Expected headers: name, description
+
+    With background=true the file is imported by a background job; poll GET /imports/{job_id}.
+    """
 
     user_id =current_user .id 
 
+    if background :
+        async def handler (job_db :AsyncSession ,job )->dict :
+            results =[]
+            job .watch (lambda :[r for r in results if not r ['ok']])
+            await _import_category_rows (job_db ,job .rows (),user_id ,results )
+            return {"results":results }
+        return await start_import_job ('categories',file ,current_user ,handler )
+
+    results =[]
     try :
-        rows =await read_csv_rows (file )
+        await _import_category_rows (db ,iter_csv_rows (file ),user_id ,results )
     except CSVUploadError as exc :
         raise HTTPException (status_code =400 ,detail =str (exc ))
 
-    results =[]
-    for row_no ,row in rows :
-        data =dict (row )
-        data ['user_id']=user_id 
-        try :
-            c_schema =schemas .ProductCategoryCreate .model_validate (data )
-        except Exception as e :
-            results .append ({"row":row_no ,"ok":False ,"error":f"Validation error: {e }"})
-            continue 
-        try :
-            created =await crud .create_category (db ,c_schema )
-            results .append ({"row":row_no ,"ok":True ,"category_id":created .id ,"user_id":user_id })
-        except ValueError as e :
-            results .append ({"row":row_no ,"ok":False ,"error":str (e )})
-        except Exception as e :
-            results .append ({"row":row_no ,"ok":False ,"error":f"Unexpected error: {e }"})
-
     return {"results":results }
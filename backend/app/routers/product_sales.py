@@ -1,8 +1,17 @@
 from fastapi import APIRouter ,Depends ,HTTPException ,UploadFile ,File ,Form 
 from sqlalchemy .ext .asyncio import AsyncSession 
 from typing import List ,Optional 
-from ..utils .csv_upload import CSVUploadError ,read_csv_rows 
-from datetime import datetime 
+from ..utils .csv_upload import COMPRESSED_CSV_SUFFIXES ,CSVUploadError ,is_csv_filename ,iter_csv_rows 
+from ..utils .sales_ingest import MAX_SALES_PER_REQUEST ,SalesIngestor ,StockContentionError ,record_sale_lines 
+from ..utils .sales_copy import CopySalesIngestor ,supports_copy 
+from ..utils import upload_sessions 
+from ..utils .analytics_cache import cached_analytics 
+from ..utils .parallel_reads import gather_reads 
+from ..utils import sales_timeseries as sales_timeseries_utils 
+from ..utils .sales_rollup import record_daily_sales 
+from ..utils .upload_fingerprints import duplicate_response ,find_completed_import ,fingerprint_upload ,import_options ,record_completed_import 
+from .imports import start_import_job 
+from datetime import date ,datetime ,timezone 
 from ..import models ,schemas ,crud 
 from ..database import get_db 
 from ..security import get_current_user 
@@ -21,11 +30,11 @@ product_id :int ,
 db :AsyncSession =Depends (get_db ),
 current_user :models .User =Depends (get_current_user ),
 ):
-
-    product =await db .get (models .Product ,product_id )
+    """Record a sale and take its units out of stock with one atomic conditional UPDATE."""
+    product =await crud .take_stock (db ,product_id ,sale .quantity )
     if not product :
-        raise HTTPException (status_code =404 ,detail ="Product not found")
-    if product .quantity <sale .quantity :
+        if not await db .get (models .Product ,product_id ):
+            raise HTTPException (status_code =404 ,detail ="Product not found")
         raise HTTPException (status_code =400 ,detail ="Insufficient stock")
 
     db_sale =models .ProductSale (
@@ -37,8 +46,9 @@ current_user :models .User =Depends (get_current_user ),
     )
     db .add (db_sale )
     await db .flush ()
+    await record_daily_sales (db ,[db_sale .id ])
 
-    quantity_before =product .quantity 
+    quantity_before =product .quantity +sale .quantity 
     await crud .record_stock_movement_crud (
     db =db ,
     product =product ,
@@ -51,13 +61,42 @@ current_user :models .User =Depends (get_current_user ),
     transaction_date =sale .sale_date ,
     quantity_before =quantity_before 
     )
-    product .quantity =quantity_before -sale .quantity 
 
     await db .commit ()
     await db .refresh (db_sale )
     return db_sale 
 
 
+@router .post ("/batch",response_model =schemas .ProductSaleBatchOut )
+async def record_sales_batch (
+batch :schemas .ProductSaleBatchCreate ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Record many sale line items at once (e.g. a POS sync) with per-line results.
+
+    Stock is checked for all lines together and the accepted ones are written in one
+    transaction with bulk inserts and one stock UPDATE; a line that fails (unknown
+    product, insufficient stock) does not stop the others.
+    """
+    if not batch .items :
+        raise HTTPException (status_code =400 ,detail ="No sale items provided")
+    if len (batch .items )>MAX_SALES_PER_REQUEST :
+        raise HTTPException (status_code =400 ,detail =f"At most {MAX_SALES_PER_REQUEST } sale items per request")
+
+    try :
+        results =await record_sale_lines (db ,current_user .id ,[item .model_dump ()for item in batch .items ])
+        await db .commit ()
+    except StockContentionError as exc :
+        await db .rollback ()
+        raise HTTPException (status_code =409 ,detail =str (exc ))
+    except Exception :
+        await db .rollback ()
+        raise 
+    created =sum (1 for r in results if r ['sale_id']is not None )
+    return {'sales_created':created ,'errors':len (results )-created ,'results':results }
+
+
 @router .get ("/",response_model =List [schemas .ProductSaleOut ])
 async def list_sales (db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
     stmt =select (models .ProductSale ).where (models .ProductSale .user_id ==current_user .id )
@@ -85,183 +124,333 @@ current_user :models .User =Depends (get_current_user ),
     return result .scalars ().all ()
 
 
+def _sales_ingestor (db :AsyncSession ,mode :Optional [str ],user_id :int ,product_id :Optional [int ],sku :Optional [str ])->SalesIngestor :
+    if mode =='copy':
+        return CopySalesIngestor (db ,user_id ,product_id =product_id ,sku =sku )
+    return SalesIngestor (db ,user_id ,product_id =product_id ,sku =sku )
+
+
+async def _ingest_sales (ingestor :SalesIngestor ,db :AsyncSession ,rows ,content_hash :Optional [str ]=None ,
+filename :Optional [str ]=None ,options :str ='')->dict :
+    async for row_no ,row in rows :
+        await ingestor .add_row (row_no ,row )
+    result =await ingestor .finish ()
+    response ={
+    "message":f"Successfully uploaded {result ['sales_created']} sales records",
+    **result 
+    }
+    if content_hash :
+        await record_completed_import (db ,ingestor .user_id ,'sales',content_hash ,filename ,response ,options )
+    await db .commit ()
+    return response 
+
+
 @router .post ("/upload")
 async def upload_sales_csv (
 file :UploadFile =File (...),
 product_id :Optional [int ]=Form (None ),
 sku :Optional [str ]=Form (None ),
+mode :Optional [str ]=Form (None ),
+background :bool =Form (False ),
+force :bool =Form (False ),
 db :AsyncSession =Depends (get_db ),
 current_user :models .User =Depends (get_current_user ),
 ):
+    """Upload sales rows from a CSV.
+
+    mode=copy loads validated rows through PostgreSQL COPY and merges them set-based (for large backfills).
+    With background=true the file is imported by a background job; poll GET /imports/{job_id}.
+    A file already imported by this user returns the stored result (duplicate=true) without
+    being processed again; force=true imports it anyway.
+    """
+
+    if not is_csv_filename (file .filename ):
+        raise HTTPException (status_code =400 ,detail ="File must be a CSV (.csv, .csv.gz or .csv.zst)")
+    if mode not in (None ,'bulk','copy'):
+        raise HTTPException (status_code =400 ,detail =f"Unknown upload mode '{mode }'")
+    if mode =='copy'and not supports_copy (db ):
+        raise HTTPException (status_code =400 ,detail ="COPY uploads require a PostgreSQL (asyncpg) database")
+
+    user_id =current_user .id 
+    filename =file .filename 
+    content_hash =await fingerprint_upload (file )
+    options =import_options (mode =mode ,product_id =product_id ,sku =sku )
+    previous =await find_completed_import (db ,user_id ,'sales',content_hash ,options )
+    if previous and not force :
+        return duplicate_response (previous )
+
+    if background :
+        await db .rollback ()
+
+        async def handler (job_db :AsyncSession ,job )->dict :
+            previous =await find_completed_import (job_db ,user_id ,'sales',content_hash ,options )
+            if previous and not force :
+                return duplicate_response (previous )
+            job_ingestor =_sales_ingestor (job_db ,mode ,user_id ,product_id ,sku )
+            job .watch (lambda :job_ingestor .errors )
+            return await _ingest_sales (job_ingestor ,job_db ,job .rows (),content_hash ,filename ,options )
+        return await start_import_job ('sales',file ,current_user ,handler )
 
-    if not file .filename .endswith ('.csv'):
-        raise HTTPException (status_code =400 ,detail ="File must be a CSV")
+    ingestor =_sales_ingestor (db ,mode ,user_id ,product_id ,sku )
 
     try :
-        rows =await read_csv_rows (file )
+        return await _ingest_sales (ingestor ,db ,iter_csv_rows (file ),content_hash ,filename ,options )
     except CSVUploadError as exc :
+        await db .rollback ()
         raise HTTPException (status_code =400 ,detail =str (exc ))
+    except StockContentionError as exc :
+        await db .rollback ()
+        raise HTTPException (status_code =409 ,detail =str (exc ))
+    except HTTPException :
+        raise 
+    except Exception as e :
+        await db .rollback ()
+        raise HTTPException (status_code =500 ,detail =f"Error processing CSV: {str (e )}")
 
-    sales_created =0 
-    errors :List [str ]=[]
-    total_rows =len (rows )
 
-    try :
-        for row_no ,row in rows :
-            cleaned_row ={
-            (k .strip ()if isinstance (k ,str )else k ):
-            (v .strip ()if isinstance (v ,str )else v )
-            for k ,v in row .items ()
-            }
-
-            try :
-                row_product_id =None 
-                row_sku =(
-                cleaned_row .get ('sku')
-                or cleaned_row .get ('SKU')
-                or cleaned_row .get ('Sku')
-                or cleaned_row .get ('sku_id')
-                or cleaned_row .get ('SKU_ID')
-                or cleaned_row .get ('product_sku')
-                or cleaned_row .get ('productSKU')
-                )
-                if row_sku :
-                    product_obj =await crud .get_product_by_sku (db ,row_sku ,current_user .id )
-                    if not product_obj :
-                        errors .append (f"Row {row_no }: Product with SKU '{row_sku }' not found for user")
-                        continue 
-                    row_product_id =product_obj .id 
-                elif product_id :
-                    row_product_id =product_id 
-                elif sku :
-                    product_obj =await crud .get_product_by_sku (db ,sku ,current_user .id )
-                    if not product_obj :
-                        errors .append (f"Row {row_no }: Product with SKU '{sku }' not found for user (form sku)")
-                        continue 
-                    row_product_id =product_obj .id 
-                else :
-                    errors .append (f"Row {row_no }: No SKU in CSV and no product_id/sku provided in upload request")
-                    continue 
-
-                if not cleaned_row .get ('quantity'):
-                    errors .append (f"Row {row_no }: Missing 'quantity' column")
-                    continue 
-
-                try :
-                    quantity =int (cleaned_row ['quantity'])
-                except (ValueError ,TypeError ):
-                    errors .append (f"Row {row_no }: Invalid quantity '{cleaned_row ['quantity']}' - must be a number")
-                    continue 
-
-                if quantity <=0 :
-                    errors .append (f"Row {row_no }: Quantity must be positive, got {quantity }")
-                    continue 
-
-                sale_date =None 
-                date_field =cleaned_row .get ('sale_date')or cleaned_row .get ('date')
-                if date_field :
-                    try :
-                        sale_date =datetime .fromisoformat (date_field .replace ('Z','+00:00'))
-                    except ValueError :
-                        for fmt in ('%Y-%m-%d','%m/%d/%Y','%d/%m/%Y'):
-                            try :
-                                sale_date =datetime .strptime (date_field ,fmt )
-                                break 
-                            except ValueError :
-                                continue 
-                        if sale_date is None :
-                            errors .append (f"Row {row_no }: Invalid date format '{date_field }'. Use YYYY-MM-DD format.")
-                            continue 
-
-                product =await db .get (models .Product ,row_product_id )
-                if not product :
-                    errors .append (f"Row {row_no }: Product with ID {row_product_id } not found")
-                    continue 
-
-                if product .quantity <quantity :
-                    errors .append (f"Row {row_no }: Insufficient stock (available: {product .quantity }, requested: {quantity })")
-                    continue 
-
-                db_sale =models .ProductSale (
-                product_id =row_product_id ,
-                user_id =current_user .id ,
-                quantity =quantity ,
-                sale_price =product .price ,
-                sale_date =sale_date or datetime .now ()
-                )
-                db .add (db_sale )
-                await db .flush ()
-
-                quantity_before =product .quantity 
-                await crud .record_stock_movement_crud (
-                db =db ,
-                product =product ,
-                movement_type ="sale",
-                quantity_change =-quantity ,
-                user_id =current_user .id ,
-                reference_id =db_sale .id ,
-                reference_type ="sale",
-                notes =f"CSV upload sale of {quantity } units at ${product .price } each",
-                transaction_date =sale_date ,
-                quantity_before =quantity_before 
-                )
-                product .quantity =quantity_before -quantity 
-
-                sales_created +=1 
-
-            except (ValueError ,KeyError )as e :
-                errors .append (f"Row {row_no }: Invalid data - {str (e )}")
-                continue 
-            except Exception as e :
-                errors .append (f"Row {row_no }: Unexpected error - {str (e )}")
-                continue 
 
+
+@router .post ("/upload/sessions",response_model =schemas .SalesUploadSessionOut ,status_code =201 )
+async def start_sales_upload_session (
+filename :Optional [str ]=Form (None ),
+product_id :Optional [int ]=Form (None ),
+sku :Optional [str ]=Form (None ),
+mode :Optional [str ]=Form (None ),
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Start a resumable sales upload.
+
+    Send the CSV in order with PUT /sales/upload/sessions/{session_id}/chunks (form fields
+    offset and chunk); complete records are ingested and committed as each chunk arrives.
+    After an interruption, GET the session to learn the offset to resume from. Finish with
+    POST /sales/upload/sessions/{session_id}/complete. Open sessions idle for longer than
+    UPLOAD_SESSION_TTL_HOURS (default 24) expire and their received data is deleted.
+    """
+    if filename and not is_csv_filename (filename ):
+        raise HTTPException (status_code =400 ,detail ="File must be a CSV (.csv, .csv.gz or .csv.zst)")
+    if filename and filename .lower ().endswith (COMPRESSED_CSV_SUFFIXES ):
+        raise HTTPException (status_code =400 ,detail ="Resumable uploads must be uncompressed CSV")
+    if mode not in (None ,'bulk','copy'):
+        raise HTTPException (status_code =400 ,detail =f"Unknown upload mode '{mode }'")
+    if mode =='copy'and not supports_copy (db ):
+        raise HTTPException (status_code =400 ,detail ="COPY uploads require a PostgreSQL (asyncpg) database")
+
+    await upload_sessions .expire_sessions (db )
+    session =await upload_sessions .create_session (db ,current_user .id ,filename ,mode ,product_id ,sku )
+    await db .commit ()
+    return upload_sessions .session_summary (session )
+
+
+async def _locked_upload_session (db :AsyncSession ,session_id :str ,user_id :int )->models .SalesUploadSession :
+    session =await upload_sessions .get_session (db ,session_id ,user_id ,for_update =True )
+    if not session :
+        raise HTTPException (status_code =404 ,detail ="Upload session not found")
+    return session 
+
+
+@router .get ("/upload/sessions/{session_id}",response_model =schemas .SalesUploadSessionOut )
+async def get_sales_upload_session (
+session_id :str ,
+offset :int =0 ,
+limit :int =100 ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Return progress of a resumable upload; `offset` in the response is where the next chunk starts."""
+    session =await upload_sessions .get_session (db ,session_id ,current_user .id )
+    if not session :
+        raise HTTPException (status_code =404 ,detail ="Upload session not found")
+    return upload_sessions .session_summary (session ,offset =max (offset ,0 ),limit =min (max (limit ,0 ),1000 ))
+
+
+@router .put ("/upload/sessions/{session_id}/chunks",response_model =schemas .SalesUploadSessionOut )
+async def upload_sales_chunk (
+session_id :str ,
+offset :int =Form (...),
+chunk :UploadFile =File (...),
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Append a chunk starting at byte `offset` and ingest the complete records received so far.
+
+    Retrying a chunk is safe: bytes already received are skipped and rows are only ingested
+    once, in the same transaction that advances the session.
+    """
+    session =await _locked_upload_session (db ,session_id ,current_user .id )
+    if session .status !='open':
+        raise HTTPException (status_code =409 ,detail =f"Upload session is {session .status }")
+
+    try :
+        await upload_sessions .write_chunk (session ,offset ,chunk )
+        await upload_sessions .ingest_received (db ,session )
         await db .commit ()
-    except HTTPException :
-        raise 
+    except upload_sessions .UploadOffsetMismatch as exc :
+        await db .rollback ()
+        raise HTTPException (status_code =409 ,detail =str (exc ))
+    except (CSVUploadError ,ValueError )as exc :
+        await db .rollback ()
+        raise HTTPException (status_code =400 ,detail =str (exc ))
+    except StockContentionError as exc :
+        await db .rollback ()
+        raise HTTPException (status_code =409 ,detail =str (exc ))
     except Exception as e :
         await db .rollback ()
         raise HTTPException (status_code =500 ,detail =f"Error processing CSV: {str (e )}")
+    return upload_sessions .session_summary (session )
+
+
+@router .post ("/upload/sessions/{session_id}/complete")
+async def complete_sales_upload_session (
+session_id :str ,
+size :Optional [int ]=Form (None ),
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Ingest the final record and close the session; `size` (total bytes) is checked when given."""
+    session =await _locked_upload_session (db ,session_id ,current_user .id )
+    if session .status =='open':
+        received =upload_sessions .received_bytes (session )
+        if size is not None and size !=received :
+            raise HTTPException (status_code =409 ,detail =f"Received {received } of {size } bytes")
+        try :
+            await upload_sessions .ingest_received (db ,session ,final =True )
+            session .status ='completed'
+            await db .commit ()
+        except (CSVUploadError ,ValueError )as exc :
+            await db .rollback ()
+            raise HTTPException (status_code =400 ,detail =str (exc ))
+        except StockContentionError as exc :
+            await db .rollback ()
+            raise HTTPException (status_code =409 ,detail =str (exc ))
+        except Exception as e :
+            await db .rollback ()
+            raise HTTPException (status_code =500 ,detail =f"Error processing CSV: {str (e )}")
+        upload_sessions .discard_session_file (session )
+    elif session .status !='completed':
+        raise HTTPException (status_code =409 ,detail =f"Upload session is {session .status }")
 
     return {
-    "message":f"Successfully uploaded {sales_created } sales records",
-    "sales_created":sales_created ,
-    "errors":errors ,
-    "total_rows_processed":total_rows 
+    "message":f"Successfully uploaded {session .sales_created } sales records",
+    "sales_created":session .sales_created ,
+    "errors":session .errors ,
+    "errors_total":session .error_count ,
+    "total_rows_processed":session .rows_seen ,
     }
 
 
+@router .delete ("/upload/sessions/{session_id}",status_code =204 )
+async def abort_sales_upload_session (
+session_id :str ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Abandon an open upload; rows already committed from earlier chunks are kept."""
+    session =await _locked_upload_session (db ,session_id ,current_user .id )
+    if session .status =='open':
+        session .status ='aborted'
+        await db .commit ()
+    upload_sessions .discard_session_file (session )
+
+
+@router .get ("/timeseries")
+@cached_analytics ('sales-timeseries')
+async def sales_timeseries (
+granularity :str ='day',
+product_id :Optional [int ]=None ,
+category_id :Optional [int ]=None ,
+start_date :Optional [date ]=None ,
+end_date :Optional [date ]=None ,
+max_points :int =500 ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user )
+):
+    """Units sold and revenue per hour, day, week or month (UTC) for a product, a category or all sales.
+
+    The range defaults to the first sale up to today. When it would need more than
+    `max_points` buckets the next coarser granularity is used; the response names the
+    granularity actually returned. A defaulted start is moved forward when even monthly
+    buckets would not fit; an explicit range that does not fit is rejected.
+    """
+    if granularity not in sales_timeseries_utils .GRANULARITIES :
+        raise HTTPException (status_code =400 ,detail =f"granularity must be one of {', '.join (sales_timeseries_utils .GRANULARITIES )}")
+    if product_id is not None and category_id is not None :
+        raise HTTPException (status_code =400 ,detail ="Pass either product_id or category_id, not both")
+
+    product_ids =None 
+    if product_id is not None :
+        product =await db .get (models .Product ,product_id )
+        if not product or product .user_id !=current_user .id :
+            raise HTTPException (status_code =404 ,detail ="Product not found")
+        product_ids =[product_id ]
+    elif category_id is not None :
+        category =await db .get (models .ProductCategory ,category_id )
+        if not category or category .user_id !=current_user .id :
+            raise HTTPException (status_code =404 ,detail ="Category not found")
+        product_ids =select (models .Product .id ).where (
+        models .Product .category_id ==category_id ,
+        models .Product .user_id ==current_user .id 
+        )
+
+    end_date =end_date or datetime .now (timezone .utc ).date ()
+    start_given =start_date is not None 
+    if start_date is None :
+        start_date =await sales_timeseries_utils .first_sale_day (db ,current_user .id ,product_ids )or end_date 
+        start_date =min (start_date ,end_date )
+    if start_date >end_date :
+        raise HTTPException (status_code =400 ,detail ="start_date must not be after end_date")
+
+    max_points =min (max (max_points ,1 ),5000 )
+    effective =sales_timeseries_utils .fit_granularity (start_date ,end_date ,granularity ,max_points )
+    if effective is None and start_given :
+        raise HTTPException (status_code =400 ,detail =f"start_date to end_date needs more than {max_points } monthly points")
+    if effective is None :
+        start_date =sales_timeseries_utils .earliest_start (end_date ,max_points )
+        effective =sales_timeseries_utils .fit_granularity (start_date ,end_date ,granularity ,max_points )
+    points =await sales_timeseries_utils .sales_series (db ,current_user .id ,start_date ,end_date ,effective ,product_ids )
+    return {
+    'granularity':effective ,
+    'requested_granularity':granularity ,
+    'start_date':start_date ,
+    'end_date':end_date ,
+    'points':points ,
+    }
+
 
 @router .get ("/summary")
+@cached_analytics ('sales-summary')
 async def sales_summary (db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
     """Return aggregated sales summary (total revenue and total units sold) for the current user."""
 
     stmt =select (
-    func .coalesce (func .sum (models .ProductSale .sale_price *models .ProductSale .quantity ),0 ).label ('total_revenue'),
-    func .coalesce (func .sum (models .ProductSale .quantity ),0 ).label ('total_units')
-    ).where (models .ProductSale .user_id ==current_user .id )
-
-    result =await db .execute (stmt )
-    row =result .first ()
-    total_revenue =float (row .total_revenue )if row and row .total_revenue is not None else 0.0 
-    total_units =int (row .total_units )if row and row .total_units is not None else 0 
-
+    func .coalesce (func .sum (models .DailySales .revenue ),0 ).label ('total_revenue'),
+    func .coalesce (func .sum (models .DailySales .units ),0 ).label ('total_units')
+    ).where (models .DailySales .user_id ==current_user .id )
 
     top_cat_stmt =(
     select (
     models .ProductCategory .name .label ('category_name'),
-    func .coalesce (func .sum (models .ProductSale .quantity ),0 ).label ('units')
+    func .coalesce (func .sum (models .DailySales .units ),0 ).label ('units')
     )
-    .select_from (models .ProductSale )
-    .join (models .Product ,models .Product .id ==models .ProductSale .product_id )
+    .select_from (models .DailySales )
+    .join (models .Product ,models .Product .id ==models .DailySales .product_id )
     .join (models .ProductCategory ,models .ProductCategory .id ==models .Product .category_id )
-    .where (models .ProductSale .user_id ==current_user .id )
+    .where (models .DailySales .user_id ==current_user .id )
     .group_by (models .ProductCategory .id )
-    .order_by (func .sum (models .ProductSale .quantity ).desc ())
+    .order_by (func .sum (models .DailySales .units ).desc ())
     .limit (1 )
     )
-    top_result =await db .execute (top_cat_stmt )
-    top_row =top_result .first ()
+
+    async def first_row (session :AsyncSession ,query ):
+        return (await session .execute (query )).first ()
+
+    row ,top_row =await gather_reads (
+    db ,
+    lambda session :first_row (session ,stmt ),
+    lambda session :first_row (session ,top_cat_stmt )
+    )
+    total_revenue =float (row .total_revenue )if row and row .total_revenue is not None else 0.0 
+    total_units =int (row .total_units )if row and row .total_units is not None else 0 
     top_category =top_row .category_name if top_row and top_row .category_name else None 
 
     return {
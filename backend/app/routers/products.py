@@ -1,12 +1,16 @@
-from fastapi import APIRouter ,Depends ,HTTPException ,UploadFile ,File 
+from fastapi import APIRouter ,Depends ,HTTPException ,UploadFile ,File ,Form 
 from sqlalchemy .ext .asyncio import AsyncSession 
-from typing import List 
+from typing import List ,Optional 
 from sqlalchemy import select 
 from ..import crud ,schemas 
 from ..database import get_db 
 from ..security import get_current_user 
 from ..import models 
-from ..utils .csv_upload import CSVUploadError ,read_csv_rows 
+from ..utils .csv_upload import CSVUploadError ,iter_csv_rows 
+from ..utils .product_import import CONFLICT_MODES ,ProductImporter ,ProductSync 
+from ..utils .sales_ingest import StockContentionError 
+from ..utils .upload_fingerprints import duplicate_response ,find_completed_import ,fingerprint_upload ,import_options ,record_completed_import 
+from .imports import start_import_job 
 
 
 router =APIRouter (prefix ="/products",tags =["products"])
@@ -50,6 +54,8 @@ async def update_product (product_id :int ,updates :schemas .ProductUpdate ,db :
         p =await crud .update_product (db ,product_id ,updates ,user_id =current_user .id )
     except ValueError as e :
         raise HTTPException (status_code =400 ,detail =str (e ))
+    except StockContentionError as e :
+        raise HTTPException (status_code =409 ,detail =str (e ))
     if not p :
         raise HTTPException (status_code =404 ,detail ="Product not found")
     return p 
@@ -63,24 +69,8 @@ async def delete_product (product_id :int ,db :AsyncSession =Depends (get_db ),c
     return {"ok":True }
 
 
-@router .post ("/upload")
-async def upload_products_csv (file :UploadFile =File (...),db :AsyncSession =Depends (get_db ),current_user :models .User =Depends (get_current_user )):
-    """Upload a CSV file (bytes) containing product rows. Returns per-row results.
-
-    Expected CSV headers (any order): name, sku, category, description, price, quantity, low_stock_threshold, supplier
-    
-    Note: category and supplier are names (not IDs) and must exist for the current user.
-    If a category or supplier name doesn't exist, an error will be raised for that row.
-    """
-    user_id =current_user .id 
-
-    try :
-        rows =await read_csv_rows (file )
-    except CSVUploadError as exc :
-        raise HTTPException (status_code =400 ,detail =str (exc ))
-
-    results =[]
-    for row_no ,row in rows :
+async def _import_product_rows (db :AsyncSession ,rows ,user_id :int ,results :list )->None :
+    async for row_no ,row in rows :
         data =dict (row )
 
         bad =False 
@@ -131,14 +121,123 @@ async def upload_products_csv (file :UploadFile =File (...),db :AsyncSession =De
             continue 
 
         try :
-            created =await crud .create_product (db ,p_schema )
+            created =await crud .add_product (db ,p_schema )
             results .append ({"row":row_no ,"ok":True ,"product_id":created .id })
         except ValueError as e :
             results .append ({"row":row_no ,"ok":False ,"error":str (e )})
         except Exception as e :
             results .append ({"row":row_no ,"ok":False ,"error":f"Unexpected error: {e }"})
 
-    return {"results":results }
+
+def _product_importer (db :AsyncSession ,mode :str ,on_conflict :str ,user_id :int )->ProductImporter :
+    if mode =='sync':
+        return ProductSync (db ,user_id )
+    return ProductImporter (db ,user_id ,on_conflict =on_conflict )
+
+
+async def _run_product_import (importer :ProductImporter ,db :AsyncSession ,rows ,content_hash :Optional [str ]=None ,
+filename :Optional [str ]=None ,options :str ='')->dict :
+    async for row_no ,row in rows :
+        await importer .add_row (row_no ,row )
+    summary =await importer .finish ()
+    if importer .aborted :
+        await db .rollback ()
+    else :
+        if content_hash :
+            await record_completed_import (db ,importer .user_id ,'products',content_hash ,filename ,summary ,options )
+        await db .commit ()
+    return summary 
+
+
+async def _run_legacy_product_import (db :AsyncSession ,rows ,user_id :int ,results :list ,content_hash :Optional [str ]=None ,
+filename :Optional [str ]=None ,options :str ='')->dict :
+    """Row-by-row import in a single transaction (a savepoint per row), committed with its fingerprint.
+
+    Keeping one transaction holds the advisory lock taken by `find_completed_import` until
+    the import is recorded, so a concurrent upload of the same file waits and then sees it.
+    """
+    try :
+        await _import_product_rows (db ,rows ,user_id ,results )
+        summary ={"results":results }
+        if content_hash :
+            await record_completed_import (db ,user_id ,'products',content_hash ,filename ,summary ,options )
+        await db .commit ()
+    except Exception :
+        await db .rollback ()
+        raise 
+    return summary 
+
+
+@router .post ("/upload")
+async def upload_products_csv (
+file :UploadFile =File (...),
+mode :Optional [str ]=Form (None ),
+on_conflict :str =Form ('skip'),
+background :bool =Form (False ),
+force :bool =Form (False ),
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user ),
+):
+    """Upload a CSV file (bytes) containing product rows. Returns per-row results.
+
+    Expected CSV headers (any order): name, sku, category, description, price, quantity, low_stock_threshold, supplier
+    
+    Note: category and supplier are names (not IDs) and must exist for the current user.
+    If a category or supplier name doesn't exist, an error will be raised for that row.
+
+    mode=bulk imports the whole file in one transaction with batched upserts; on_conflict
+    (skip, update or fail) decides what happens to SKUs that already exist.
+    mode=sync treats the file as the full catalog: only new or changed SKUs are written.
+    With background=true the file is imported by a background job; poll GET /imports/{job_id}.
+    A file already imported by this user returns the stored result (duplicate=true) without
+    being processed again; force=true imports it anyway.
+    """
+    user_id =current_user .id 
+
+    if mode is not None and mode not in ('bulk','sync'):
+        raise HTTPException (status_code =400 ,detail =f"Unknown upload mode '{mode }'")
+    if on_conflict not in CONFLICT_MODES :
+        raise HTTPException (status_code =400 ,detail =f"on_conflict must be one of: {', '.join (CONFLICT_MODES )}")
+
+    filename =file .filename 
+    content_hash =await fingerprint_upload (file )
+    options =import_options (mode =mode ,on_conflict =on_conflict )
+    previous =await find_completed_import (db ,user_id ,'products',content_hash ,options )
+    if previous and not force :
+        return duplicate_response (previous )
+
+    if background :
+        await db .rollback ()
+
+        async def handler (job_db :AsyncSession ,job )->dict :
+            previous =await find_completed_import (job_db ,user_id ,'products',content_hash ,options )
+            if previous and not force :
+                return duplicate_response (previous )
+            if mode :
+                importer =_product_importer (job_db ,mode ,on_conflict ,user_id )
+                job .watch (lambda :[r for r in importer .results if not r ['ok']])
+                return await _run_product_import (importer ,job_db ,job .rows (),content_hash ,filename ,options )
+            results =[]
+            job .watch (lambda :[r for r in results if not r ['ok']])
+            return await _run_legacy_product_import (job_db ,job .rows (),user_id ,results ,content_hash ,filename ,options )
+        return await start_import_job ('products',file ,current_user ,handler )
+
+    if mode :
+        importer =_product_importer (db ,mode ,on_conflict ,user_id )
+        try :
+            return await _run_product_import (importer ,db ,iter_csv_rows (file ),content_hash ,filename ,options )
+        except CSVUploadError as exc :
+            await db .rollback ()
+            raise HTTPException (status_code =400 ,detail =str (exc ))
+        except Exception as e :
+            await db .rollback ()
+            raise HTTPException (status_code =500 ,detail =f"Error importing products: {e }")
+
+    results =[]
+    try :
+        return await _run_legacy_product_import (db ,iter_csv_rows (file ),user_id ,results ,content_hash ,filename ,options )
+    except CSVUploadError as exc :
+        raise HTTPException (status_code =400 ,detail =str (exc ))
 
 
 @router .get ("/{product_id}/sales",response_model =List [schemas .ProductSaleOut ])
@@ -1,72 +1,139 @@
 from fastapi import APIRouter ,Depends ,HTTPException 
 from sqlalchemy .ext .asyncio import AsyncSession 
-from sqlalchemy import select ,and_ 
+from sqlalchemy import select ,and_ ,func ,insert ,or_ ,update 
 from sqlalchemy .orm import selectinload 
-from typing import List 
+from typing import List ,Tuple 
 from ..import crud ,schemas ,models 
 import asyncio 
 from ..routers .email import send_batch_order_summary 
 from ..database import get_db 
 from ..security import get_current_user 
+from ..utils .analytics_cache import cached_analytics ,mark_changed 
+from ..utils .inventory_snapshots import record_snapshot ,record_snapshots 
+from ..utils .parallel_reads import gather_reads 
+from ..utils .sales_ingest import apply_quantity_deltas 
+from ..utils import forecasting 
+from datetime import datetime 
 import uuid 
 
 router =APIRouter (prefix ="/restock",tags =["restock"])
 
 @router .get ("/summary",response_model =schemas .RestockSummary )
+@cached_analytics ('restock-summary')
 async def get_restock_summary (
 db :AsyncSession =Depends (get_db ),
 current_user :models .User =Depends (get_current_user )
 ):
     """Get summary statistics for restock dashboard"""
 
+    user_id =current_user .id 
+    (pending_orders_count ,total_pending_value ),(low_stock_count ,out_of_stock_count )=await gather_reads (
+    db ,
+    lambda session :pending_order_totals (session ,user_id ),
+    lambda session :stock_alert_counts (session ,user_id )
+    )
+
+    return schemas .RestockSummary (
+    pending_orders =pending_orders_count ,
+    low_stock_items =low_stock_count ,
+    out_of_stock_items =out_of_stock_count ,
+    total_pending_value =float (total_pending_value )
+    )
+
+
+async def pending_order_totals (db :AsyncSession ,user_id :int )->Tuple [int ,float ]:
+    """Number and value (at current product prices) of the user's pending purchase orders."""
 
-    pending_orders_stmt =select (models .PurchaseOrder ).where (
+    stmt =(
+    select (
+    func .count (models .PurchaseOrder .id ).label ('orders'),
+    func .coalesce (func .sum (models .Product .price *models .PurchaseOrder .quantity_ordered ),0 ).label ('value')
+    )
+    .select_from (models .PurchaseOrder )
+    .outerjoin (models .Product ,models .Product .id ==models .PurchaseOrder .product_id )
+    .where (
     and_ (
-    models .PurchaseOrder .user_id ==current_user .id ,
+    models .PurchaseOrder .user_id ==user_id ,
     models .PurchaseOrder .status =='pending'
     )
     )
-    pending_orders_result =await db .execute (pending_orders_stmt )
-    pending_orders =pending_orders_result .scalars ().all ()
-    pending_orders_count =len (pending_orders )
+    )
+    row =(await db .execute (stmt )).one ()
+    return int (row .orders ),float (row .value )
 
 
-    total_pending_value =0 
-    for order in pending_orders :
-        product =await db .get (models .Product ,order .product_id )
-        if product :
-            total_pending_value +=(product .price )*order .quantity_ordered 
+async def stock_alert_counts (db :AsyncSession ,user_id :int )->Tuple [int ,int ]:
+    """Number of the user's low-stock (at or below threshold, not empty) and out-of-stock products."""
 
-
-    low_stock_stmt =select (models .Product ).where (
-    and_ (
-    models .Product .user_id ==current_user .id ,
+    low_stock =and_ (
     models .Product .quantity <=models .Product .low_stock_threshold ,
     models .Product .quantity >0 
     )
+    out_of_stock =models .Product .quantity ==0 
+    stmt =(
+    select (
+    func .count ().filter (low_stock ).label ('low_stock'),
+    func .count ().filter (out_of_stock ).label ('out_of_stock')
     )
-    low_stock_result =await db .execute (low_stock_stmt )
-    low_stock_count =len (low_stock_result .scalars ().all ())
-
-
-    out_of_stock_stmt =select (models .Product ).where (
-    and_ (
-    models .Product .user_id ==current_user .id ,
-    models .Product .quantity ==0 
+    .select_from (models .Product )
+    .where (models .Product .user_id ==user_id ,or_ (low_stock ,out_of_stock ))
     )
+    row =(await db .execute (stmt )).one ()
+    return int (row .low_stock ),int (row .out_of_stock )
+
+
+@router .get ("/forecast",response_model =schemas .ReorderForecast )
+async def get_reorder_forecast (
+method :str ='ses',
+history_days :int =90 ,
+window :int =28 ,
+alpha :float =0.3 ,
+lead_time_days :float =7 ,
+cover_days :float =14 ,
+safety_factor :float =1.65 ,
+only_reorder :bool =True ,
+db :AsyncSession =Depends (get_db ),
+current_user :models .User =Depends (get_current_user )
+):
+    """Forecast daily demand for every product and suggest reorder quantities.
+
+    `method` is ``sma`` (moving average over `window` days) or ``ses`` (exponential
+    smoothing with `alpha`) over the last `history_days` complete days of sales. Suggested
+    orders are returned as purchase order drafts that can be posted to /restock/orders/batch.
+    """
+    if method not in forecasting .FORECAST_METHODS :
+        raise HTTPException (status_code =400 ,detail =f"method must be one of {', '.join (forecasting .FORECAST_METHODS )}")
+    if not 0 <alpha <=1 :
+        raise HTTPException (status_code =400 ,detail ="alpha must be in (0, 1]")
+    history_days =min (max (history_days ,1 ),730 )
+    window =max (window ,1 )
+    lead_time_days =max (lead_time_days ,0 )
+    cover_days =max (cover_days ,0 )
+
+    history =await forecasting .load_demand_history (db ,current_user .id ,history_days )
+    plan =forecasting .reorder_plan (
+    history ,method ,window ,alpha ,
+    lead_time_days =lead_time_days ,cover_days =cover_days ,safety_factor =safety_factor 
     )
-    out_of_stock_result =await db .execute (out_of_stock_stmt )
-    out_of_stock_count =len (out_of_stock_result .scalars ().all ())
-
-    return schemas .RestockSummary (
-    pending_orders =pending_orders_count ,
-    low_stock_items =low_stock_count ,
-    out_of_stock_items =out_of_stock_count ,
-    total_pending_value =float (total_pending_value )
+    rows =forecasting .suggestion_rows (history ,plan ,only_reorder )
+
+    drafts =[
+    schemas .PurchaseOrderCreate (
+    product_id =r ['product_id'],
+    supplier_id =r ['supplier_id'],
+    quantity_ordered =r ['suggested_quantity'],
+    notes =f"Suggested reorder: {r ['daily_demand']} units/day, reorder point {r ['reorder_point']}"
     )
-
-
-
+    for r in rows if r ['suggested_quantity']>0 
+    ]
+    return {
+    'method':method ,
+    'history_days':history_days ,
+    'lead_time_days':lead_time_days ,
+    'cover_days':cover_days ,
+    'products':rows ,
+    'drafts':{'orders':drafts },
+    }
 
 
 @router .get ("/orders",response_model =List [schemas .PurchaseOrderOut ])
@@ -106,41 +173,45 @@ current_user :models .User =Depends (get_current_user )
 ):
     """Create multiple purchase orders in one transaction and send a single email summary for those that requested notification."""
 
-    created_orders =[]
-
     batch_group_id =str (uuid .uuid4 ())
+    if not batch .orders :
+        return []
 
     try :
-        for order in batch .orders :
+        product_ids ={order .product_id for order in batch .orders }
+        supplier_ids ={order .supplier_id for order in batch .orders if order .supplier_id }
+        owned_products =set ((await db .execute (
+        select (models .Product .id ).where (models .Product .id .in_ (product_ids ),models .Product .user_id ==current_user .id )
+        )).scalars ().all ())
+        owned_suppliers =set ()
+        if supplier_ids :
+            owned_suppliers =set ((await db .execute (
+            select (models .Supplier .id ).where (models .Supplier .id .in_ (supplier_ids ),models .Supplier .user_id ==current_user .id )
+            )).scalars ().all ())
 
-            product =await db .get (models .Product ,order .product_id )
-            if not product or product .user_id !=current_user .id :
+        for order in batch .orders :
+            if order .product_id not in owned_products :
                 raise HTTPException (status_code =404 ,detail =f"Product {order .product_id } not found")
-
-            if order .supplier_id :
-                supplier =await db .get (models .Supplier ,order .supplier_id )
-                if not supplier or supplier .user_id !=current_user .id :
-                    raise HTTPException (status_code =404 ,detail =f"Supplier {order .supplier_id } not found")
-
-
-            db_order =models .PurchaseOrder (
-            user_id =current_user .id ,
-            supplier_id =order .supplier_id ,
-            product_id =order .product_id ,
-            quantity_ordered =order .quantity_ordered ,
-            status =order .status ,
-            notes =order .notes ,
-            notify_by_email =getattr (order ,'notify_by_email',False ),
-            group_id =batch_group_id 
-            )
-
-            db .add (db_order )
-
-            await db .flush ()
-            await db .refresh (db_order )
-            created_orders .append (db_order )
-
-
+            if order .supplier_id and order .supplier_id not in owned_suppliers :
+                raise HTTPException (status_code =404 ,detail =f"Supplier {order .supplier_id } not found")
+
+        created_ids =(await db .execute (
+        insert (models .PurchaseOrder .__table__ ).returning (models .PurchaseOrder .id ,sort_by_parameter_order =True ),
+        [
+        {
+        'user_id':current_user .id ,
+        'supplier_id':order .supplier_id ,
+        'product_id':order .product_id ,
+        'quantity_ordered':order .quantity_ordered ,
+        'status':order .status ,
+        'notes':order .notes ,
+        'notify_by_email':getattr (order ,'notify_by_email',False ),
+        'group_id':batch_group_id 
+        }
+        for order in batch .orders 
+        ]
+        )).scalars ().all ()
+        mark_changed (db ,current_user .id )
         await db .commit ()
     except Exception :
 
@@ -150,16 +221,12 @@ current_user :models .User =Depends (get_current_user )
             pass 
         raise 
 
-
-    orders_with_rel =[]
-    for o in created_orders :
-        stmt =select (models .PurchaseOrder ).options (
-        selectinload (models .PurchaseOrder .supplier ),
-        selectinload (models .PurchaseOrder .product ).selectinload (models .Product .supplier ),
-        selectinload (models .PurchaseOrder .product ).selectinload (models .Product .category )
-        ).where (models .PurchaseOrder .id ==o .id )
-        res =await db .execute (stmt )
-        orders_with_rel .append (res .scalar_one ())
+    stmt =select (models .PurchaseOrder ).options (
+    selectinload (models .PurchaseOrder .supplier ),
+    selectinload (models .PurchaseOrder .product ).selectinload (models .Product .supplier ),
+    selectinload (models .PurchaseOrder .product ).selectinload (models .Product .category )
+    ).where (models .PurchaseOrder .id .in_ (created_ids )).order_by (models .PurchaseOrder .id )
+    orders_with_rel =(await db .execute (stmt )).scalars ().all ()
 
 
     try :
@@ -208,57 +275,73 @@ order_update :schemas .PurchaseOrderUpdate ,
 db :AsyncSession =Depends (get_db ),
 current_user :models .User =Depends (get_current_user )
 ):
-    """Update all purchase orders in a group (useful for batch operations like marking all as completed)"""
-
-
-    stmt =select (models .PurchaseOrder ).options (
-    selectinload (models .PurchaseOrder .supplier ),
-    selectinload (models .PurchaseOrder .product ).selectinload (models .Product .supplier ),
-    selectinload (models .PurchaseOrder .product ).selectinload (models .Product .category )
-    ).where (
-    and_ (
-    models .PurchaseOrder .group_id ==group_id ,
-    models .PurchaseOrder .user_id ==current_user .id 
-    )
-    )
-
-    result =await db .execute (stmt )
-    orders =result .scalars ().all ()
+    """Update all purchase orders in a group (useful for batch operations like marking all as completed)
+
+    Runs as one transaction: the group's orders and then their products are locked in id
+    order, the stock of all newly completed orders is added with a single UPDATE and their
+    movements are written with a single INSERT. Orders that were already completed are
+    never restocked again.
+    """
+    po =models .PurchaseOrder 
+    orders =(await db .execute (
+    select (po .id ,po .status ,po .product_id ,po .quantity_ordered )
+    .where (po .group_id ==group_id ,po .user_id ==current_user .id )
+    .order_by (po .id )
+    .with_for_update ()
+    )).all ()
 
     if not orders :
         raise HTTPException (status_code =404 ,detail ="No orders found in this group")
 
-
     update_data =order_update .model_dump (exclude_unset =True )
-    for order in orders :
-        for field ,value in update_data .items ():
-            setattr (order ,field ,value )
-
+    try :
+        if update_data :
+            await db .execute (
+            update (po )
+            .where (po .id .in_ ([o .id for o in orders ]))
+            .values (**update_data )
+            .execution_options (synchronize_session =False )
+            )
 
         if order_update .status =="completed":
-            product =await db .get (models .Product ,order .product_id )
-            if product :
-                old_quantity =product .quantity 
-                product .quantity +=order .quantity_ordered 
-
-
-                stock_movement =models .StockMovement (
-                product_id =product .id ,
-                user_id =current_user .id ,
-                movement_type ='restock',
-                quantity_change =order .quantity_ordered ,
-                quantity_before =old_quantity ,
-                quantity_after =product .quantity ,
-                reference_id =order .id ,
-                reference_type ='purchase_order',
-                notes =f"Restock from purchase order #{order .id } (group {group_id })"
-                )
-
-                db .add (stock_movement )
-
-    await db .commit ()
-
-
+            restocked =[
+            (o .id ,o .product_id ,update_data .get ('quantity_ordered')or o .quantity_ordered )
+            for o in orders if o .status !="completed"
+            ]
+            deltas ={}
+            for _ ,product_id ,quantity in restocked :
+                deltas [product_id ]=deltas .get (product_id ,0 )+quantity 
+            products =await apply_quantity_deltas (db ,deltas ,lock =True )
+
+            running ={pid :products [pid ].quantity -delta for pid ,delta in deltas .items ()if pid in products }
+            now =datetime .now ()
+            movements =[]
+            for order_id ,product_id ,quantity in restocked :
+                if product_id not in running :
+                    continue 
+                before =running [product_id ]
+                running [product_id ]=before +quantity 
+                movements .append ({
+                'product_id':product_id ,
+                'user_id':current_user .id ,
+                'movement_type':'restock',
+                'quantity_change':quantity ,
+                'quantity_before':before ,
+                'quantity_after':before +quantity ,
+                'reference_id':order_id ,
+                'reference_type':'purchase_order',
+                'notes':f"Restock from purchase order #{order_id } (group {group_id })",
+                'transaction_date':now ,
+                })
+            if movements :
+                await db .execute (insert (models .StockMovement .__table__ ),movements )
+                await record_snapshots (db ,movements ,{pid :row .price for pid ,row in products .items ()})
+
+        mark_changed (db ,current_user .id )
+        await db .commit ()
+    except Exception :
+        await db .rollback ()
+        raise 
 
     stmt =select (models .PurchaseOrder ).options (
     selectinload (models .PurchaseOrder .supplier ),
@@ -313,10 +396,9 @@ current_user :models .User =Depends (get_current_user )
 
 
     if order_update .status =="completed":
-        product =await db .get (models .Product ,order .product_id )
+        product =await crud .add_stock (db ,order .product_id ,order .quantity_ordered )
         if product :
-            old_quantity =product .quantity 
-            product .quantity +=order .quantity_ordered 
+            mark_changed (db ,current_user .id )
 
 
             stock_movement =models .StockMovement (
@@ -324,14 +406,16 @@ current_user :models .User =Depends (get_current_user )
             user_id =current_user .id ,
             movement_type ='restock',
             quantity_change =order .quantity_ordered ,
-            quantity_before =old_quantity ,
+            quantity_before =product .quantity -order .quantity_ordered ,
             quantity_after =product .quantity ,
             reference_id =order .id ,
             reference_type ='purchase_order',
-            notes =f"Restock from purchase order #{order .id }"
+            notes =f"Restock from purchase order #{order .id }",
+            transaction_date =datetime .now ()
             )
 
             db .add (stock_movement )
+            await record_snapshot (db ,stock_movement ,product .price )
             await db .commit ()
 
 
@@ -345,7 +429,7 @@ current_user :models .User =Depends (get_current_user )
     models .PurchaseOrder .id ==order .id ,
     models .PurchaseOrder .user_id ==current_user .id 
     )
-    )
+    ).execution_options (populate_existing =True )
 
     result =await db .execute (stmt )
     fresh_order =result .scalar_one ()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel ,Field 
-from typing import Optional ,List 
+from typing import Any ,Optional ,List 
 import datetime 
 
 
@@ -112,6 +112,31 @@ class ProductSaleOut (ProductSaleBase ):
         from_attributes =True 
 
 
+class ProductSaleBatchItem (ProductSaleBase ):
+    product_id :int 
+
+
+class ProductSaleBatchCreate (BaseModel ):
+    """Record many sale line items, possibly of different products, in one request."""
+    items :List [ProductSaleBatchItem ]
+
+
+class ProductSaleBatchLine (BaseModel ):
+    line :int 
+    product_id :int 
+    quantity :int 
+    sale_id :Optional [int ]=None 
+    sale_price :Optional [float ]=None 
+    quantity_after :Optional [int ]=None 
+    error :Optional [str ]=None 
+
+
+class ProductSaleBatchOut (BaseModel ):
+    sales_created :int 
+    errors :int 
+    results :List [ProductSaleBatchLine ]
+
+
 class StockMovementBase (BaseModel ):
     product_id :int 
     movement_type :str 
@@ -248,3 +273,56 @@ class RestockSummary (BaseModel ):
     low_stock_items :int 
     out_of_stock_items :int 
     total_pending_value :float 
+
+
+class ReorderSuggestion (BaseModel ):
+    product_id :int 
+    sku :Optional [str ]=None 
+    name :str 
+    supplier_id :Optional [int ]=None 
+    quantity :int 
+    on_order :int 
+    daily_demand :float 
+    lead_time_demand :float 
+    safety_stock :float 
+    reorder_point :float 
+    suggested_quantity :int 
+
+
+class ReorderForecast (BaseModel ):
+    """Demand forecast per product plus purchase order drafts for the suggested quantities."""
+    method :str 
+    history_days :int 
+    lead_time_days :float 
+    cover_days :float 
+    products :List [ReorderSuggestion ]
+    drafts :PurchaseOrderBatchCreate 
+
+
+class ImportJobOut (BaseModel ):
+    id :str 
+    kind :str 
+    filename :Optional [str ]=None 
+    status :str 
+    rows_done :int 
+    rows_failed :int 
+    errors :List [Any ]=[]
+    errors_offset :int =0 
+    errors_total :int =0 
+    error :Optional [str ]=None 
+    result :Optional [dict ]=None 
+    created_at :datetime .datetime 
+    started_at :Optional [datetime .datetime ]=None 
+    finished_at :Optional [datetime .datetime ]=None 
+
+
+class SalesUploadSessionOut (BaseModel ):
+    session_id :str 
+    filename :Optional [str ]=None 
+    status :str 
+    offset :int 
+    ingested_offset :int 
+    rows_processed :int 
+    sales_created :int 
+    errors :List [Any ]=[]
+    errors_total :int =0 
@@ -0,0 +1,185 @@
+import asyncio 
+import functools 
+import inspect 
+import os 
+import time 
+from collections import OrderedDict 
+from itertools import chain 
+from typing import Any ,Dict ,Hashable ,Optional ,Tuple 
+
+from sqlalchemy import event 
+from sqlalchemy .ext .asyncio import AsyncSession 
+from sqlalchemy .orm import Session 
+
+from ..import models 
+
+
+ANALYTICS_CACHE_SIZE =int (os .getenv ('ANALYTICS_CACHE_SIZE','1024'))
+ANALYTICS_CACHE_TTL =float (os .getenv ('ANALYTICS_CACHE_TTL_SECONDS','300'))
+
+CHANGED_USERS_KEY ='analytics_changed_users'
+
+TRACKED_MODELS =(
+models .Product ,
+models .ProductCategory ,
+models .ProductSale ,
+models .StockMovement ,
+models .PurchaseOrder ,
+)
+
+
+class AnalyticsCache :
+    """LRU/TTL cache of analytics results keyed by (user, endpoint, parameters).
+
+    Every entry remembers the user's data version it was computed at; writes bump the
+    version once their transaction commits, so an entry from before a write is never
+    served again. Versions live in this process, like the import job registry.
+
+    Identical requests arriving while a result is being computed wait for that computation
+    instead of running their own (`in_flight`).
+    """
+
+    def __init__ (self ,max_entries :int =ANALYTICS_CACHE_SIZE ,ttl :float =ANALYTICS_CACHE_TTL ):
+        self .max_entries =max_entries 
+        self .ttl =ttl 
+        self ._entries :'OrderedDict[Tuple, Tuple[int, float, Any]]'=OrderedDict ()
+        self ._versions :Dict [int ,int ]={}
+        self .in_flight :Dict [Tuple ,asyncio .Future ]={}
+        self .hits =0 
+        self .misses =0 
+        self .coalesced =0 
+
+    def version (self ,user_id :int )->int :
+        return self ._versions .get (user_id ,0 )
+
+    def bump (self ,user_id :int )->None :
+        self ._versions [user_id ]=self .version (user_id )+1 
+
+    def get (self ,key :Tuple ,version :int )->Tuple [bool ,Any ]:
+        entry =self ._entries .get (key )
+        if entry is None or entry [0 ]!=version or entry [1 ]<time .monotonic ():
+            if entry is not None :
+                del self ._entries [key ]
+            self .misses +=1 
+            return False ,None 
+        self ._entries .move_to_end (key )
+        self .hits +=1 
+        return True ,entry [2 ]
+
+    def put (self ,key :Tuple ,version :int ,value :Any )->None :
+        if self .max_entries <=0 :
+            return 
+        self ._entries [key ]=(version ,time .monotonic ()+self .ttl ,value )
+        self ._entries .move_to_end (key )
+        while len (self ._entries )>self .max_entries :
+            self ._entries .popitem (last =False )
+
+    def clear (self )->None :
+        self ._entries .clear ()
+
+    def stats (self )->dict :
+        lookups =self .hits +self .misses 
+        return {
+        'entries':len (self ._entries ),
+        'max_entries':self .max_entries ,
+        'ttl_seconds':self .ttl ,
+        'hits':self .hits ,
+        'misses':self .misses ,
+        'coalesced':self .coalesced ,
+        'in_flight':len (self .in_flight ),
+        'hit_rate':round (self .hits /lookups ,4 )if lookups else 0.0 ,
+        }
+
+
+analytics_cache =AnalyticsCache ()
+
+
+def mark_changed (db :AsyncSession ,user_id :Optional [int ])->None :
+    """Note that the current transaction writes `user_id`'s data.
+
+    Only needed for Core statements (bulk inserts/updates); ORM changes to the tracked
+    models are picked up at flush time.
+    """
+    if user_id is not None :
+        db .info .setdefault (CHANGED_USERS_KEY ,set ()).add (user_id )
+
+
+@event .listens_for (Session ,'before_flush')
+def _collect_changed_users (session ,flush_context ,instances ):
+    for obj in chain (session .new ,session .dirty ,session .deleted ):
+        if isinstance (obj ,TRACKED_MODELS )and obj .user_id is not None :
+            session .info .setdefault (CHANGED_USERS_KEY ,set ()).add (obj .user_id )
+
+
+@event .listens_for (Session ,'after_commit')
+def _bump_changed_users (session ):
+    for user_id in session .info .pop (CHANGED_USERS_KEY ,()):
+        analytics_cache .bump (user_id )
+
+
+@event .listens_for (Session ,'after_rollback')
+def _forget_changed_users (session ):
+    session .info .pop (CHANGED_USERS_KEY ,None )
+
+
+def _retrieve (future :asyncio .Future )->None :
+    if not future .cancelled ():
+        future .exception ()
+
+
+def cached_analytics (name :str ):
+    """Cache an analytics endpoint per user and query parameters, coalescing identical calls.
+
+    The endpoint must take `current_user`; `db` is not part of the key. While one call
+    computes a result, identical calls (same user, parameters and data version) await it;
+    if that call is cancelled they try again. Results are shared between callers, so
+    endpoints must not mutate what they return.
+    """
+    def decorate (endpoint ):
+        signature =inspect .signature (endpoint )
+
+        @functools .wraps (endpoint )
+        async def wrapper (*args ,**kwargs ):
+            bound =signature .bind (*args ,**kwargs )
+            bound .apply_defaults ()
+            user_id =bound .arguments ['current_user'].id 
+            params :Tuple [Tuple [str ,Hashable ],...]=tuple (
+            (k ,v )for k ,v in bound .arguments .items ()if k not in ('db','current_user')
+            )
+            key =(user_id ,name ,params )
+            while True :
+                version =analytics_cache .version (user_id )
+                found ,value =analytics_cache .get (key ,version )
+                if found :
+                    return value 
+                flight =(key ,version )
+                pending =analytics_cache .in_flight .get (flight )
+                if pending is None :
+                    break 
+                analytics_cache .coalesced +=1 
+                try :
+                    return await asyncio .shield (pending )
+                except asyncio .CancelledError :
+                    if not pending .cancelled ():
+                        raise 
+
+            future =asyncio .get_running_loop ().create_future ()
+            future .add_done_callback (_retrieve )
+            analytics_cache .in_flight [flight ]=future 
+            try :
+                value =await endpoint (*args ,**kwargs )
+            except asyncio .CancelledError :
+                future .cancel ()
+                raise 
+            except Exception as exc :
+                future .set_exception (exc )
+                raise 
+            finally :
+                analytics_cache .in_flight .pop (flight ,None )
+            analytics_cache .put (key ,version ,value )
+            future .set_result (value )
+            return value 
+
+        return wrapper 
+
+    return decorate 
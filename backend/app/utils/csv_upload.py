@@ -1,34 +1,202 @@
+import codecs 
 import csv 
-import io 
-from typing import Dict ,List ,Optional ,Tuple 
+import inspect 
+import zlib 
+from collections import deque 
+from typing import AsyncIterator ,Deque ,Dict ,List ,Optional ,Tuple 
 
 from fastapi import UploadFile 
 
+try :
+    import zstandard 
+except ImportError :
+    zstandard =None 
+
+
+CSV_CHUNK_SIZE =64 *1024 
+
+GZIP_MAGIC =b"\x1f\x8b"
+ZSTD_MAGIC =b"\x28\xb5\x2f\xfd"
+
+CSV_SUFFIXES =('.csv','.csv.gz','.csv.zst')
+COMPRESSED_CSV_SUFFIXES =('.csv.gz','.csv.zst')
+
+
+def is_csv_filename (filename :Optional [str ])->bool :
+    """Whether `filename` names a plain, gzip or zstd compressed CSV file."""
+    return bool (filename )and filename .lower ().endswith (CSV_SUFFIXES )
+
 
 class CSVUploadError (RuntimeError ):
     """Raised when a CSV upload cannot be parsed."""
 
 
-async def read_csv_rows (file :UploadFile )->List [Tuple [int ,Dict [str ,Optional [str ]]]]:
-    """Return CSV rows paired with their 1-based line numbers (header counted as row 1)."""
+class _LineFeed :
+    """Resumable line iterator handed to ``csv.reader``; tracks unbalanced quotes of buffered lines."""
+
+    def __init__ (self ):
+        self .lines :Deque [str ]=deque ()
+        self .quotes =0 
+
+    def push (self ,line :str )->None :
+        self .lines .append (line )
+        self .quotes +=line .count ('"')
+
+    def complete (self )->bool :
+        return bool (self .lines )and self .quotes %2 ==0 
+
+    def __iter__ (self ):
+        return self 
+
+    def __next__ (self )->str :
+        if not self .lines :
+            raise StopIteration 
+        line =self .lines .popleft ()
+        self .quotes -=line .count ('"')
+        return line 
+
+
+async def _read_chunk (source ,size :int )->bytes :
+    data =source .read (size )
+    if inspect .isawaitable (data ):
+        data =await data 
+    return data 
+
+
+class _GzipDecompressor :
+    """Incremental gzip inflater that also accepts concatenated members (``cat a.gz b.gz``)."""
+
+    def __init__ (self ):
+        self ._inflater =zlib .decompressobj (16 +zlib .MAX_WBITS )
+
+    @property 
+    def eof (self )->bool :
+        return self ._inflater .eof and not self ._inflater .unused_data 
+
+    def decompress (self ,data :bytes )->bytes :
+        out =self ._inflater .decompress (data )
+        while self ._inflater .eof and self ._inflater .unused_data :
+            rest =self ._inflater .unused_data 
+            self ._inflater =zlib .decompressobj (16 +zlib .MAX_WBITS )
+            out +=self ._inflater .decompress (rest )
+        return out 
+
+
+class _UploadStream :
+    """Async ``read(size)`` over an upload, decompressing gzip/zstd input one chunk at a time."""
+
+    def __init__ (self ,source ,head :bytes ,decompressor =None ):
+        self .source =source 
+        self .head =head 
+        self .decompressor =decompressor 
+        self .done =False 
+
+    async def read (self ,size :int )->bytes :
+        while not self .done :
+            chunk ,self .head =self .head or await _read_chunk (self .source ,size ),b""
+            if self .decompressor is None :
+                self .done =not chunk 
+                return chunk 
+            if not chunk :
+                self .done =True 
+                if not getattr (self .decompressor ,'eof',True ):
+                    raise CSVUploadError ("Compressed upload is truncated")
+                return b""
+            try :
+                data =self .decompressor .decompress (chunk )
+            except Exception as exc :
+                raise CSVUploadError ("Unable to decompress uploaded file")from exc 
+            if data :
+                return data 
+        return b""
+
+
+async def open_upload (file :UploadFile ,chunk_size :int =CSV_CHUNK_SIZE )->_UploadStream :
+    """Wrap `file` so reads return plain CSV bytes.
+
+    Compression is detected from the leading magic bytes, which covers ``.csv.gz`` and
+    ``.csv.zst`` files as well as parts sent with ``Content-Encoding: gzip`` regardless of
+    their name. zstd needs the optional ``zstandard`` package.
+    """
     try :
-        raw =await file .read ()
+        head =await _read_chunk (file ,chunk_size )
     except Exception as exc :
         raise CSVUploadError ("Unable to read uploaded file")from exc 
-    try :
-        stream =io .StringIO (raw .decode ("utf-8"))
-    except Exception as exc :
-        raise CSVUploadError ("Unable to decode uploaded file as UTF-8")from exc 
+    if head .startswith (GZIP_MAGIC ):
+        return _UploadStream (file ,head ,_GzipDecompressor ())
+    if head .startswith (ZSTD_MAGIC ):
+        if zstandard is None :
+            raise CSVUploadError ("zstd compressed uploads require the 'zstandard' package")
+        return _UploadStream (file ,head ,zstandard .ZstdDecompressor ().decompressobj ())
+    return _UploadStream (file ,head )
 
-    reader =csv .DictReader (stream )
-    if reader .fieldnames is None :
+
+async def iter_csv_rows (file :UploadFile ,chunk_size :int =CSV_CHUNK_SIZE )->AsyncIterator [Tuple [int ,Dict [str ,Optional [str ]]]]:
+    """Yield CSV rows paired with their 1-based line numbers (header counted as row 1).
+
+    The upload is read, decompressed (gzip/zstd, see `open_upload`) and decoded in
+    `chunk_size` pieces, so memory use is bounded by the chunk size and the longest record
+    instead of the size of the file. `file` may be an `UploadFile` or any object with a
+    (sync or async) `read(size)` method returning bytes.
+    """
+    source =await open_upload (file ,chunk_size )
+    decoder =codecs .getincrementaldecoder ("utf-8")()
+    feed =_LineFeed ()
+    reader =csv .reader (feed )
+    fieldnames :Optional [List [str ]]=None 
+    row_index =1 
+    tail =""
+    eof =False 
+
+    while not eof :
+        try :
+            chunk =await source .read (chunk_size )
+        except CSVUploadError :
+            raise 
+        except Exception as exc :
+            raise CSVUploadError ("Unable to read uploaded file")from exc 
+        eof =not chunk 
+        try :
+            text =tail +decoder .decode (chunk or b"",final =eof )
+        except UnicodeDecodeError as exc :
+            raise CSVUploadError ("Unable to decode uploaded file as UTF-8")from exc 
+
+        lines =text .split ("\n")
+        tail =lines .pop ()
+        for line in lines :
+            feed .push (line +"\n")
+        if eof and tail :
+            feed .push (tail )
+            tail =""
+
+        while feed .complete ()or (eof and feed .lines ):
+            try :
+                values =next (reader )
+            except StopIteration :
+                break 
+            except csv .Error as exc :
+                raise CSVUploadError (f"Malformed CSV near row {row_index +1 }: {exc }")from exc 
+            if not values :
+                continue 
+            if fieldnames is None :
+                fieldnames =values 
+                continue 
+            row_index +=1 
+            row :Dict [str ,Optional [str ]]=dict (zip (fieldnames ,values ))
+            if len (values )>len (fieldnames ):
+                row [None ]=values [len (fieldnames ):]
+            else :
+                for key in fieldnames [len (values ):]:
+                    row [key ]=None 
+            yield row_index ,{
+            key :(value if value not in ("",None )else None )
+            for key ,value in row .items ()
+            }
+
+    if fieldnames is None :
         raise CSVUploadError ("CSV file must have a header row")
 
-    rows :List [Tuple [int ,Dict [str ,Optional [str ]]]]=[]
-    for row_index ,row in enumerate (reader ,start =2 ):
-        normalized ={
-        key :(value if value not in ("",None )else None )
-        for key ,value in row .items ()
-        }
-        rows .append ((row_index ,normalized ))
-    return rows 
+
+async def read_csv_rows (file :UploadFile )->List [Tuple [int ,Dict [str ,Optional [str ]]]]:
+    """Return CSV rows paired with their 1-based line numbers (header counted as row 1)."""
+    return [item async for item in iter_csv_rows (file )]
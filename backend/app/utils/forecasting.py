@@ -0,0 +1,160 @@
+from datetime import date ,datetime ,timedelta ,timezone 
+from typing import List ,Optional ,Tuple 
+
+import numpy as np 
+from sqlalchemy import Date ,func ,literal ,select 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from .parallel_reads import gather_reads 
+
+
+FORECAST_METHODS =('sma','ses')
+
+
+class DemandHistory :
+    """Units sold per product and UTC day: `units[i, d]` for product `product_ids[i]` on `start + d`."""
+
+    def __init__ (self ,start :date ,products :list ,days :int ):
+        self .start =start 
+        self .products =products 
+        self .product_ids =np .array ([p .id for p in products ],dtype =np .int64 )
+        self .quantity =np .array ([p .quantity for p in products ],dtype =np .float64 )
+        self .units =np .zeros ((len (products ),days ),dtype =np .float64 )
+        self .on_order =np .zeros (len (products ),dtype =np .float64 )
+
+    def rows_for (self ,product_ids )->Tuple [np .ndarray ,np .ndarray ]:
+        """Row index of each id in `product_ids` (sorted `self.product_ids`) and whether it was found."""
+        ids =np .array (product_ids ,dtype =np .int64 )
+        rows =np .minimum (np .searchsorted (self .product_ids ,ids ),max (len (self .product_ids )-1 ,0 ))
+        found =self .product_ids [rows ]==ids if len (self .product_ids )else np .zeros (len (ids ),dtype =bool )
+        return rows ,found 
+
+
+async def load_demand_history (db :AsyncSession ,user_id :int ,days :int ,today :Optional [date ]=None )->DemandHistory :
+    """Load the last `days` complete days of the daily sales rollup into a products x days matrix.
+
+    The sales come back as three parallel arrays in a single row, which the driver decodes
+    much faster than one row per product and day. Pending purchase order quantities are
+    loaded alongside as stock on order.
+    """
+    today =today or datetime .now (timezone .utc ).date ()
+    start =today -timedelta (days =days )
+    p =models .Product 
+    daily =models .DailySales 
+    po =models .PurchaseOrder 
+
+    async def products (session :AsyncSession ):
+        stmt =(
+        select (p .id ,p .sku ,p .name ,p .quantity ,p .supplier_id )
+        .where (p .user_id ==user_id )
+        .order_by (p .id )
+        )
+        return (await session .execute (stmt )).all ()
+
+    async def sales (session :AsyncSession ):
+        stmt =(
+        select (
+        func .array_agg (daily .product_id ),
+        func .array_agg (daily .day -literal (start ,Date )),
+        func .array_agg (daily .units )
+        )
+        .where (daily .user_id ==user_id ,daily .day >=start ,daily .day <today )
+        )
+        return (await session .execute (stmt )).one ()
+
+    async def pending (session :AsyncSession ):
+        stmt =(
+        select (po .product_id ,func .sum (po .quantity_ordered ))
+        .where (po .user_id ==user_id ,po .status =='pending')
+        .group_by (po .product_id )
+        )
+        return (await session .execute (stmt )).all ()
+
+    product_rows ,sale_rows ,pending_rows =await gather_reads (db ,products ,sales ,pending )
+
+    history =DemandHistory (start ,product_rows ,days )
+    sale_products ,sale_days ,sale_units =sale_rows 
+    if sale_products :
+        rows ,found =history .rows_for (sale_products )
+        cols =np .array (sale_days ,dtype =np .int64 )
+        history .units [rows [found ],cols [found ]]=np .array (sale_units ,dtype =np .float64 )[found ]
+    if pending_rows :
+        pending_products ,pending_units =zip (*pending_rows )
+        rows ,found =history .rows_for (pending_products )
+        history .on_order [rows [found ]]=np .array (pending_units ,dtype =np .float64 )[found ]
+    return history 
+
+
+def daily_demand (units :np .ndarray ,method :str ='ses',window :int =28 ,alpha :float =0.3 )->np .ndarray :
+    """Forecast units per day for every row of `units` (products x days, oldest day first).
+
+    ``sma`` averages the last `window` days; ``ses`` is simple exponential smoothing with
+    factor `alpha`, evaluated for all products at once as a weighted sum over the days
+    (the first day seeds the level).
+    """
+    days =units .shape [1 ]
+    if days ==0 :
+        return np .zeros (units .shape [0 ])
+    if method =='sma':
+        return units [:,-min (window ,days ):].mean (axis =1 )
+    if method =='ses':
+        age =np .arange (days -1 ,-1 ,-1 )
+        weights =alpha *(1 -alpha )**age 
+        weights [0 ]=(1 -alpha )**(days -1 )
+        return units @weights 
+    raise ValueError (f"Unknown forecast method '{method }'")
+
+
+def reorder_plan (history :DemandHistory ,method :str ='ses',window :int =28 ,alpha :float =0.3 ,
+lead_time_days :float =7 ,cover_days :float =14 ,safety_factor :float =1.65 )->dict :
+    """Vectorised reorder points and order quantities for every product of `history`.
+
+    Lead-time demand is the forecast rate over `lead_time_days`; safety stock is
+    `safety_factor` standard deviations of daily demand over the lead time. A product is
+    reordered once stock plus pending orders falls to its reorder point, up to enough
+    stock to also cover `cover_days` of demand.
+    """
+    rate =daily_demand (history .units ,method ,window ,alpha )
+    spread =history .units .std (axis =1 )if history .units .shape [1 ]else np .zeros_like (rate )
+    lead_time_demand =rate *lead_time_days 
+    safety_stock =safety_factor *spread *np .sqrt (lead_time_days )
+    reorder_point =lead_time_demand +safety_stock 
+    position =history .quantity +history .on_order 
+    target =reorder_point +rate *cover_days 
+    suggested =np .where (
+    (position <=reorder_point )&(rate >0 ),
+    np .ceil (np .maximum (target -position ,0 )),
+    0 
+    ).astype (np .int64 )
+    return {
+    'daily_demand':rate ,
+    'lead_time_demand':lead_time_demand ,
+    'safety_stock':safety_stock ,
+    'reorder_point':reorder_point ,
+    'suggested_quantity':suggested ,
+    }
+
+
+def suggestion_rows (history :DemandHistory ,plan :dict ,only_reorder :bool =True )->List [dict ]:
+    """Per-product rows of `plan` (only those with a suggested order unless `only_reorder` is off)."""
+    indexes =np .flatnonzero (plan ['suggested_quantity'])if only_reorder else np .arange (len (history .products ))
+    columns ={name :values [indexes ].tolist ()for name ,values in plan .items ()}
+    on_order =history .on_order [indexes ].tolist ()
+    out =[]
+    for n ,i in enumerate (indexes .tolist ()):
+        product =history .products [i ]
+        out .append ({
+        'product_id':product .id ,
+        'sku':product .sku ,
+        'name':product .name ,
+        'supplier_id':product .supplier_id ,
+        'quantity':product .quantity ,
+        'on_order':int (on_order [n ]),
+        'daily_demand':round (columns ['daily_demand'][n ],4 ),
+        'lead_time_demand':round (columns ['lead_time_demand'][n ],2 ),
+        'safety_stock':round (columns ['safety_stock'][n ],2 ),
+        'reorder_point':round (columns ['reorder_point'][n ],2 ),
+        'suggested_quantity':columns ['suggested_quantity'][n ],
+        })
+    return out 
@@ -0,0 +1,178 @@
+import asyncio 
+import os 
+import tempfile 
+import uuid 
+from datetime import datetime ,timedelta ,timezone 
+from typing import AsyncIterator ,Awaitable ,Callable ,Dict ,List ,Optional ,Set ,Tuple 
+
+from fastapi import UploadFile 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..database import async_session 
+from .csv_upload import CSV_CHUNK_SIZE ,iter_csv_rows 
+
+
+IMPORT_WORKERS =int (os .getenv ('IMPORT_WORKERS','2'))
+MAX_ACTIVE_IMPORTS_PER_USER =int (os .getenv ('MAX_ACTIVE_IMPORTS_PER_USER','2'))
+MAX_ACTIVE_IMPORTS =int (os .getenv ('MAX_ACTIVE_IMPORTS','20'))
+IMPORT_JOB_RETENTION =timedelta (hours =int (os .getenv ('IMPORT_JOB_RETENTION_HOURS','24')))
+
+ACTIVE_STATUSES =('queued','running')
+
+
+class ImportQuotaExceeded (RuntimeError ):
+    """Raised when a new import would exceed the per-user or process-wide job limits."""
+
+
+class ImportJob :
+    """State of one background CSV import; the uploaded file is spooled to `path`."""
+
+    def __init__ (self ,kind :str ,user_id :int ,path :str ,filename :Optional [str ]):
+        self .id =uuid .uuid4 ().hex 
+        self .kind =kind 
+        self .user_id =user_id 
+        self .path =path 
+        self .filename =filename 
+        self .status ='queued'
+        self .rows_done =0 
+        self .result :Optional [dict ]=None 
+        self .error :Optional [str ]=None 
+        self .created_at =datetime .now (timezone .utc )
+        self .started_at :Optional [datetime ]=None 
+        self .finished_at :Optional [datetime ]=None 
+        self ._failures :Callable [[],list ]=list 
+
+    def watch (self ,failures :Callable [[],list ])->None :
+        """Register a callable returning the current list of failed rows."""
+        self ._failures =failures 
+
+    @property 
+    def errors (self )->list :
+        return self ._failures ()
+
+    async def rows (self )->AsyncIterator [Tuple [int ,dict ]]:
+        """Stream the spooled CSV, counting rows as they are handed out."""
+        with open (self .path ,'rb')as fh :
+            async for row_no ,row in iter_csv_rows (fh ):
+                self .rows_done +=1 
+                yield row_no ,row 
+
+    def summary (self ,offset :int =0 ,limit :int =100 )->dict :
+        errors =self .errors 
+        return {
+        "id":self .id ,
+        "kind":self .kind ,
+        "filename":self .filename ,
+        "status":self .status ,
+        "rows_done":self .rows_done ,
+        "rows_failed":len (errors ),
+        "errors":errors [offset :offset +limit ],
+        "errors_offset":offset ,
+        "errors_total":len (errors ),
+        "error":self .error ,
+        "result":{k :v for k ,v in self .result .items ()if k not in ('errors','results')}if self .result else None ,
+        "created_at":self .created_at ,
+        "started_at":self .started_at ,
+        "finished_at":self .finished_at ,
+        }
+
+
+JobHandler =Callable [[AsyncSession ,ImportJob ],Awaitable [dict ]]
+
+
+class ImportJobManager :
+    """In-process registry and bounded worker pool for background imports.
+
+    At most `workers` jobs run at once (each holds one DB connection); queued and running
+    jobs are capped per user and across the process so imports cannot starve interactive
+    requests.
+    """
+
+    def __init__ (self ,workers :int =IMPORT_WORKERS ,max_per_user :int =MAX_ACTIVE_IMPORTS_PER_USER ,
+    max_active :int =MAX_ACTIVE_IMPORTS ):
+        self .workers =workers 
+        self .max_per_user =max_per_user 
+        self .max_active =max_active 
+        self .jobs :Dict [str ,ImportJob ]={}
+        self ._slots :Optional [asyncio .Semaphore ]=None 
+        self ._tasks :Set [asyncio .Task ]=set ()
+
+    def _active (self ,user_id :Optional [int ]=None )->List [ImportJob ]:
+        return [
+        j for j in self .jobs .values ()
+        if j .status in ACTIVE_STATUSES and (user_id is None or j .user_id ==user_id )
+        ]
+
+    def _prune (self )->None :
+        cutoff =datetime .now (timezone .utc )-IMPORT_JOB_RETENTION 
+        for job_id ,job in list (self .jobs .items ()):
+            if job .finished_at and job .finished_at <cutoff :
+                del self .jobs [job_id ]
+
+    async def submit (self ,kind :str ,user_id :int ,file :UploadFile ,handler :JobHandler )->ImportJob :
+        """Spool `file` to disk and queue `handler` for it; raises ImportQuotaExceeded when at capacity."""
+        self ._prune ()
+        if len (self ._active (user_id ))>=self .max_per_user :
+            raise ImportQuotaExceeded (f"Too many imports in progress (limit {self .max_per_user } per user)")
+        if len (self ._active ())>=self .max_active :
+            raise ImportQuotaExceeded ("Import queue is full, try again later")
+
+        fd ,path =tempfile .mkstemp (prefix =f"import-{kind }-",suffix ='.csv')
+        job =ImportJob (kind ,user_id ,path ,file .filename )
+        self .jobs [job .id ]=job 
+        try :
+            with os .fdopen (fd ,'wb')as out :
+                while True :
+                    chunk =await file .read (CSV_CHUNK_SIZE )
+                    if not chunk :
+                        break 
+                    out .write (chunk )
+        except Exception :
+            del self .jobs [job .id ]
+            os .remove (path )
+            raise 
+
+        task =asyncio .create_task (self ._run (job ,handler ))
+        self ._tasks .add (task )
+        task .add_done_callback (self ._tasks .discard )
+        return job 
+
+    async def _run (self ,job :ImportJob ,handler :JobHandler )->None :
+        if self ._slots is None :
+            self ._slots =asyncio .Semaphore (self .workers )
+        try :
+            async with self ._slots :
+                job .status ='running'
+                job .started_at =datetime .now (timezone .utc )
+                async with async_session ()as db :
+                    job .result =await handler (db ,job )
+                job .status ='completed'
+        except asyncio .CancelledError :
+            job .status ='cancelled'
+            job .error ='Import was cancelled'
+            raise 
+        except Exception as e :
+            job .status ='failed'
+            job .error =str (e )
+        finally :
+            job .finished_at =datetime .now (timezone .utc )
+            try :
+                os .remove (job .path )
+            except OSError :
+                pass 
+
+    def get (self ,job_id :str ,user_id :int )->Optional [ImportJob ]:
+        job =self .jobs .get (job_id )
+        if job is None or job .user_id !=user_id :
+            return None 
+        return job 
+
+    def for_user (self ,user_id :int )->List [ImportJob ]:
+        return sorted (
+        (j for j in self .jobs .values ()if j .user_id ==user_id ),
+        key =lambda j :j .created_at ,
+        reverse =True 
+        )
+
+
+import_jobs =ImportJobManager ()
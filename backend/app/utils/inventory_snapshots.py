@@ -0,0 +1,167 @@
+import argparse 
+import asyncio 
+from datetime import date ,datetime ,timezone 
+from typing import Dict ,Iterable ,Optional ,Tuple 
+
+from sqlalchemy import Date ,cast ,exists ,func ,select 
+from sqlalchemy .dialects .postgresql import insert as pg_insert 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from ..database import Base ,async_session ,engine 
+
+
+def _as_utc (moment :datetime )->datetime :
+    """`moment` in UTC; naive datetimes are local time, as asyncpg stores them in timestamptz columns."""
+    return moment .astimezone (timezone .utc )
+
+
+def snapshot_month (moment :datetime )->date :
+    """First day of the UTC month `moment` falls in."""
+    moment =_as_utc (moment )
+    return date (moment .year ,moment .month ,1 )
+
+
+def _upsert (rows :list ):
+    snap =models .InventorySnapshot 
+    stmt =pg_insert (snap ).values (rows )
+    return stmt .on_conflict_do_update (
+    constraint ='unique_snapshot_per_month',
+    set_ ={
+    'closing_quantity':stmt .excluded .closing_quantity ,
+    'closing_value':stmt .excluded .closing_value ,
+    'movement_at':stmt .excluded .movement_at ,
+    'updated_at':func .now (),
+    },
+    where =snap .movement_at <=stmt .excluded .movement_at 
+    )
+
+
+async def record_snapshots (db :AsyncSession ,movements :Iterable [dict ],prices :Dict [int ,float ])->None :
+    """Fold stock movements (dicts shaped like StockMovement rows) into the monthly snapshots.
+
+    Only the latest movement per product and month is kept, and an existing snapshot is
+    only overwritten by a movement that is not older than the one it was built from, so
+    back-dated movements never replace a later closing quantity.
+    """
+    latest :Dict [Tuple [int ,int ,date ],dict ]={}
+    for m in movements :
+        if m .get ('user_id')is None :
+            continue 
+        moved_at =_as_utc (m .get ('transaction_date')or datetime .now ())
+        key =(m ['user_id'],m ['product_id'],snapshot_month (moved_at ))
+        current =latest .get (key )
+        if current is None or current ['movement_at']<=moved_at :
+            latest [key ]={
+            'user_id':m ['user_id'],
+            'product_id':m ['product_id'],
+            'month':key [2 ],
+            'closing_quantity':m ['quantity_after'],
+            'closing_value':m ['quantity_after']*float (prices .get (m ['product_id'])or 0 ),
+            'movement_at':moved_at ,
+            }
+    if latest :
+        await db .execute (_upsert (list (latest .values ())))
+
+
+async def record_snapshot (db :AsyncSession ,movement :models .StockMovement ,price :float )->None :
+    """Fold a single StockMovement into the snapshots."""
+    await record_snapshots (db ,[{
+    'user_id':movement .user_id ,
+    'product_id':movement .product_id ,
+    'quantity_after':movement .quantity_after ,
+    'transaction_date':movement .transaction_date ,
+    }],{movement .product_id :price })
+
+
+async def backfill_snapshots (db :AsyncSession ,user_id :Optional [int ]=None )->int :
+    """Rebuild snapshots from the whole movement ledger (optionally for one user); returns rows written.
+
+    Users without any snapshot are backfilled on startup (`backfill_missing_snapshots`); a
+    full rebuild runs from the backend directory:
+    ``python -m app.utils.inventory_snapshots [--user-id ID]``.
+    """
+    sm =models .StockMovement 
+    p =models .Product 
+    moved_at =func .coalesce (sm .transaction_date ,sm .created_at )
+    ledger =(
+    select (
+    sm .id ,
+    sm .user_id ,
+    sm .product_id ,
+    cast (func .date_trunc ('month',func .timezone ('UTC',moved_at )),Date ).label ('month'),
+    sm .quantity_after ,
+    (sm .quantity_after *p .price ).label ('closing_value'),
+    moved_at .label ('movement_at')
+    )
+    .join (p ,p .id ==sm .product_id )
+    .where (sm .user_id .is_not (None ))
+    )
+    if user_id is not None :
+        ledger =ledger .where (sm .user_id ==user_id )
+    ledger =ledger .subquery ('ledger')
+
+    latest =(
+    select (
+    ledger .c .user_id ,
+    ledger .c .product_id ,
+    ledger .c .month ,
+    ledger .c .quantity_after ,
+    ledger .c .closing_value ,
+    ledger .c .movement_at 
+    )
+    .distinct (ledger .c .user_id ,ledger .c .product_id ,ledger .c .month )
+    .order_by (ledger .c .user_id ,ledger .c .product_id ,ledger .c .month ,ledger .c .movement_at .desc (),ledger .c .id .desc ())
+    )
+
+    snap =models .InventorySnapshot 
+    stmt =pg_insert (snap ).from_select (
+    ['user_id','product_id','month','closing_quantity','closing_value','movement_at'],latest 
+    )
+    stmt =stmt .on_conflict_do_update (
+    constraint ='unique_snapshot_per_month',
+    set_ ={
+    'closing_quantity':stmt .excluded .closing_quantity ,
+    'closing_value':stmt .excluded .closing_value ,
+    'movement_at':stmt .excluded .movement_at ,
+    'updated_at':func .now (),
+    }
+    )
+    result =await db .execute (stmt )
+    return result .rowcount 
+
+
+async def backfill_missing_snapshots (db :AsyncSession )->int :
+    """Backfill every user who has stock movements but no snapshots yet; returns rows written.
+
+    Called on startup so history recorded before the snapshot table existed shows up in the
+    inventory trend. An advisory lock keeps concurrently starting workers from doing it twice.
+    """
+    await db .execute (select (func .pg_advisory_xact_lock (func .hashtext ('inventory_snapshots:backfill'))))
+    sm =models .StockMovement 
+    snap =models .InventorySnapshot 
+    stmt =select (sm .user_id ).distinct ().where (
+    sm .user_id .is_not (None ),
+    ~exists ().where (snap .user_id ==sm .user_id )
+    )
+    written =0 
+    for user_id in (await db .execute (stmt )).scalars ().all ():
+        written +=await backfill_snapshots (db ,user_id )
+    return written 
+
+
+async def _main (user_id :Optional [int ])->None :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    async with async_session ()as db :
+        written =await backfill_snapshots (db ,user_id )
+        await db .commit ()
+    await engine .dispose ()
+    print (f"{written } inventory snapshots written")
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description ="Backfill monthly inventory snapshots from stock movements.")
+    parser .add_argument ("--user-id",type =int ,default =None )
+    args =parser .parse_args ()
+    asyncio .run (_main (args .user_id ))
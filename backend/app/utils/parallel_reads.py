@@ -0,0 +1,30 @@
+import asyncio 
+import os 
+from typing import Any ,Awaitable ,Callable ,List 
+
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..database import async_session 
+
+
+PARALLEL_READS_PER_REQUEST =int (os .getenv ('PARALLEL_READS_PER_REQUEST','4'))
+
+
+async def gather_reads (db :AsyncSession ,*reads :Callable [[AsyncSession ],Awaitable [Any ]],
+limit :int =PARALLEL_READS_PER_REQUEST )->List [Any ]:
+    """Run independent read-only callables concurrently and return their results in order.
+
+    The first read uses the request's session `db`; the others each get their own session
+    (and so their own pooled connection). At most `limit` reads, counting the one on `db`,
+    run at the same time.
+    """
+    semaphore =asyncio .Semaphore (max (limit ,1 ))
+
+    async def run (index :int ,read ):
+        async with semaphore :
+            if index ==0 :
+                return await read (db )
+            async with async_session ()as own :
+                return await read (own )
+
+    return list (await asyncio .gather (*(run (i ,read )for i ,read in enumerate (reads ))))
@@ -0,0 +1,309 @@
+from datetime import datetime 
+from typing import Dict ,List ,Optional ,Set 
+
+from sqlalchemy import func ,insert ,literal_column ,select ,update 
+from sqlalchemy .dialects .postgresql import insert as pg_insert 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models ,schemas 
+from .analytics_cache import mark_changed 
+from .inventory_snapshots import record_snapshots 
+
+
+PRODUCT_BATCH_SIZE =1000 
+CONFLICT_MODES =('skip','update','fail')
+
+PRODUCT_FIELDS =('name','sku','category_id','description','price','quantity','low_stock_threshold','supplier_id')
+
+
+class ProductImporter :
+    """Bulk product catalog import.
+
+    Category and supplier names are resolved once per distinct value, rows are validated as
+    they stream in and written in batches with ``INSERT ... ON CONFLICT (sku, user_id)``.
+    `on_conflict` decides what happens to SKUs that already exist: ``skip`` leaves them
+    untouched, ``update`` overwrites them (recording quantity changes as ``adjustment`` stock
+    movements) and ``fail`` rejects the whole import: the batch with the first conflict is
+    reported row by row and later rows are ignored. Nothing is committed here; the caller
+    commits (or rolls back when `aborted` is set).
+    """
+
+    def __init__ (self ,db :AsyncSession ,user_id :int ,on_conflict :str ='skip',batch_size :int =PRODUCT_BATCH_SIZE ):
+        if on_conflict not in CONFLICT_MODES :
+            raise ValueError (f"on_conflict must be one of: {', '.join (CONFLICT_MODES )}")
+        self .db =db 
+        self .user_id =user_id 
+        self .on_conflict =on_conflict 
+        self .batch_size =batch_size 
+
+        self .results :List [dict ]=[]
+        self .created =0 
+        self .updated =0 
+        self .skipped =0 
+        self .aborted =False 
+
+        self ._pending :List [dict ]=[]
+        self ._categories :Dict [str ,Optional [int ]]={}
+        self ._suppliers :Dict [str ,Optional [int ]]={}
+        self ._seen_skus :Dict [str ,int ]={}
+
+    def _error (self ,row_no :int ,error :str )->None :
+        self .results .append ({"row":row_no ,"ok":False ,"error":error })
+
+    def parse_row (self ,row_no :int ,row :dict )->Optional [dict ]:
+        """Coerce and validate one CSV row; category/supplier names are resolved later."""
+        data =dict (row )
+        for num_field ,cast in (('price',float ),('quantity',int ),('low_stock_threshold',int )):
+            if data .get (num_field )is not None :
+                try :
+                    data [num_field ]=cast (float (data [num_field ]))
+                except Exception :
+                    self ._error (row_no ,f"Invalid number for {num_field }: {data .get (num_field )}")
+                    return None 
+
+        product_data ={
+        'name':data .get ('name'),
+        'sku':data .get ('sku'),
+        'category_id':None ,
+        'description':data .get ('description'),
+        'price':data .get ('price'),
+        'quantity':data .get ('quantity')or 0 ,
+        'low_stock_threshold':data .get ('low_stock_threshold')or 0 ,
+        'supplier_id':None ,
+        'user_id':self .user_id 
+        }
+        try :
+            p_schema =schemas .ProductCreate .model_validate (product_data )
+        except Exception as e :
+            self ._error (row_no ,f"Validation error: {e }")
+            return None 
+
+        sku =p_schema .sku 
+        if sku :
+            first_row =self ._seen_skus .get (sku )
+            if first_row is not None :
+                self ._error (row_no ,f"Duplicate SKU '{sku }' in file (first seen on row {first_row })")
+                return None 
+            self ._seen_skus [sku ]=row_no 
+
+        return {
+        'row_no':row_no ,
+        'category':data .get ('category'),
+        'supplier':data .get ('supplier'),
+        'values':p_schema .model_dump (),
+        }
+
+    async def add_row (self ,row_no :int ,row :dict )->None :
+        if self .aborted :
+            return 
+        entry =self .parse_row (row_no ,row )
+        if entry is None :
+            return 
+        self ._pending .append (entry )
+        if len (self ._pending )>=self .batch_size :
+            await self .flush ()
+
+    async def finish (self )->dict :
+        await self .flush ()
+        self .results .sort (key =lambda r :r ["row"])
+        return {
+        "results":self .results ,
+        "created":self .created ,
+        "updated":self .updated ,
+        "skipped":self .skipped ,
+        "committed":not self .aborted ,
+        }
+
+    async def _resolve_names (self ,model ,cache :Dict [str ,Optional [int ]],names :Set [str ])->None :
+        names =names -cache .keys ()
+        if not names :
+            return 
+        stmt =select (model .id ,model .name ).where (model .user_id ==self .user_id ,model .name .in_ (names ))
+        for r in (await self .db .execute (stmt )).all ():
+            cache [r .name ]=r .id 
+        for name in names :
+            cache .setdefault (name ,None )
+
+    async def resolve (self ,entries :List [dict ])->List [dict ]:
+        """Attach category/supplier ids to `entries`, reporting unknown names; returns the valid entries."""
+        await self ._resolve_names (models .ProductCategory ,self ._categories ,{e ['category']for e in entries if e ['category']})
+        await self ._resolve_names (models .Supplier ,self ._suppliers ,{e ['supplier']for e in entries if e ['supplier']})
+
+        valid =[]
+        for e in entries :
+            if e ['category']:
+                e ['values']['category_id']=self ._categories .get (e ['category'])
+                if e ['values']['category_id']is None :
+                    self ._error (e ['row_no'],f"Category '{e ['category']}' not found for current user")
+                    continue 
+            if e ['supplier']:
+                e ['values']['supplier_id']=self ._suppliers .get (e ['supplier'])
+                if e ['values']['supplier_id']is None :
+                    self ._error (e ['row_no'],f"Supplier '{e ['supplier']}' not found for current user")
+                    continue 
+            valid .append (e )
+        return valid 
+
+    async def flush (self )->None :
+        entries ,self ._pending =self ._pending ,[]
+        if not entries :
+            return 
+        entries =await self .resolve (entries )
+        if not entries :
+            return 
+        mark_changed (self .db ,self .user_id )
+        await self .write (entries )
+
+    async def write (self ,entries :List [dict ])->None :
+        """Insert/upsert resolved entries and record per-row results."""
+        with_sku =[e for e in entries if e ['values']['sku']]
+        without_sku =[e for e in entries if not e ['values']['sku']]
+
+        if without_sku :
+            stmt =pg_insert (models .Product ).returning (models .Product .id ,sort_by_parameter_order =True )
+            result =await self .db .execute (stmt ,[e ['values']for e in without_sku ])
+            for e ,product_id in zip (without_sku ,result .scalars ().all ()):
+                self .created +=1 
+                self .results .append ({"row":e ['row_no'],"ok":True ,"product_id":product_id ,"action":"created"})
+
+        if not with_sku :
+            return 
+        before ={}
+        if self .on_conflict =='update':
+            current =select (models .Product .sku ,models .Product .quantity ).where (
+            models .Product .user_id ==self .user_id ,
+            models .Product .sku .in_ ([e ['values']['sku']for e in with_sku ])
+            ).with_for_update ()
+            before ={r .sku :r .quantity for r in (await self .db .execute (current )).all ()}
+        stmt =pg_insert (models .Product ).values ([e ['values']for e in with_sku ])
+        if self .on_conflict =='update':
+            stmt =stmt .on_conflict_do_update (
+            index_elements =[models .Product .sku ,models .Product .user_id ],
+            set_ ={**{f :stmt .excluded [f ]for f in PRODUCT_FIELDS if f !='sku'},'last_updated':func .now ()}
+            )
+        else :
+            stmt =stmt .on_conflict_do_nothing (index_elements =[models .Product .sku ,models .Product .user_id ])
+        stmt =stmt .returning (models .Product .id ,models .Product .sku ,literal_column ('xmax = 0').label ('inserted'))
+        written ={r .sku :r for r in (await self .db .execute (stmt )).all ()}
+
+        movements =[]
+        prices ={}
+        now =datetime .now ()
+        for e in with_sku :
+            r =written .get (e ['values']['sku'])
+            if r is None :
+                self .skipped +=1 
+                self ._error (e ['row_no'],"SKU already exists for this user")
+                if self .on_conflict =='fail':
+                    self .aborted =True 
+            elif r .inserted :
+                self .created +=1 
+                self .results .append ({"row":e ['row_no'],"ok":True ,"product_id":r .id ,"action":"created"})
+            else :
+                self .updated +=1 
+                self .results .append ({"row":e ['row_no'],"ok":True ,"product_id":r .id ,"action":"updated"})
+                quantity_before =before .get (e ['values']['sku'])
+                quantity_change =e ['values']['quantity']-(quantity_before or 0 )
+                if quantity_before is not None and quantity_change !=0 :
+                    prices [r .id ]=e ['values']['price']
+                    movements .append ({
+                    'product_id':r .id ,
+                    'user_id':self .user_id ,
+                    'movement_type':'adjustment',
+                    'quantity_change':quantity_change ,
+                    'quantity_before':quantity_before ,
+                    'quantity_after':e ['values']['quantity'],
+                    'reference_type':'product_import',
+                    'notes':f"Product import adjustment: {abs (quantity_change )} units",
+                    'transaction_date':now ,
+                    })
+
+        if movements :
+            await self .db .execute (insert (models .StockMovement ),movements )
+            await record_snapshots (self .db ,movements ,prices )
+
+
+SYNC_FIELDS =('name','category_id','description','price','quantity','low_stock_threshold','supplier_id')
+
+
+class ProductSync (ProductImporter ):
+    """Nightly catalog sync: diff incoming rows against stored products keyed by (sku, user_id).
+
+    Unknown SKUs are inserted, changed products are updated with one executemany per batch
+    and identical rows are only counted. Quantity changes are recorded as ``adjustment``
+    stock movements, like a manual product edit. The stored rows of a batch are locked (in id
+    order) while they are compared, so a sale committed meanwhile cannot be overwritten.
+    """
+
+    def __init__ (self ,db :AsyncSession ,user_id :int ,batch_size :int =PRODUCT_BATCH_SIZE ):
+        super ().__init__ (db ,user_id ,on_conflict ='skip',batch_size =batch_size )
+        self .unchanged =0 
+
+    def parse_row (self ,row_no :int ,row :dict )->Optional [dict ]:
+        entry =super ().parse_row (row_no ,row )
+        if entry is not None and not entry ['values']['sku']:
+            self ._error (row_no ,"SKU is required for catalog sync")
+            return None 
+        return entry 
+
+    async def finish (self )->dict :
+        await self .flush ()
+        self .results .sort (key =lambda r :r ["row"])
+        return {
+        "results":self .results ,
+        "inserted":self .created ,
+        "updated":self .updated ,
+        "unchanged":self .unchanged ,
+        "committed":True ,
+        }
+
+    async def write (self ,entries :List [dict ])->None :
+        stmt =select (
+        models .Product .id ,
+        models .Product .sku ,
+        *[getattr (models .Product ,f )for f in SYNC_FIELDS ]
+        ).where (
+        models .Product .user_id ==self .user_id ,
+        models .Product .sku .in_ ([e ['values']['sku']for e in entries ])
+        ).order_by (models .Product .id ).with_for_update ()
+        existing ={r .sku :r for r in (await self .db .execute (stmt )).all ()}
+
+        new_entries =[]
+        changes =[]
+        movements =[]
+        now =datetime .now ()
+        for e in entries :
+            values =e ['values']
+            current =existing .get (values ['sku'])
+            if current is None :
+                new_entries .append (e )
+                continue 
+            if all (getattr (current ,f )==values [f ]for f in SYNC_FIELDS ):
+                self .unchanged +=1 
+                continue 
+
+            changes .append ({'id':current .id ,**{f :values [f ]for f in SYNC_FIELDS }})
+            self .updated +=1 
+            self .results .append ({"row":e ['row_no'],"ok":True ,"product_id":current .id ,"action":"updated"})
+
+            quantity_change =values ['quantity']-current .quantity 
+            if quantity_change !=0 :
+                movements .append ({
+                'product_id':current .id ,
+                'user_id':self .user_id ,
+                'movement_type':'adjustment',
+                'quantity_change':quantity_change ,
+                'quantity_before':current .quantity ,
+                'quantity_after':values ['quantity'],
+                'reference_type':'catalog_sync',
+                'notes':f"Catalog sync adjustment: {abs (quantity_change )} units",
+                'transaction_date':now ,
+                })
+
+        if changes :
+            await self .db .execute (update (models .Product ),changes )
+        if movements :
+            await self .db .execute (insert (models .StockMovement ),movements )
+            await record_snapshots (self .db ,movements ,{c ['id']:c ['price']for c in changes })
+        if new_entries :
+            await super ().write (new_entries )
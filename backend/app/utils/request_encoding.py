@@ -0,0 +1,63 @@
+import zlib 
+
+from .csv_upload import CSV_CHUNK_SIZE 
+
+
+class GzipRequestMiddleware :
+    """Inflate request bodies sent with ``Content-Encoding: gzip``.
+
+    The body is decompressed as the application reads it, at most `chunk_size` bytes per
+    message, so compressed CSV uploads are never held in memory in either form. A corrupt
+    body is cut short, which the multipart parser then rejects with a 400. Once the body has
+    ended, later calls go to the server's `receive` so ``http.disconnect`` still arrives.
+    """
+
+    def __init__ (self ,app ,chunk_size :int =CSV_CHUNK_SIZE ):
+        self .app =app 
+        self .chunk_size =chunk_size 
+
+    async def __call__ (self ,scope ,receive ,send ):
+        if scope ["type"]!="http":
+            await self .app (scope ,receive ,send )
+            return 
+        encoding =dict (scope ["headers"]).get (b"content-encoding",b"").strip ().lower ()
+        if encoding not in (b"gzip",b"x-gzip"):
+            await self .app (scope ,receive ,send )
+            return 
+
+        scope =dict (scope )
+        scope ["headers"]=[
+        (k ,v )for k ,v in scope ["headers"]
+        if k not in (b"content-encoding",b"content-length")
+        ]
+        inflater =zlib .decompressobj (16 +zlib .MAX_WBITS )
+        pending =b""
+        more_body =True 
+        finished =False 
+
+        async def receive_inflated ():
+            nonlocal inflater ,pending ,more_body ,finished 
+            if finished :
+                return await receive ()
+            while True :
+                if not pending and more_body :
+                    message =await receive ()
+                    if message ["type"]!="http.request":
+                        return message 
+                    pending =message .get ("body",b"")
+                    more_body =message .get ("more_body",False )
+                try :
+                    body =inflater .decompress (pending ,self .chunk_size )
+                    pending =inflater .unconsumed_tail 
+                    if inflater .eof and inflater .unused_data :
+                        pending =inflater .unused_data 
+                        inflater =zlib .decompressobj (16 +zlib .MAX_WBITS )
+                except zlib .error :
+                    pending ,more_body ,finished =b"",False ,True 
+                    return {"type":"http.request","body":b"","more_body":False }
+                done =not pending and not more_body 
+                if body or done :
+                    finished =done 
+                    return {"type":"http.request","body":body ,"more_body":not done }
+
+        await self .app (scope ,receive_inflated ,send )
@@ -0,0 +1,119 @@
+from typing import Dict ,List ,Optional 
+
+from sqlalchemy import text 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from .sales_ingest import SalesIngestor 
+
+
+COPY_BATCH_SIZE =20000 
+
+STAGING_TABLE ='sales_copy_staging'
+STAGING_COLUMNS =('product_id','quantity','sale_price','sale_date','quantity_before','quantity_after','notes')
+
+CREATE_STAGING_SQL =f"""
+CREATE TEMP TABLE {STAGING_TABLE } (
+    sale_id integer NOT NULL DEFAULT nextval(pg_get_serial_sequence('product_sales', 'id')::regclass),
+    product_id integer NOT NULL,
+    quantity integer NOT NULL,
+    sale_price double precision NOT NULL,
+    sale_date timestamptz NOT NULL,
+    quantity_before integer NOT NULL,
+    quantity_after integer NOT NULL,
+    notes text
+) ON COMMIT DROP
+"""
+
+MERGE_SALES_SQL =f"""
+INSERT INTO product_sales (id, product_id, user_id, quantity, sale_price, sale_date)
+SELECT sale_id, product_id, :user_id, quantity, sale_price::numeric(12, 2), sale_date
+FROM {STAGING_TABLE }
+"""
+
+MERGE_MOVEMENTS_SQL =f"""
+INSERT INTO stock_movements (product_id, user_id, movement_type, quantity_change, quantity_before,
+                             quantity_after, reference_id, reference_type, notes, transaction_date)
+SELECT product_id, :user_id, 'sale', -quantity, quantity_before,
+       quantity_after, sale_id, 'sale', notes, sale_date
+FROM {STAGING_TABLE }
+"""
+
+MERGE_DAILY_SALES_SQL =f"""
+INSERT INTO daily_sales (user_id, product_id, day, units, revenue)
+SELECT :user_id, product_id, day, sum(quantity), sum(sale_price::numeric(12, 2) * quantity)
+FROM (
+    SELECT product_id, quantity, sale_price, timezone('UTC', sale_date)::date AS day
+    FROM {STAGING_TABLE }
+) AS s
+GROUP BY product_id, day
+ON CONFLICT ON CONSTRAINT unique_daily_sales DO UPDATE
+SET units = daily_sales.units + EXCLUDED.units, revenue = daily_sales.revenue + EXCLUDED.revenue
+"""
+
+MERGE_SNAPSHOTS_SQL =f"""
+INSERT INTO inventory_snapshots (user_id, product_id, month, closing_quantity, closing_value, movement_at)
+SELECT DISTINCT ON (s.product_id, s.month)
+       :user_id, s.product_id, s.month, s.quantity_after, s.quantity_after * p.price, s.sale_date
+FROM (
+    SELECT sale_id, product_id, quantity_after, sale_date,
+           date_trunc('month', timezone('UTC', sale_date))::date AS month
+    FROM {STAGING_TABLE }
+) AS s
+JOIN products AS p ON p.id = s.product_id
+ORDER BY s.product_id, s.month, s.sale_date DESC, s.sale_id DESC
+ON CONFLICT ON CONSTRAINT unique_snapshot_per_month DO UPDATE
+SET closing_quantity = EXCLUDED.closing_quantity, closing_value = EXCLUDED.closing_value,
+    movement_at = EXCLUDED.movement_at, updated_at = now()
+WHERE inventory_snapshots.movement_at <= EXCLUDED.movement_at
+"""
+
+
+def supports_copy (db :AsyncSession )->bool :
+    """COPY goes through the asyncpg driver connection, so only postgresql+asyncpg qualifies."""
+    return db .get_bind ().dialect .driver =='asyncpg'
+
+
+class CopySalesIngestor (SalesIngestor ):
+    """Sales ingestion through PostgreSQL binary COPY for very large backfills.
+
+    Rows are validated exactly like `SalesIngestor` (SKU map, in-memory stock check, same
+    per-row errors) but checked batches are streamed with asyncpg's
+    ``copy_records_to_table`` into a temp staging table. `finish` then merges the staging
+    table into product_sales, stock_movements, the inventory snapshots and the daily sales
+    rollup with set-based statements; stock is claimed per batch as in `SalesIngestor`.
+    Sale ids are drawn from the product_sales sequence while staging so every movement
+    references its sale without a round trip.
+    """
+
+    def __init__ (self ,db :AsyncSession ,user_id :int ,product_id :Optional [int ]=None ,sku :Optional [str ]=None ,
+    batch_size :int =COPY_BATCH_SIZE ):
+        super ().__init__ (db ,user_id ,product_id =product_id ,sku =sku ,batch_size =batch_size )
+        self ._staged =False 
+
+    async def _driver_connection (self ):
+        conn =await self .db .connection ()
+        raw =await conn .get_raw_connection ()
+        return raw .driver_connection 
+
+    async def write (self ,sales :List [dict ],movements :List [dict ],deltas :Dict [int ,int ])->None :
+        pg =await self ._driver_connection ()
+        if not self ._staged :
+            await pg .execute (CREATE_STAGING_SQL )
+            self ._staged =True 
+        records =[
+        (s ['product_id'],s ['quantity'],float (s ['sale_price']),s ['sale_date'],
+        m ['quantity_before'],m ['quantity_after'],m ['notes'])
+        for s ,m in zip (sales ,movements )
+        ]
+        await pg .copy_records_to_table (STAGING_TABLE ,records =records ,columns =STAGING_COLUMNS )
+
+    async def finish (self )->dict :
+        await self .flush ()
+        if self ._staged :
+            params ={'user_id':self .user_id }
+            await self .db .execute (text (MERGE_SALES_SQL ),params )
+            await self .db .execute (text (MERGE_MOVEMENTS_SQL ),params )
+            await self .db .execute (text (MERGE_SNAPSHOTS_SQL ),params )
+            await self .db .execute (text (MERGE_DAILY_SALES_SQL ),params )
+            await self .db .execute (text (f"TRUNCATE {STAGING_TABLE }"))
+        return self .result ()
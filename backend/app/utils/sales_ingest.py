@@ -0,0 +1,528 @@
+import os 
+import re 
+from datetime import datetime 
+from typing import Any ,Callable ,Dict ,List ,Optional ,Tuple 
+
+from sqlalchemy import Integer ,column ,insert ,select ,update ,values 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from .analytics_cache import mark_changed 
+from .inventory_snapshots import record_snapshots 
+from .sales_rollup import record_daily_sales 
+
+
+SALES_BATCH_SIZE =2000 
+CLAIM_ATTEMPTS =5 
+MAX_SALES_PER_REQUEST =int (os .getenv ('MAX_SALES_PER_REQUEST','1000'))
+
+SKU_COLUMNS =('sku','SKU','Sku','sku_id','SKU_ID','product_sku','productSKU')
+DATE_COLUMNS =('sale_date','date')
+SALE_DATE_FORMATS =('%Y-%m-%d','%m/%d/%Y','%d/%m/%Y')
+DATE_SAMPLE_SIZE =200 
+
+
+_SLASH_DATE =re .compile (r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+
+class StockContentionError (RuntimeError ):
+    """Raised when concurrent stock changes keep invalidating a batch's stock check."""
+
+
+def parse_sale_date (value :str )->Optional [datetime ]:
+    """Parse a CSV sale date (ISO 8601 first, then the legacy fallback formats)."""
+    try :
+        return datetime .fromisoformat (value .replace ('Z','+00:00'))
+    except ValueError :
+        pass 
+    for fmt in SALE_DATE_FORMATS :
+        try :
+            return datetime .strptime (value ,fmt )
+        except ValueError :
+            continue 
+    return None 
+
+
+def _parse_iso (value :str )->datetime :
+    return datetime .fromisoformat (value .replace ('Z','+00:00'))
+
+
+def _parse_mdy (value :str )->datetime :
+    m =_SLASH_DATE .fullmatch (value )
+    if not m :
+        raise ValueError (value )
+    return datetime (int (m .group (3 )),int (m .group (1 )),int (m .group (2 )))
+
+
+def _parse_dmy (value :str )->datetime :
+    m =_SLASH_DATE .fullmatch (value )
+    if not m :
+        raise ValueError (value )
+    return datetime (int (m .group (3 )),int (m .group (2 )),int (m .group (1 )))
+
+
+def _accepts (parse :Callable [[str ],datetime ],value :str )->bool :
+    try :
+        parse (value )
+    except ValueError :
+        return False 
+    return True 
+
+
+DATE_PARSERS :Tuple [Callable [[str ],datetime ],...]=(_parse_iso ,_parse_mdy ,_parse_dmy )
+DATE_PARSER_NAMES ={'iso':_parse_iso ,'mdy':_parse_mdy ,'dmy':_parse_dmy }
+
+
+class SalesRowParser :
+    """Row parser specialised for one file.
+
+    Built once from a sample of rows: the SKU/date header aliases present in the file are
+    looked up a single time and the date format is inferred, so every row goes through one
+    compiled date parser instead of a chain of failing attempts. Values the inferred parser
+    rejects still get the full legacy chain.
+    """
+
+    def __init__ (self ,sku_keys :Tuple ,quantity_keys :Tuple ,date_keys :Tuple ,
+    date_parser :Optional [Callable [[str ],datetime ]]=None ):
+        self .sku_keys =sku_keys 
+        self .quantity_keys =quantity_keys 
+        self .date_keys =date_keys 
+        self .date_parser =date_parser 
+
+    @classmethod 
+    def infer (cls ,rows :List [Tuple [int ,dict ]])->'SalesRowParser':
+        header ={}
+        for _row_no ,row in rows [:1 ]:
+            for key in row :
+                if isinstance (key ,str ):
+                    header .setdefault (key .strip (),[]).append (key )
+
+        def keys_for (aliases ):
+            return tuple (k for alias in aliases for k in header .get (alias ,())[-1 :])
+
+        parser =cls (keys_for (SKU_COLUMNS ),keys_for (('quantity',)),keys_for (DATE_COLUMNS ))
+
+        sample =[]
+        for _row_no ,row in rows :
+            value =parser ._first (row ,parser .date_keys )
+            if value :
+                sample .append (value )
+                if len (sample )>=DATE_SAMPLE_SIZE :
+                    break 
+        best_hits =0 
+        for candidate in DATE_PARSERS :
+            hits =sum (1 for value in sample if _accepts (candidate ,value ))
+            if hits >best_hits :
+                parser .date_parser ,best_hits =candidate ,hits 
+            if hits ==len (sample ):
+                break 
+        return parser 
+
+    def state (self )->dict :
+        """JSON-serialisable form of the inferred header aliases and date format."""
+        names ={parse :name for name ,parse in DATE_PARSER_NAMES .items ()}
+        return {
+        'sku_keys':list (self .sku_keys ),
+        'quantity_keys':list (self .quantity_keys ),
+        'date_keys':list (self .date_keys ),
+        'date_format':names .get (self .date_parser ),
+        }
+
+    @classmethod 
+    def from_state (cls ,state :dict )->'SalesRowParser':
+        """Rebuild a parser saved with `state`, so later parts of one upload parse like the first."""
+        return cls (
+        tuple (state ['sku_keys']),
+        tuple (state ['quantity_keys']),
+        tuple (state ['date_keys']),
+        DATE_PARSER_NAMES .get (state .get ('date_format')),
+        )
+
+    @staticmethod 
+    def _value (row :dict ,key ):
+        value =row .get (key )
+        return value .strip ()if isinstance (value ,str )else value 
+
+    def _first (self ,row :dict ,keys :Tuple ):
+        for key in keys :
+            value =self ._value (row ,key )
+            if value :
+                return value 
+        return None 
+
+    def parse_date (self ,value :str )->Optional [datetime ]:
+        if self .date_parser is not None :
+            try :
+                return self .date_parser (value )
+            except ValueError :
+                pass 
+        return parse_sale_date (value )
+
+    def parse (self ,row_no :int ,row :dict )->dict :
+        """Validate one CSV row without touching the database."""
+        entry ={'row_no':row_no ,'sku':None ,'error':None ,'quantity':None ,'sale_date':None }
+        try :
+            entry ['sku']=self ._first (row ,self .sku_keys )
+
+            raw_quantity =self ._first (row ,self .quantity_keys )
+            if not raw_quantity :
+                entry ['error']=f"Row {row_no }: Missing 'quantity' column"
+                return entry 
+
+            try :
+                quantity =int (raw_quantity )
+            except (ValueError ,TypeError ):
+                entry ['error']=f"Row {row_no }: Invalid quantity '{raw_quantity }' - must be a number"
+                return entry 
+
+            if quantity <=0 :
+                entry ['error']=f"Row {row_no }: Quantity must be positive, got {quantity }"
+                return entry 
+            entry ['quantity']=quantity 
+
+            date_field =self ._first (row ,self .date_keys )
+            if date_field :
+                entry ['sale_date']=self .parse_date (date_field )
+                if entry ['sale_date']is None :
+                    entry ['error']=f"Row {row_no }: Invalid date format '{date_field }'. Use YYYY-MM-DD format."
+        except (ValueError ,KeyError )as e :
+            entry ['error']=f"Row {row_no }: Invalid data - {str (e )}"
+        except Exception as e :
+            entry ['error']=f"Row {row_no }: Unexpected error - {str (e )}"
+        return entry 
+
+    def parse_many (self ,rows :List [Tuple [int ,dict ]])->List [dict ]:
+        return [self .parse (row_no ,row )for row_no ,row in rows ]
+
+
+class SalesIngestor :
+    """Set-based ingestion of sales CSV rows.
+
+    Rows are buffered and processed in batches: every SKU of a batch is resolved with a
+    single query, stock is checked against an in-memory running quantity per product, taken
+    with one conditional set-based quantity UPDATE and the batch is written with multi-row
+    inserts. Per-row
+    errors match the messages of the original row-by-row upload. The caller owns the
+    transaction and commits once all rows have been added and `finish` was awaited.
+    """
+
+    def __init__ (self ,db :AsyncSession ,user_id :int ,product_id :Optional [int ]=None ,sku :Optional [str ]=None ,
+    batch_size :int =SALES_BATCH_SIZE ):
+        self .db =db 
+        self .user_id =user_id 
+        self .product_id =product_id 
+        self .sku =sku 
+        self .batch_size =batch_size 
+
+        self .sales_created =0 
+        self .total_rows =0 
+        self .errors :List [str ]=[]
+
+        self .parser :Optional [SalesRowParser ]=None 
+        self ._pending :List [Tuple [int ,dict ]]=[]
+        self ._sku_ids :Dict [str ,Optional [int ]]={}
+        self ._products :Dict [int ,Optional [dict ]]={}
+
+    async def add_row (self ,row_no :int ,row :dict )->None :
+        self .total_rows +=1 
+        self ._pending .append ((row_no ,row ))
+        if len (self ._pending )>=self .batch_size :
+            await self .flush ()
+
+    async def finish (self )->dict :
+        await self .flush ()
+        return self .result ()
+
+    def result (self )->dict :
+        return {
+        "sales_created":self .sales_created ,
+        "errors":self .errors ,
+        "total_rows_processed":self .total_rows ,
+        }
+
+    async def _resolve (self ,entries :List [dict ])->None :
+        skus ={e ['sku']for e in entries if e ['sku']}
+        if self .sku and any (not e ['sku']for e in entries ):
+            skus .add (self .sku )
+        skus -=self ._sku_ids .keys ()
+        if skus :
+            stmt =select (models .Product .id ,models .Product .sku ,models .Product .quantity ,models .Product .price ).where (
+            models .Product .user_id ==self .user_id ,
+            models .Product .sku .in_ (skus )
+            )
+            for r in (await self .db .execute (stmt )).all ():
+                self ._sku_ids [r .sku ]=r .id 
+                self ._products .setdefault (r .id ,{'quantity':r .quantity ,'price':r .price })
+            for s in skus :
+                self ._sku_ids .setdefault (s ,None )
+
+        if self .product_id and self .product_id not in self ._products :
+            stmt =select (models .Product .id ,models .Product .quantity ,models .Product .price ).where (
+            models .Product .id ==self .product_id ,
+            models .Product .user_id ==self .user_id 
+            )
+            r =(await self .db .execute (stmt )).first ()
+            self ._products [self .product_id ]={'quantity':r .quantity ,'price':r .price }if r else None 
+
+    def _product_for (self ,entry :dict ):
+        """Return (product_id, error) following the precedence of the row-by-row upload."""
+        row_no =entry ['row_no']
+        if entry ['sku']:
+            pid =self ._sku_ids .get (entry ['sku'])
+            if pid is None :
+                return None ,f"Row {row_no }: Product with SKU '{entry ['sku']}' not found for user"
+            return pid ,None 
+        if self .product_id :
+            return self .product_id ,None 
+        if self .sku :
+            pid =self ._sku_ids .get (self .sku )
+            if pid is None :
+                return None ,f"Row {row_no }: Product with SKU '{self .sku }' not found for user (form sku)"
+            return pid ,None 
+        return None ,f"Row {row_no }: No SKU in CSV and no product_id/sku provided in upload request"
+
+    async def flush (self )->None :
+        """Parse, resolve, check and write the buffered rows."""
+        rows ,self ._pending =self ._pending ,[]
+        if not rows :
+            return 
+        if self .parser is None :
+            self .parser =SalesRowParser .infer (rows )
+        entries =self .parser .parse_many (rows )
+        await self ._resolve (entries )
+        for _ in range (CLAIM_ATTEMPTS ):
+            error_count =len (self .errors )
+            sales ,movements ,deltas =self .check (entries )
+            if not sales :
+                return 
+            if await self .claim_stock (movements ,deltas ):
+                break 
+            del self .errors [error_count :]
+        else :
+            raise StockContentionError ("Stock kept changing while the upload was processed; please retry")
+        mark_changed (self .db ,self .user_id )
+        await self .write (sales ,movements ,deltas )
+        self .sales_created +=len (sales )
+
+    def check (self ,entries :List [dict ]):
+        """Apply per-row product and stock checks; returns (sales, movements, per-product units sold)."""
+        sales =[]
+        movements =[]
+        deltas :Dict [int ,int ]={}
+        for entry in entries :
+            row_no =entry ['row_no']
+            pid ,error =self ._product_for (entry )
+            error =error or entry ['error']
+            if error :
+                self .errors .append (error )
+                continue 
+
+            product =self ._products .get (pid )
+            if not product :
+                self .errors .append (f"Row {row_no }: Product with ID {pid } not found")
+                continue 
+
+            quantity =entry ['quantity']
+            if product ['quantity']<quantity :
+                self .errors .append (f"Row {row_no }: Insufficient stock (available: {product ['quantity']}, requested: {quantity })")
+                continue 
+
+            quantity_before =product ['quantity']
+            product ['quantity']=quantity_before -quantity 
+            sale_date =entry ['sale_date']or datetime .now ()
+            deltas [pid ]=deltas .get (pid ,0 )+quantity 
+            sales .append ({
+            'product_id':pid ,
+            'user_id':self .user_id ,
+            'quantity':quantity ,
+            'sale_price':product ['price'],
+            'sale_date':sale_date ,
+            })
+            movements .append ({
+            'product_id':pid ,
+            'user_id':self .user_id ,
+            'movement_type':'sale',
+            'quantity_change':-quantity ,
+            'quantity_before':quantity_before ,
+            'quantity_after':product ['quantity'],
+            'reference_type':'sale',
+            'notes':f"CSV upload sale of {quantity } units at ${product ['price']} each",
+            'transaction_date':sale_date ,
+            })
+
+        return sales ,movements ,deltas 
+
+    async def claim_stock (self ,movements :List [dict ],deltas :Dict [int ,int ])->bool :
+        """Claim the stock of a checked batch (see the module-level `claim_stock`)."""
+        return await claim_stock (self .db ,self ._products ,movements ,deltas )
+
+    async def write (self ,sales :List [dict ],movements :List [dict ],deltas :Dict [int ,int ])->None :
+        """Insert the checked sales and movements (the stock was already claimed)."""
+        await write_sales (self .db ,sales ,movements ,{pid :self ._products [pid ]['price']for pid in deltas })
+
+
+async def claim_stock (db :AsyncSession ,products :Dict [int ,dict ],movements :List [dict ],deltas :Dict [int ,int ])->bool :
+    """Take checked units out of stock with one conditional UPDATE.
+
+    `products` holds the quantities the units were checked against. Each product is only
+    decremented while its stock covers the units, so concurrent sales can never oversell
+    it. When they moved the stock since it was loaded, the movements are shifted onto the
+    actual quantities; when a product no longer has enough, the units already taken are
+    put back, the quantities are reloaded (products deleted meanwhile become None) and
+    False is returned so the batch is checked again.
+    """
+    stock =await apply_quantity_deltas (db ,{pid :-qty for pid ,qty in deltas .items ()},require_stock =True )
+    if len (stock )<len (deltas ):
+        if stock :
+            await apply_quantity_deltas (db ,{pid :deltas [pid ]for pid in stock })
+        stmt =select (models .Product .id ,models .Product .quantity ).where (models .Product .id .in_ (deltas ))
+        current =dict ((await db .execute (stmt )).all ())
+        for pid in deltas :
+            if pid in current :
+                products [pid ]['quantity']=current [pid ]
+            else :
+                products [pid ]=None 
+        return False 
+
+    shifts ={pid :row .quantity -products [pid ]['quantity']for pid ,row in stock .items ()}
+    for movement in movements :
+        shift =shifts [movement ['product_id']]
+        movement ['quantity_before']+=shift 
+        movement ['quantity_after']+=shift 
+    for pid ,row in stock .items ():
+        products [pid ]['quantity']=row .quantity 
+    return True 
+
+
+async def write_sales (db :AsyncSession ,sales :List [dict ],movements :List [dict ],prices :Dict [int ,Any ])->List [int ]:
+    """Insert sales and their movements (one per sale, same order) with multi-row inserts.
+
+    Also folds them into the daily sales rollup and the inventory snapshots; returns the
+    new sale ids in order.
+    """
+    result =await db .execute (
+    insert (models .ProductSale ).returning (models .ProductSale .id ,sort_by_parameter_order =True ),
+    sales 
+    )
+    sale_ids =result .scalars ().all ()
+    for movement ,sale_id in zip (movements ,sale_ids ):
+        movement ['reference_id']=sale_id 
+    await record_daily_sales (db ,sale_ids )
+    await db .execute (insert (models .StockMovement ),movements )
+    await record_snapshots (db ,movements ,prices )
+    return sale_ids 
+
+
+async def record_sale_lines (db :AsyncSession ,user_id :int ,items :List [dict ])->List [dict ]:
+    """Record a batch of sale line items (product_id, quantity, optional sale_date) of one user.
+
+    Products are loaded with one query and every line is checked against a running
+    quantity per product; the accepted lines are claimed with one conditional UPDATE and
+    written with multi-row inserts. Products deleted while the batch is claimed get
+    "Product not found". Returns one result per line, in order, with either the new sale
+    id or an error. The caller commits.
+    """
+    product_ids ={item ['product_id']for item in items }
+    stmt =select (models .Product .id ,models .Product .quantity ,models .Product .price ).where (
+    models .Product .id .in_ (product_ids ),
+    models .Product .user_id ==user_id 
+    )
+    products ={r .id :{'quantity':r .quantity ,'price':r .price }for r in (await db .execute (stmt )).all ()}
+
+    for _ in range (CLAIM_ATTEMPTS ):
+        results =[]
+        accepted =[]
+        sales =[]
+        movements =[]
+        deltas :Dict [int ,int ]={}
+        for line ,item in enumerate (items ,start =1 ):
+            pid =item ['product_id']
+            quantity =item ['quantity']
+            result ={'line':line ,'product_id':pid ,'quantity':quantity ,'sale_id':None ,'sale_price':None ,
+            'quantity_after':None ,'error':None }
+            results .append (result )
+            product =products .get (pid )
+            if product is None :
+                result ['error']="Product not found"
+                continue 
+            if quantity <=0 :
+                result ['error']=f"Quantity must be positive, got {quantity }"
+                continue 
+            if product ['quantity']<quantity :
+                result ['error']=f"Insufficient stock (available: {product ['quantity']}, requested: {quantity })"
+                continue 
+
+            quantity_before =product ['quantity']
+            product ['quantity']=quantity_before -quantity 
+            sale_date =item .get ('sale_date')or datetime .now ()
+            deltas [pid ]=deltas .get (pid ,0 )+quantity 
+            accepted .append (result )
+            sales .append ({
+            'product_id':pid ,
+            'user_id':user_id ,
+            'quantity':quantity ,
+            'sale_price':product ['price'],
+            'sale_date':sale_date ,
+            })
+            movements .append ({
+            'product_id':pid ,
+            'user_id':user_id ,
+            'movement_type':'sale',
+            'quantity_change':-quantity ,
+            'quantity_before':quantity_before ,
+            'quantity_after':product ['quantity'],
+            'reference_type':'sale',
+            'notes':f"Sale of {quantity } units at ${product ['price']} each",
+            'transaction_date':sale_date ,
+            })
+        if not sales or await claim_stock (db ,products ,movements ,deltas ):
+            break 
+    else :
+        raise StockContentionError ("Stock kept changing while the sales were recorded; please retry")
+
+    if sales :
+        mark_changed (db ,user_id )
+        sale_ids =await write_sales (db ,sales ,movements ,{pid :products [pid ]['price']for pid in deltas })
+        for result ,sale ,movement ,sale_id in zip (accepted ,sales ,movements ,sale_ids ):
+            result ['sale_id']=sale_id 
+            result ['sale_price']=float (sale ['sale_price'])
+            result ['quantity_after']=movement ['quantity_after']
+    return results 
+
+
+async def apply_quantity_deltas (db :AsyncSession ,deltas :Dict [int ,int ],
+require_stock :bool =False ,lock :bool =False )->Dict [int ,Any ]:
+    """Add `deltas[product_id]` to each product's quantity with a single UPDATE ... FROM (VALUES ...).
+
+    With `require_stock` a product is only updated when its quantity stays non-negative,
+    which makes the update itself the stock check (no explicit locks on the sale path).
+    `lock` first takes the row locks in id order, for transactions that go on to lock
+    other products' rows too. Returns the updated (id, quantity, price) rows by product id.
+    """
+    if not deltas :
+        return {}
+    if lock :
+        await db .execute (
+        select (models .Product .id )
+        .where (models .Product .id .in_ (deltas ))
+        .order_by (models .Product .id )
+        .with_for_update ()
+        )
+    delta_values =values (
+    column ('product_id',Integer ),
+    column ('delta',Integer ),
+    name ='deltas'
+    ).data (sorted (deltas .items ()))
+    stmt =(
+    update (models .Product )
+    .where (models .Product .id ==delta_values .c .product_id )
+    .values (quantity =models .Product .quantity +delta_values .c .delta )
+    )
+    if require_stock :
+        stmt =stmt .where (models .Product .quantity +delta_values .c .delta >=0 )
+    stmt =(
+    stmt 
+    .returning (models .Product .id ,models .Product .quantity ,models .Product .price )
+    .execution_options (synchronize_session =False )
+    )
+    return {r .id :r for r in (await db .execute (stmt )).all ()}
@@ -0,0 +1,147 @@
+import argparse 
+import asyncio 
+from typing import List ,Optional ,Sequence 
+
+from sqlalchemy import Date ,cast ,delete ,exists ,func ,select 
+from sqlalchemy .dialects .postgresql import insert as pg_insert 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from ..database import Base ,async_session ,engine 
+
+
+ROLLUP_COLUMNS =['user_id','product_id','day','units','revenue']
+
+
+def _grouped_sales (*criteria ):
+    """Per (user, product, UTC day) units and revenue of the product_sales rows matching `criteria`."""
+    ps =models .ProductSale 
+    sales =(
+    select (
+    ps .user_id ,
+    ps .product_id ,
+    cast (func .timezone ('UTC',ps .sale_date ),Date ).label ('day'),
+    ps .quantity ,
+    (ps .sale_price *ps .quantity ).label ('revenue')
+    )
+    .where (ps .user_id .is_not (None ),*criteria )
+    ).subquery ('sales')
+    return (
+    select (
+    sales .c .user_id ,
+    sales .c .product_id ,
+    sales .c .day ,
+    func .sum (sales .c .quantity ).label ('units'),
+    func .sum (sales .c .revenue ).label ('revenue')
+    )
+    .group_by (sales .c .user_id ,sales .c .product_id ,sales .c .day )
+    )
+
+
+async def record_daily_sales (db :AsyncSession ,sale_ids :Sequence [int ])->None :
+    """Add freshly inserted sales to the daily rollup, in the caller's transaction.
+
+    The rollup is derived from the stored rows (not the values sent), so it matches exactly
+    what a rebuild from product_sales would produce.
+    """
+    if not sale_ids :
+        return 
+    daily =models .DailySales 
+    stmt =pg_insert (daily ).from_select (ROLLUP_COLUMNS ,_grouped_sales (models .ProductSale .id .in_ (sale_ids )))
+    stmt =stmt .on_conflict_do_update (
+    constraint ='unique_daily_sales',
+    set_ ={'units':daily .units +stmt .excluded .units ,'revenue':daily .revenue +stmt .excluded .revenue }
+    )
+    await db .execute (stmt )
+
+
+async def rebuild_rollup (db :AsyncSession ,user_id :Optional [int ]=None )->int :
+    """Recompute the rollup from product_sales (optionally for one user); returns rows written."""
+    daily =models .DailySales 
+    stmt =delete (daily )
+    criteria =[]
+    if user_id is not None :
+        stmt =stmt .where (daily .user_id ==user_id )
+        criteria .append (models .ProductSale .user_id ==user_id )
+    await db .execute (stmt )
+    result =await db .execute (pg_insert (daily ).from_select (ROLLUP_COLUMNS ,_grouped_sales (*criteria )))
+    return result .rowcount 
+
+
+async def backfill_missing_rollup (db :AsyncSession )->int :
+    """Build the rollup for every user who has sales but no rollup rows yet; returns rows written.
+
+    Called on startup so sales recorded before the rollup table existed are counted by the
+    sales analytics. An advisory lock keeps concurrently starting workers from doing it twice.
+    """
+    await db .execute (select (func .pg_advisory_xact_lock (func .hashtext ('daily_sales:backfill'))))
+    ps =models .ProductSale 
+    daily =models .DailySales 
+    stmt =select (ps .user_id ).distinct ().where (
+    ps .user_id .is_not (None ),
+    ~exists ().where (daily .user_id ==ps .user_id )
+    )
+    written =0 
+    for user_id in (await db .execute (stmt )).scalars ().all ():
+        written +=await rebuild_rollup (db ,user_id )
+    return written 
+
+
+async def verify_rollup (db :AsyncSession ,user_id :Optional [int ]=None )->List [dict ]:
+    """Compare the rollup against product_sales; returns the (user, product, day) rows that differ."""
+    daily =models .DailySales 
+    criteria =[]if user_id is None else [models .ProductSale .user_id ==user_id ]
+    raw =_grouped_sales (*criteria ).subquery ('raw')
+    rolled =select (daily .user_id ,daily .product_id ,daily .day ,daily .units ,daily .revenue )
+    if user_id is not None :
+        rolled =rolled .where (daily .user_id ==user_id )
+    rolled =rolled .subquery ('rolled')
+
+    stmt =(
+    select (
+    func .coalesce (raw .c .user_id ,rolled .c .user_id ).label ('user_id'),
+    func .coalesce (raw .c .product_id ,rolled .c .product_id ).label ('product_id'),
+    func .coalesce (raw .c .day ,rolled .c .day ).label ('day'),
+    raw .c .units .label ('expected_units'),
+    rolled .c .units .label ('rollup_units'),
+    raw .c .revenue .label ('expected_revenue'),
+    rolled .c .revenue .label ('rollup_revenue')
+    )
+    .select_from (raw )
+    .outerjoin (
+    rolled ,
+    (raw .c .user_id ==rolled .c .user_id )&(raw .c .product_id ==rolled .c .product_id )&(raw .c .day ==rolled .c .day ),
+    full =True 
+    )
+    .where (
+    raw .c .units .is_distinct_from (rolled .c .units )|raw .c .revenue .is_distinct_from (rolled .c .revenue )
+    )
+    .order_by ('user_id','product_id','day')
+    )
+    return [dict (r ._mapping )for r in (await db .execute (stmt )).all ()]
+
+
+async def _main (user_id :Optional [int ],verify_only :bool )->None :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    async with async_session ()as db :
+        mismatches =await verify_rollup (db ,user_id )
+        print (f"{len (mismatches )} rollup rows differ from product_sales")
+        for m in mismatches [:20 ]:
+            print (f"  user {m ['user_id']} product {m ['product_id']} {m ['day']}: "
+            f"units {m ['rollup_units']} (expected {m ['expected_units']}), "
+            f"revenue {m ['rollup_revenue']} (expected {m ['expected_revenue']})")
+        if not verify_only :
+            written =await rebuild_rollup (db ,user_id )
+            remaining =await verify_rollup (db ,user_id )
+            await db .commit ()
+            print (f"rebuilt {written } rollup rows, {len (remaining )} differences remaining")
+    await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description ="Rebuild the daily sales rollup from product_sales and verify it.")
+    parser .add_argument ("--user-id",type =int ,default =None )
+    parser .add_argument ("--verify-only",action ="store_true",help ="only report differences")
+    args =parser .parse_args ()
+    asyncio .run (_main (args .user_id ,args .verify_only ))
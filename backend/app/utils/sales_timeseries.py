@@ -0,0 +1,123 @@
+from datetime import date ,datetime ,time ,timedelta 
+from typing import List ,Optional 
+
+from sqlalchemy import DateTime ,cast ,func ,select 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+
+
+GRANULARITIES =('hour','day','week','month')
+
+
+def bucket_start (moment :datetime ,granularity :str )->datetime :
+    """Python equivalent of ``date_trunc(granularity, moment)``."""
+    if granularity =='hour':
+        return moment .replace (minute =0 ,second =0 ,microsecond =0 )
+    day =datetime .combine (moment .date (),time ())
+    if granularity =='day':
+        return day 
+    if granularity =='week':
+        return day -timedelta (days =day .weekday ())
+    return day .replace (day =1 )
+
+
+def next_bucket (start :datetime ,granularity :str )->datetime :
+    if granularity =='hour':
+        return start +timedelta (hours =1 )
+    if granularity =='day':
+        return start +timedelta (days =1 )
+    if granularity =='week':
+        return start +timedelta (weeks =1 )
+    return start .replace (year =start .year +start .month //12 ,month =start .month %12 +1 )
+
+
+def bucket_count (start :date ,end :date ,granularity :str )->int :
+    """Number of `granularity` buckets touched by the days `start`..`end` (inclusive)."""
+    days =(end -start ).days +1 
+    if granularity =='hour':
+        return days *24 
+    if granularity =='day':
+        return days 
+    if granularity =='week':
+        first =bucket_start (datetime .combine (start ,time ()),'week')
+        last =bucket_start (datetime .combine (end ,time ()),'week')
+        return (last -first ).days //7 +1 
+    return (end .year -start .year )*12 +end .month -start .month +1 
+
+
+def fit_granularity (start :date ,end :date ,granularity :str ,max_points :int )->Optional [str ]:
+    """The finest granularity, starting at `granularity`, that needs at most `max_points` buckets.
+
+    None when even monthly buckets would exceed `max_points`.
+    """
+    for candidate in GRANULARITIES [GRANULARITIES .index (granularity ):]:
+        if bucket_count (start ,end ,candidate )<=max_points :
+            return candidate 
+    return None 
+
+
+def earliest_start (end :date ,max_points :int )->date :
+    """First day of the earliest month that keeps `end`'s range within `max_points` monthly buckets."""
+    months =end .year *12 +end .month -max_points 
+    return date (months //12 ,months %12 +1 ,1 )
+
+
+async def first_sale_day (db :AsyncSession ,user_id :int ,product_ids =None )->Optional [date ]:
+    daily =models .DailySales 
+    stmt =select (func .min (daily .day )).where (daily .user_id ==user_id )
+    if product_ids is not None :
+        stmt =stmt .where (daily .product_id .in_ (product_ids ))
+    return (await db .execute (stmt )).scalar ()
+
+
+async def sales_series (db :AsyncSession ,user_id :int ,start :date ,end :date ,granularity :str ,
+product_ids =None )->List [dict ]:
+    """Units and revenue per `granularity` bucket (UTC) for the days `start`..`end`, zero-filled.
+
+    Hourly buckets are grouped from product_sales; coarser ones from the daily rollup.
+    `product_ids` (a list or a select of ids) limits the series to those products.
+    """
+    if granularity =='hour':
+        ps =models .ProductSale 
+        sold_at =func .timezone ('UTC',ps .sale_date )
+        source =(
+        select (func .date_trunc ('hour',sold_at ).label ('bucket'),ps .quantity .label ('units'),
+        (ps .sale_price *ps .quantity ).label ('revenue'))
+        .where (
+        ps .user_id ==user_id ,
+        sold_at >=datetime .combine (start ,time ()),
+        sold_at <datetime .combine (end +timedelta (days =1 ),time ())
+        )
+        )
+        if product_ids is not None :
+            source =source .where (ps .product_id .in_ (product_ids ))
+    else :
+        daily =models .DailySales 
+        source =(
+        select (func .date_trunc (granularity ,cast (daily .day ,DateTime )).label ('bucket'),daily .units ,
+        daily .revenue )
+        .where (daily .user_id ==user_id ,daily .day >=start ,daily .day <=end )
+        )
+        if product_ids is not None :
+            source =source .where (daily .product_id .in_ (product_ids ))
+    source =source .subquery ('source')
+
+    stmt =(
+    select (source .c .bucket ,func .sum (source .c .units ).label ('units'),func .sum (source .c .revenue ).label ('revenue'))
+    .group_by (source .c .bucket )
+    )
+    totals ={r .bucket :r for r in (await db .execute (stmt )).all ()}
+
+    out =[]
+    bucket =bucket_start (datetime .combine (start ,time ()),granularity )
+    stop =datetime .combine (end +timedelta (days =1 ),time ())
+    while bucket <stop :
+        row =totals .get (bucket )
+        out .append ({
+        'bucket':bucket .isoformat (),
+        'units':int (row .units )if row else 0 ,
+        'revenue':float (row .revenue )if row else 0.0 ,
+        })
+        bucket =next_bucket (bucket ,granularity )
+    return out 
@@ -0,0 +1,72 @@
+import hashlib 
+from typing import Optional 
+
+from fastapi import UploadFile 
+from sqlalchemy import func ,select 
+from sqlalchemy .dialects .postgresql import insert as pg_insert 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from .csv_upload import CSV_CHUNK_SIZE 
+
+
+async def fingerprint_upload (file :UploadFile )->str :
+    """SHA-256 of the raw upload bytes; the file is rewound afterwards so it can still be parsed."""
+    digest =hashlib .sha256 ()
+    while True :
+        chunk =await file .read (CSV_CHUNK_SIZE )
+        if not chunk :
+            break 
+        digest .update (chunk )
+    await file .seek (0 )
+    return digest .hexdigest ()
+
+
+def import_options (**options )->str :
+    """Canonical form of the upload options that change what an import writes, e.g. ``mode=bulk;on_conflict=skip``."""
+    return ';'.join (f"{name }={''if value is None else value }"for name ,value in sorted (options .items ()))
+
+
+async def find_completed_import (db :AsyncSession ,user_id :int ,kind :str ,content_hash :str ,
+options :str ='')->Optional [models .CompletedImport ]:
+    """Return the recorded import of this exact file with the same options, if any.
+
+    A transaction-scoped advisory lock on (user, kind, hash, options) is taken first, so a
+    second upload of the same file waits for the first one to commit and then sees its record.
+    """
+    await db .execute (select (func .pg_advisory_xact_lock (func .hashtext (f"{user_id }:{kind }:{content_hash }:{options }"))))
+    stmt =select (models .CompletedImport ).where (
+    models .CompletedImport .user_id ==user_id ,
+    models .CompletedImport .kind ==kind ,
+    models .CompletedImport .content_hash ==content_hash ,
+    models .CompletedImport .options ==options 
+    )
+    return (await db .execute (stmt )).scalars ().first ()
+
+
+async def record_completed_import (db :AsyncSession ,user_id :int ,kind :str ,content_hash :str ,
+filename :Optional [str ],result :dict ,options :str ='')->None :
+    """Store `result` for this file in the caller's transaction, replacing an earlier record (forced re-import)."""
+    stmt =pg_insert (models .CompletedImport ).values (
+    user_id =user_id ,
+    kind =kind ,
+    content_hash =content_hash ,
+    options =options ,
+    filename =filename ,
+    result =result ,
+    )
+    stmt =stmt .on_conflict_do_update (
+    constraint ='unique_import_per_user',
+    set_ ={'filename':stmt .excluded .filename ,'result':stmt .excluded .result ,'created_at':func .now ()}
+    )
+    await db .execute (stmt )
+
+
+def duplicate_response (previous :models .CompletedImport )->dict :
+    """Stored result of an earlier import, flagged as a duplicate."""
+    return {
+    **previous .result ,
+    "duplicate":True ,
+    "original_filename":previous .filename ,
+    "original_uploaded_at":previous .created_at .isoformat ()if previous .created_at else None ,
+    }
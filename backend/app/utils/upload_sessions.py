@@ -0,0 +1,274 @@
+import os 
+import tempfile 
+import uuid 
+from datetime import datetime ,timedelta ,timezone 
+from typing import Optional 
+
+from fastapi import UploadFile 
+from sqlalchemy import select ,update 
+from sqlalchemy .ext .asyncio import AsyncSession 
+
+from ..import models 
+from .csv_upload import CSV_CHUNK_SIZE ,GZIP_MAGIC ,ZSTD_MAGIC ,iter_csv_rows 
+from .sales_copy import CopySalesIngestor 
+from .sales_ingest import SalesIngestor ,SalesRowParser 
+
+
+UPLOAD_SESSION_DIR =os .getenv ('UPLOAD_SESSION_DIR',os .path .join (tempfile .gettempdir (),'sales-upload-sessions'))
+UPLOAD_SESSION_TTL =timedelta (hours =int (os .getenv ('UPLOAD_SESSION_TTL_HOURS','24')))
+MAX_SESSION_ERRORS =int (os .getenv ('MAX_SESSION_ERRORS','1000'))
+
+
+class UploadOffsetMismatch (ValueError ):
+    """Raised when a chunk does not start at or before the number of bytes already received."""
+
+    def __init__ (self ,expected :int ):
+        super ().__init__ (f"Chunk must start at offset {expected }")
+        self .expected =expected 
+
+
+def _session_file (session_id :str )->str :
+    return os .path .join (UPLOAD_SESSION_DIR ,f"{session_id }.csv")
+
+
+def session_path (session :models .SalesUploadSession )->str :
+    return _session_file (session .id )
+
+
+def received_bytes (session :models .SalesUploadSession )->int :
+    try :
+        return os .path .getsize (session_path (session ))
+    except OSError :
+        return 0 
+
+
+def session_summary (session :models .SalesUploadSession ,offset :int =0 ,limit :int =100 )->dict :
+    errors =session .errors or []
+    return {
+    "session_id":session .id ,
+    "filename":session .filename ,
+    "status":session .status ,
+    "offset":received_bytes (session ),
+    "ingested_offset":session .ingested_offset ,
+    "rows_processed":session .rows_seen ,
+    "sales_created":session .sales_created ,
+    "errors":errors [offset :offset +limit ],
+    "errors_total":session .error_count ,
+    }
+
+
+async def create_session (db :AsyncSession ,user_id :int ,filename :Optional [str ],mode :Optional [str ],
+product_id :Optional [int ],sku :Optional [str ])->models .SalesUploadSession :
+    session =models .SalesUploadSession (
+    id =uuid .uuid4 ().hex ,
+    user_id =user_id ,
+    filename =filename ,
+    mode =mode ,
+    product_id =product_id ,
+    sku =sku ,
+    status ='open',
+    ingested_offset =0 ,
+    rows_seen =0 ,
+    sales_created =0 ,
+    errors =[],
+    error_count =0 ,
+    )
+    db .add (session )
+    await db .flush ()
+    os .makedirs (UPLOAD_SESSION_DIR ,exist_ok =True )
+    open (session_path (session ),'wb').close ()
+    return session 
+
+
+async def get_session (db :AsyncSession ,session_id :str ,user_id :int ,for_update :bool =False )->Optional [models .SalesUploadSession ]:
+    """Load a session of `user_id`; `for_update` locks the row so chunks of one session are applied one at a time."""
+    stmt =select (models .SalesUploadSession ).where (
+    models .SalesUploadSession .id ==session_id ,
+    models .SalesUploadSession .user_id ==user_id 
+    )
+    if for_update :
+        stmt =stmt .with_for_update ().execution_options (populate_existing =True )
+    return (await db .execute (stmt )).scalars ().first ()
+
+
+def _file_idle_since (session_id :str ,cutoff :datetime )->bool :
+    try :
+        modified =os .path .getmtime (_session_file (session_id ))
+    except OSError :
+        return True 
+    return datetime .fromtimestamp (modified ,timezone .utc )<cutoff 
+
+
+async def expire_sessions (db :AsyncSession )->int :
+    """Expire open sessions idle for longer than UPLOAD_SESSION_TTL and delete their files; returns how many.
+
+    A session counts as idle when neither its row nor its file changed since the cutoff (a
+    chunk without a complete record only grows the file). Commits.
+    """
+    cutoff =datetime .now (timezone .utc )-UPLOAD_SESSION_TTL 
+    stmt =select (models .SalesUploadSession .id ).where (
+    models .SalesUploadSession .status =='open',
+    models .SalesUploadSession .updated_at <cutoff 
+    )
+    stale =[session_id for session_id in (await db .execute (stmt )).scalars ().all ()if _file_idle_since (session_id ,cutoff )]
+    if not stale :
+        return 0 
+    stmt =update (models .SalesUploadSession ).where (
+    models .SalesUploadSession .id .in_ (stale ),
+    models .SalesUploadSession .status =='open',
+    models .SalesUploadSession .updated_at <cutoff 
+    ).values (status ='expired').returning (models .SalesUploadSession .id )
+    expired =(await db .execute (stmt )).scalars ().all ()
+    await db .commit ()
+    for session_id in expired :
+        _remove_file (_session_file (session_id ))
+    return len (expired )
+
+
+async def write_chunk (session :models .SalesUploadSession ,offset :int ,chunk :UploadFile )->int :
+    """Append the part of `chunk` (starting at byte `offset`) that is not on disk yet; returns bytes received.
+
+    A retried chunk overlapping data already received only contributes its new tail, so
+    resending a chunk is harmless.
+    """
+    received =received_bytes (session )
+    if offset <0 or offset >received :
+        raise UploadOffsetMismatch (received )
+    skip =received -offset 
+    with open (session_path (session ),'ab')as out :
+        while True :
+            data =await chunk .read (CSV_CHUNK_SIZE )
+            if not data :
+                break 
+            if skip :
+                dropped =min (skip ,len (data ))
+                data ,skip =data [dropped :],skip -dropped 
+            if not received and data [:4 ].startswith ((GZIP_MAGIC ,ZSTD_MAGIC )):
+                raise ValueError ("Resumable uploads must be uncompressed CSV")
+            out .write (data )
+            received +=len (data )
+        out .flush ()
+        os .fsync (out .fileno ())
+    return received 
+
+
+def _record_boundary (path :str ,start :int ,end :int ,first :bool =False )->int :
+    """Offset just past the last complete CSV record in ``[start, end)`` (``start`` if none).
+
+    `start` must be a record boundary, so a newline ends a record whenever the number of
+    quotes seen since `start` is even. With `first` the scan stops at the first record.
+    """
+    boundary =start 
+    quotes =0 
+    pos =start 
+    with open (path ,'rb')as fh :
+        fh .seek (start )
+        while pos <end :
+            block =fh .read (min (CSV_CHUNK_SIZE ,end -pos ))
+            if not block :
+                break 
+            i =0 
+            while True :
+                j =block .find (b"\n",i )
+                if j <0 :
+                    quotes +=block .count (b'"',i )
+                    break 
+                quotes +=block .count (b'"',i ,j )
+                if quotes %2 ==0 :
+                    boundary =pos +j +1 
+                    if first :
+                        return boundary 
+                i =j +1 
+            pos +=len (block )
+    return boundary 
+
+
+class _RecordWindow :
+    """Readable view of the header line followed by bytes ``[start, end)`` of the session file."""
+
+    def __init__ (self ,fh ,header :bytes ,start :int ,end :int ):
+        self .fh =fh 
+        self .head =header 
+        self .remaining =end -start 
+        fh .seek (start )
+
+    def read (self ,size :int )->bytes :
+        if self .head :
+            data ,self .head =self .head ,b""
+            return data 
+        data =self .fh .read (min (size ,self .remaining ))
+        self .remaining -=len (data )
+        return data 
+
+
+async def ingest_received (db :AsyncSession ,session :models .SalesUploadSession ,final :bool =False )->None :
+    """Ingest every complete record received but not ingested yet, and advance the session.
+
+    Sales, stock movements, quantity updates and the new `ingested_offset` are written in the
+    caller's transaction, so a chunk is either ingested and recorded once or not at all; a
+    retry after a failure starts again from the last committed offset. With `final` the
+    trailing record is ingested even without a closing newline. The header aliases and date
+    format inferred from the first dated rows are kept on the session and reused for every
+    later chunk; at most MAX_SESSION_ERRORS row errors are stored (`error_count` has the total).
+    """
+    path =session_path (session )
+    end =received_bytes (session )
+
+    if session .header is None :
+        while session .ingested_offset <end :
+            boundary =_record_boundary (path ,session .ingested_offset ,end ,first =True )
+            if boundary ==session .ingested_offset :
+                if not final :
+                    return 
+                boundary =end 
+            with open (path ,'rb')as fh :
+                fh .seek (session .ingested_offset )
+                line =fh .read (boundary -session .ingested_offset )
+            session .ingested_offset =boundary 
+            try :
+                text =line .decode ('utf-8')
+            except UnicodeDecodeError as exc :
+                raise ValueError ("Unable to decode uploaded file as UTF-8")from exc 
+            if text .strip ():
+                session .header =text if text .endswith ("\n")else text +"\n"
+                break 
+        if session .header is None :
+            if final :
+                raise ValueError ("CSV file must have a header row")
+            return 
+
+    boundary =end if final else _record_boundary (path ,session .ingested_offset ,end )
+    if boundary <=session .ingested_offset :
+        return 
+
+    ingestor_cls =CopySalesIngestor if session .mode =='copy'else SalesIngestor 
+    ingestor =ingestor_cls (db ,session .user_id ,product_id =session .product_id ,sku =session .sku )
+    if session .parser :
+        ingestor .parser =SalesRowParser .from_state (session .parser )
+    with open (path ,'rb')as fh :
+        window =_RecordWindow (fh ,session .header .encode ('utf-8'),session .ingested_offset ,boundary )
+        async for row_no ,row in iter_csv_rows (window ):
+            await ingestor .add_row (session .rows_seen +row_no ,row )
+    result =await ingestor .finish ()
+
+    session .ingested_offset =boundary 
+    session .rows_seen +=result ['total_rows_processed']
+    session .sales_created +=result ['sales_created']
+    if session .parser is None and ingestor .parser is not None and ingestor .parser .date_parser is not None :
+        session .parser =ingestor .parser .state ()
+    if result ['errors']:
+        session .error_count +=len (result ['errors'])
+        room =MAX_SESSION_ERRORS -len (session .errors or [])
+        if room >0 :
+            session .errors =list (session .errors or [])+result ['errors'][:room ]
+
+
+def _remove_file (path :str )->None :
+    try :
+        os .remove (path )
+    except OSError :
+        pass 
+
+
+def discard_session_file (session :models .SalesUploadSession )->None :
+    _remove_file (session_path (session ))
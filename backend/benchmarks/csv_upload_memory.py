@@ -0,0 +1,99 @@
+"""Peak RSS of CSV upload parsing against file size.
+
+Compares the streaming reader (`iter_csv_rows`) with the previous buffered behaviour
+(read the whole upload, decode it, build a list of rows). Every measurement runs in a
+fresh subprocess so `ru_maxrss` reflects a single strategy and a single file size.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.csv_upload_memory --sizes 10 50 200
+"""
+import argparse 
+import asyncio 
+import csv 
+import io 
+import os 
+import random 
+import resource 
+import subprocess 
+import sys 
+import tempfile 
+import time 
+
+from app .utils .csv_upload import iter_csv_rows 
+
+
+def _peak_rss_mb ()->float :
+    peak =resource .getrusage (resource .RUSAGE_SELF ).ru_maxrss 
+    if sys .platform =="darwin":
+        return peak /(1024 *1024 )
+    return peak /1024 
+
+
+def generate_sales_csv (path :str ,size_mb :int )->None :
+    target =size_mb *1024 *1024 
+    rnd =random .Random (size_mb )
+    with open (path ,"w",newline ="")as fh :
+        writer =csv .writer (fh )
+        writer .writerow (["sku_id","quantity","date"])
+        while fh .tell ()<target :
+            writer .writerows (
+            [f"SKU-{rnd .randint (1 ,5000 ):05d}",rnd .randint (1 ,20 ),f"2025-{rnd .randint (1 ,12 ):02d}-{rnd .randint (1 ,28 ):02d}"]
+            for _ in range (1000 )
+            )
+
+
+async def _consume_streaming (path :str )->int :
+    count =0 
+    with open (path ,"rb")as fh :
+        async for _row_no ,_row in iter_csv_rows (fh ):
+            count +=1 
+    return count 
+
+
+async def _consume_buffered (path :str )->int :
+    with open (path ,"rb")as fh :
+        raw =fh .read ()
+    reader =csv .DictReader (io .StringIO (raw .decode ("utf-8")))
+    rows =[
+    (row_index ,{key :(value if value not in ("",None )else None )for key ,value in row .items ()})
+    for row_index ,row in enumerate (reader ,start =2 )
+    ]
+    return len (rows )
+
+
+def _run_one (strategy :str ,path :str )->None :
+    baseline =_peak_rss_mb ()
+    started =time .perf_counter ()
+    consume =_consume_streaming if strategy =="streaming"else _consume_buffered 
+    count =asyncio .run (consume (path ))
+    elapsed =time .perf_counter ()-started 
+    print (f"{count } {elapsed :.3f} {baseline :.1f} {_peak_rss_mb ():.1f}")
+
+
+def main ()->None :
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--sizes",type =int ,nargs ="+",default =[10 ,50 ,200 ],help ="file sizes in MB")
+    parser .add_argument ("--child",nargs =2 ,metavar =("STRATEGY","PATH"),help =argparse .SUPPRESS )
+    args =parser .parse_args ()
+
+    if args .child :
+        _run_one (*args .child )
+        return 
+
+    print (f"{'size MB':>8} {'strategy':>10} {'rows':>10} {'seconds':>8} {'peak RSS MB':>12} {'over import':>12}")
+    with tempfile .TemporaryDirectory ()as tmp :
+        for size in args .sizes :
+            path =os .path .join (tmp ,f"sales_{size }mb.csv")
+            generate_sales_csv (path ,size )
+            for strategy in ("buffered","streaming"):
+                out =subprocess .run (
+                [sys .executable ,"-m","benchmarks.csv_upload_memory","--child",strategy ,path ],
+                check =True ,capture_output =True ,text =True ,
+                ).stdout .split ()
+                rows ,seconds ,baseline ,peak =out 
+                print (f"{size :>8} {strategy :>10} {rows :>10} {seconds :>8} {peak :>12} {float (peak )-float (baseline ):>12.1f}")
+
+
+if __name__ =="__main__":
+    main ()
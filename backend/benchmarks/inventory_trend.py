@@ -0,0 +1,171 @@
+"""Inventory trend: snapshot-based query vs. the original two-queries-per-month loop.
+
+Needs DATABASE_URL to point at a PostgreSQL database (postgresql+asyncpg://...). A
+throw-away user with `--products` products and `--movements` stock movements spread over
+the last two years (plus matching sales) is created and its inventory snapshots are
+backfilled. Both implementations are timed for `--months` months and the benchmark data is
+deleted again.
+
+    python -m benchmarks.inventory_trend --products 2000 --movements 1000000
+"""
+import argparse 
+import asyncio 
+import calendar 
+import random 
+import time 
+import uuid 
+from datetime import datetime ,timedelta 
+from types import SimpleNamespace 
+
+from sqlalchemy import delete ,func ,insert ,select 
+
+from app import models 
+from app .database import Base ,async_session ,engine 
+from app .routers .analytics import inventory_trend 
+from app .utils .inventory_snapshots import backfill_snapshots 
+
+
+async def legacy_inventory_trend (db ,user_id :int ,months :int )->list :
+    """The per-month loop the endpoint used before (2 queries per month)."""
+    now =datetime .utcnow ()
+    months_list =[]
+    for i in range (months -1 ,-1 ,-1 ):
+        y =now .year 
+        m =now .month -i 
+        while m <=0 :
+            m +=12 
+            y -=1 
+        months_list .append ((y ,m ))
+
+    out =[]
+    sm =models .StockMovement 
+    p =models .Product 
+    ps =models .ProductSale 
+    for (y ,m )in months_list :
+        last_day =calendar .monthrange (y ,m )[1 ]
+        month_start =datetime (y ,m ,1 )
+        month_end =datetime (y ,m ,last_day ,23 ,59 ,59 )
+        subq =(
+        select (
+        sm .product_id .label ('product_id'),
+        sm .quantity_after .label ('quantity_after'),
+        func .row_number ().over (partition_by =sm .product_id ,order_by =sm .transaction_date .desc ()).label ('rn')
+        )
+        .where (sm .transaction_date <=month_end ,sm .user_id ==user_id )
+        ).subquery ()
+        latest =select (subq .c .product_id ,subq .c .quantity_after ).where (subq .c .rn ==1 ).subquery ()
+        stmt =(
+        select (
+        func .coalesce (func .sum (func .coalesce (latest .c .quantity_after ,p .quantity )*p .price ),0 ).label ('total_value'),
+        func .coalesce (func .sum (func .coalesce (latest .c .quantity_after ,p .quantity )),0 ).label ('total_items')
+        )
+        .select_from (p )
+        .outerjoin (latest ,latest .c .product_id ==p .id )
+        .where (p .user_id ==user_id )
+        )
+        row =(await db .execute (stmt )).first ()
+        sales_stmt =(
+        select (func .coalesce (func .sum (ps .quantity ),0 ).label ('units_sold'))
+        .where (ps .user_id ==user_id ,ps .sale_date >=month_start ,ps .sale_date <=month_end )
+        )
+        sold =(await db .execute (sales_stmt )).first ()
+        total_items =int (row .total_items )
+        units_sold =int (sold .units_sold )
+        out .append ({
+        'yearMonth':f"{y }-{m :02d}",
+        'totalValue':float (round (float (row .total_value ),2 )),
+        'totalItems':total_items ,
+        'unitsSold':units_sold ,
+        'turnoverRate':int (round ((units_sold /total_items )*100 )if total_items >0 else 0 ),
+        })
+    return out 
+
+
+async def _setup (products :int ,movements :int )->int :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    rnd =random .Random (products *31 +movements )
+    now =datetime .utcnow ()
+    async with async_session ()as db :
+        user =models .User (full_name ='bench',email =f"bench-{uuid .uuid4 ().hex }@example.com",password_hash ='x')
+        db .add (user )
+        await db .flush ()
+        product_ids =(await db .execute (
+        insert (models .Product ).returning (models .Product .id ,sort_by_parameter_order =True ),
+        [
+        {'name':f"Bench {i }",'sku':f"TREND-{i :06d}",'price':round (1 +i %50 *0.5 ,2 ),
+        'quantity':rnd .randint (0 ,500 ),'user_id':user .id }
+        for i in range (products )
+        ]
+        )).scalars ().all ()
+
+        batch =[]
+        for n in range (movements ):
+            product_id =rnd .choice (product_ids )
+            before =rnd .randint (0 ,500 )
+            change =rnd .randint (-20 ,20 )
+            when =now -timedelta (seconds =rnd .randint (0 ,730 *86400 ))
+            batch .append ({
+            'product_id':product_id ,'user_id':user .id ,'movement_type':'adjustment',
+            'quantity_change':change ,'quantity_before':before ,'quantity_after':before +change ,
+            'transaction_date':when ,
+            })
+            if len (batch )>=20000 or n ==movements -1 :
+                await db .execute (insert (models .StockMovement ),batch )
+                await db .execute (insert (models .ProductSale ),[
+                {'product_id':b ['product_id'],'user_id':user .id ,'quantity':rnd .randint (1 ,5 ),
+                'sale_price':9.99 ,'sale_date':b ['transaction_date']}
+                for b in batch [::4 ]
+                ])
+                batch =[]
+        await backfill_snapshots (db ,user .id )
+        await db .commit ()
+        return user .id 
+
+
+async def _teardown (user_id :int )->None :
+    async with async_session ()as db :
+        product_ids =select (models .Product .id ).where (models .Product .user_id ==user_id )
+        await db .execute (delete (models .StockMovement ).where (models .StockMovement .product_id .in_ (product_ids )))
+        await db .execute (delete (models .ProductSale ).where (models .ProductSale .product_id .in_ (product_ids )))
+        await db .execute (delete (models .Product ).where (models .Product .user_id ==user_id ))
+        await db .execute (delete (models .User ).where (models .User .id ==user_id ))
+        await db .commit ()
+
+
+async def _timed (fn ,repeat :int ):
+    best =None 
+    for _ in range (repeat ):
+        async with async_session ()as db :
+            started =time .perf_counter ()
+            result =await fn (db )
+            elapsed =time .perf_counter ()-started 
+        best =elapsed if best is None else min (best ,elapsed )
+    return best ,result 
+
+
+async def main (products :int ,movements :int ,months :int ,repeat :int )->None :
+    user_id =await _setup (products ,movements )
+    try :
+        user =SimpleNamespace (id =user_id )
+        legacy_s ,legacy =await _timed (lambda db :legacy_inventory_trend (db ,user_id ,months ),repeat )
+        single_s ,single =await _timed (lambda db :inventory_trend .__wrapped__ (months =months ,db =db ,current_user =user ),repeat )
+        print (f"{'implementation':>16} {'seconds':>9}")
+        print (f"{'per-month loop':>16} {legacy_s :>9.3f}")
+        print (f"{'snapshots':>16} {single_s :>9.3f}")
+        print (f"speedup x{legacy_s /single_s :.1f}")
+        mismatched =[(a ,b )for a ,b in zip (legacy ,single )if a !=b ]
+        print ("results match"if not mismatched else f"{len (mismatched )} months differ, e.g. {mismatched [0 ]}")
+    finally :
+        await _teardown (user_id )
+        await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--products",type =int ,default =2000 )
+    parser .add_argument ("--movements",type =int ,default =1000000 )
+    parser .add_argument ("--months",type =int ,default =24 )
+    parser .add_argument ("--repeat",type =int ,default =3 )
+    args =parser .parse_args ()
+    asyncio .run (main (args .products ,args .movements ,args .months ,args .repeat ))
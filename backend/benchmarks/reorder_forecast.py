@@ -0,0 +1,100 @@
+"""Reorder forecast: loading the sales history vs. the vectorised forecast itself.
+
+Needs DATABASE_URL to point at a PostgreSQL database (postgresql+asyncpg://...). A
+throw-away user with `--products` products and a daily sales rollup covering `--days`
+days (a product sells on a day with probability `--density`) is created; the history is
+loaded once and the forecast is timed on it, then the benchmark data is deleted again.
+
+    python -m benchmarks.reorder_forecast --products 100000 --days 90
+"""
+import argparse 
+import asyncio 
+import time 
+import uuid 
+from datetime import datetime ,timedelta ,timezone 
+
+import numpy as np 
+from sqlalchemy import delete ,insert ,select 
+
+from app import models 
+from app .database import Base ,async_session ,engine 
+from app .utils .forecasting import load_demand_history ,reorder_plan ,suggestion_rows 
+
+
+async def _setup (products :int ,days :int ,density :float )->int :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    rng =np .random .default_rng (products *31 +days )
+    today =datetime .now (timezone .utc ).date ()
+    async with async_session ()as db :
+        user =models .User (full_name ='bench',email =f"bench-{uuid .uuid4 ().hex }@example.com",password_hash ='x')
+        db .add (user )
+        await db .flush ()
+        quantities =rng .integers (0 ,200 ,products ).tolist ()
+        product_ids =(await db .execute (
+        insert (models .Product ).returning (models .Product .id ,sort_by_parameter_order =True ),
+        [
+        {'name':f"Bench {i }",'sku':f"FORECAST-{i :06d}",'price':9.99 ,'quantity':quantities [i ],'user_id':user .id }
+        for i in range (products )
+        ]
+        )).scalars ().all ()
+
+        for d in range (1 ,days +1 ):
+            day =today -timedelta (days =d )
+            sold =np .flatnonzero (rng .random (products )<density )
+            units =rng .poisson (3 ,len (sold ))+1 
+            await db .execute (insert (models .DailySales ),[
+            {'user_id':user .id ,'product_id':product_ids [i ],'day':day ,'units':int (n ),'revenue':float (n )*9.99 }
+            for i ,n in zip (sold .tolist (),units .tolist ())
+            ])
+        await db .commit ()
+        return user .id 
+
+
+async def _teardown (user_id :int )->None :
+    async with async_session ()as db :
+        product_ids =select (models .Product .id ).where (models .Product .user_id ==user_id )
+        await db .execute (delete (models .DailySales ).where (models .DailySales .product_id .in_ (product_ids )))
+        await db .execute (delete (models .Product ).where (models .Product .user_id ==user_id ))
+        await db .execute (delete (models .User ).where (models .User .id ==user_id ))
+        await db .commit ()
+
+
+async def main (products :int ,days :int ,density :float ,repeat :int )->None :
+    user_id =await _setup (products ,days ,density )
+    try :
+        async with async_session ()as db :
+            started =time .perf_counter ()
+            history =await load_demand_history (db ,user_id ,days )
+            load_s =time .perf_counter ()-started 
+
+        timings ={}
+        for method in ('sma','ses'):
+            best =None 
+            for _ in range (repeat ):
+                started =time .perf_counter ()
+                plan =reorder_plan (history ,method )
+                rows =suggestion_rows (history ,plan )
+                elapsed =time .perf_counter ()-started 
+                best =elapsed if best is None else min (best ,elapsed )
+            timings [method ]=(best ,len (rows ))
+
+        print (f"history: {history .units .shape [0 ]} products x {history .units .shape [1 ]} days, "
+        f"{int (np .count_nonzero (history .units ))} product-days with sales")
+        print (f"{'step':>16} {'seconds':>9} {'reorders':>9}")
+        print (f"{'load history':>16} {load_s :>9.3f}")
+        for method ,(seconds ,reorders )in timings .items ():
+            print (f"{'forecast '+method :>16} {seconds :>9.3f} {reorders :>9}")
+    finally :
+        await _teardown (user_id )
+        await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--products",type =int ,default =100000 )
+    parser .add_argument ("--days",type =int ,default =90 )
+    parser .add_argument ("--density",type =float ,default =0.2 )
+    parser .add_argument ("--repeat",type =int ,default =3 )
+    args =parser .parse_args ()
+    asyncio .run (main (args .products ,args .days ,args .density ,args .repeat ))
@@ -0,0 +1,144 @@
+"""POS sale recording: one POST /sales/ per line item vs. POST /sales/batch.
+
+Needs DATABASE_URL to point at a PostgreSQL database (postgresql+asyncpg://...). A
+throw-away user with `--products` products is created and `--lines` sale line items are
+recorded through the full HTTP stack (routing, validation, JWT check, user lookup),
+called in-process through the ASGI interface: once as single-sale requests issued by
+`--concurrency` terminals, once as batches of `--batch-size` lines. The benchmark data
+is deleted again afterwards.
+
+    python -m benchmarks.sales_batch_throughput --lines 5000 --batch-size 250
+"""
+import argparse 
+import asyncio 
+import json 
+import random 
+import time 
+import uuid 
+
+from sqlalchemy import delete ,event ,func ,select 
+
+from app import models 
+from app .database import Base ,async_session ,engine 
+from app .main import app 
+from app .security import create_access_token 
+
+
+async def _setup (products :int ,stock :int )->tuple :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    async with async_session ()as db :
+        user =models .User (full_name ='bench',email =f"bench-{uuid .uuid4 ().hex }@example.com",password_hash ='x')
+        db .add (user )
+        await db .flush ()
+        rows =[
+        models .Product (name =f"Bench {i }",sku =f"POS-{i :06d}",price =round (1 +i %50 *0.5 ,2 ),quantity =stock ,
+        user_id =user .id )
+        for i in range (products )
+        ]
+        db .add_all (rows )
+        await db .commit ()
+        return user .id ,[p .id for p in rows ]
+
+
+async def _teardown (user_id :int )->None :
+    async with async_session ()as db :
+        product_ids =select (models .Product .id ).where (models .Product .user_id ==user_id )
+        await db .execute (delete (models .StockMovement ).where (models .StockMovement .product_id .in_ (product_ids )))
+        await db .execute (delete (models .ProductSale ).where (models .ProductSale .product_id .in_ (product_ids )))
+        await db .execute (delete (models .Product ).where (models .Product .user_id ==user_id ))
+        await db .execute (delete (models .User ).where (models .User .id ==user_id ))
+        await db .commit ()
+
+
+async def _post (path :str ,body :dict ,token :str )->dict :
+    """Call the app like an HTTP client would, without a server or client library."""
+    payload =json .dumps (body ).encode ()
+    path ,_ ,query =path .partition ('?')
+    scope ={
+    'type':'http','asgi':{'version':'3.0'},'http_version':'1.1','method':'POST','scheme':'http',
+    'path':path ,'raw_path':path .encode (),'query_string':query .encode (),'root_path':'',
+    'headers':[(b'host',b'bench'),(b'content-type',b'application/json'),
+    (b'content-length',str (len (payload )).encode ()),(b'authorization',f"Bearer {token }".encode ())],
+    'client':('127.0.0.1',0 ),'server':('bench',80 ),
+    }
+    chunks =[]
+    status ={}
+
+    async def receive ():
+        return {'type':'http.request','body':payload ,'more_body':False }
+
+    async def send (message ):
+        if message ['type']=='http.response.start':
+            status ['code']=message ['status']
+        elif message ['type']=='http.response.body':
+            chunks .append (message .get ('body',b''))
+
+    await app (scope ,receive ,send )
+    if status ['code']!=200 :
+        raise RuntimeError (f"{path } returned {status ['code']}: {b''.join (chunks )[:200 ]}")
+    return json .loads (b''.join (chunks ))
+
+
+async def _single (token :str ,lines :list ,concurrency :int ,batch_size :int )->int :
+    queue =iter (lines )
+
+    async def terminal ():
+        for line in queue :
+            await _post (f"/sales/?product_id={line ['product_id']}",{'quantity':line ['quantity']},token )
+
+    await asyncio .gather (*(terminal ()for _ in range (concurrency )))
+    return len (lines )
+
+
+async def _batch (token :str ,lines :list ,concurrency :int ,batch_size :int )->int :
+    created =0 
+    for i in range (0 ,len (lines ),batch_size ):
+        created +=(await _post ('/sales/batch',{'items':lines [i :i +batch_size ]},token ))['sales_created']
+    return created 
+
+
+MODES ={'single':_single ,'batch':_batch }
+
+
+async def main (lines :int ,products :int ,batch_size :int ,concurrency :int )->None :
+    user_id ,product_ids =await _setup (products ,stock =lines *5 )
+    token =create_access_token ({'sub':str (user_id )})
+    rnd =random .Random (lines )
+    statements ={'count':0 }
+
+    def count (*args ):
+        statements ['count']+=1 
+
+    event .listen (engine .sync_engine ,'before_cursor_execute',count )
+    try :
+        results ={}
+        for mode ,run in MODES .items ():
+            items =[{'product_id':rnd .choice (product_ids ),'quantity':rnd .randint (1 ,3 )}for _ in range (lines )]
+            statements ['count']=0 
+            started =time .perf_counter ()
+            created =await run (token ,items ,concurrency ,batch_size )
+            results [mode ]=(time .perf_counter ()-started ,created ,statements ['count'])
+
+        async with async_session ()as db :
+            sold =await db .scalar (select (func .sum (models .ProductSale .quantity )).where (models .ProductSale .user_id ==user_id ))
+            stock =await db .scalar (select (func .sum (models .Product .quantity )).where (models .Product .user_id ==user_id ))
+        print (f"{lines } line items over {products } products; single: {concurrency } terminals, batch: {batch_size } lines")
+        print (f"{'mode':>8} {'seconds':>8} {'lines/s':>9} {'created':>8} {'stmts/line':>10}")
+        for mode ,(seconds ,created ,executed )in results .items ():
+            print (f"{mode :>8} {seconds :>8.2f} {created /seconds :>9.0f} {created :>8} {executed /created :>10.2f}")
+        print (f"stock consistent: {products *lines *5 -stock ==sold }")
+    finally :
+        event .remove (engine .sync_engine ,'before_cursor_execute',count )
+        await _teardown (user_id )
+        await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--lines",type =int ,default =5000 )
+    parser .add_argument ("--products",type =int ,default =200 )
+    parser .add_argument ("--batch-size",type =int ,default =250 )
+    parser .add_argument ("--concurrency",type =int ,default =8 )
+    args =parser .parse_args ()
+    asyncio .run (main (args .lines ,args .products ,args .batch_size ,args .concurrency ))
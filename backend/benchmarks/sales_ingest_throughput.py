@@ -0,0 +1,121 @@
+"""Sales ingestion throughput: set-based ORM batches vs. PostgreSQL binary COPY.
+
+Needs DATABASE_URL to point at a PostgreSQL database (postgresql+asyncpg://...). A
+throw-away user with `--products` products is created, `--rows` sale rows are generated
+and ingested with each mode, then everything the benchmark wrote is deleted again.
+
+CSV decoding is done up front and excluded, so the numbers show ingestion itself
+(validation + database writes); "db rows/s" only counts time spent writing.
+
+    python -m benchmarks.sales_ingest_throughput --rows 500000 --products 5000
+"""
+import argparse 
+import asyncio 
+import io 
+import random 
+import time 
+import uuid 
+
+from sqlalchemy import delete ,select 
+
+from app import models 
+from app .database import Base ,async_session ,engine 
+from app .utils .csv_upload import iter_csv_rows 
+from app .utils .sales_copy import CopySalesIngestor 
+from app .utils .sales_ingest import SalesIngestor 
+
+
+MODES ={'bulk':SalesIngestor ,'copy':CopySalesIngestor }
+
+
+async def _setup (products :int )->int :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    async with async_session ()as db :
+        user =models .User (full_name ='bench',email =f"bench-{uuid .uuid4 ().hex }@example.com",password_hash ='x')
+        db .add (user )
+        await db .flush ()
+        db .add_all (
+        models .Product (name =f"Bench {i }",sku =f"BENCH-{i :06d}",price =round (1 +i %50 *0.5 ,2 ),
+        quantity =10 **9 ,user_id =user .id )
+        for i in range (products )
+        )
+        await db .commit ()
+        return user .id 
+
+
+async def _teardown (user_id :int )->None :
+    async with async_session ()as db :
+        product_ids =select (models .Product .id ).where (models .Product .user_id ==user_id )
+        await db .execute (delete (models .StockMovement ).where (models .StockMovement .product_id .in_ (product_ids )))
+        await db .execute (delete (models .ProductSale ).where (models .ProductSale .product_id .in_ (product_ids )))
+        await db .execute (delete (models .Product ).where (models .Product .user_id ==user_id ))
+        await db .execute (delete (models .User ).where (models .User .id ==user_id ))
+        await db .commit ()
+
+
+def _generate_csv (rows :int ,products :int )->bytes :
+    rnd =random .Random (rows )
+    lines =["sku_id,quantity,date"]
+    lines .extend (
+    f"BENCH-{rnd .randrange (products ):06d},{rnd .randint (1 ,5 )},20{rnd .randint (15 ,24 )}-{rnd .randint (1 ,12 ):02d}-{rnd .randint (1 ,28 ):02d}"
+    for _ in range (rows )
+    )
+    return ("\n".join (lines )+"\n").encode ()
+
+
+async def _run_mode (mode :str ,user_id :int ,rows :list )->dict :
+    async with async_session ()as db :
+        ingestor =MODES [mode ](db ,user_id )
+        write_time =0.0 
+        write =ingestor .write 
+
+        async def timed_write (*args ):
+            nonlocal write_time 
+            t =time .perf_counter ()
+            await write (*args )
+            write_time +=time .perf_counter ()-t 
+
+        ingestor .write =timed_write 
+        started =time .perf_counter ()
+        for row_no ,row in rows :
+            await ingestor .add_row (row_no ,row )
+        t =time .perf_counter ()
+        written_before_finish =write_time 
+        result =await ingestor .finish ()
+        await db .commit ()
+        finished =time .perf_counter ()
+        write_time +=(finished -t )-(write_time -written_before_finish )
+        return {
+        'mode':mode ,
+        'rows':result ['sales_created'],
+        'errors':len (result ['errors']),
+        'seconds':finished -started ,
+        'write_seconds':write_time ,
+        }
+
+
+async def main (rows :int ,products :int ,modes :list )->None :
+    user_id =await _setup (products )
+    try :
+        data =_generate_csv (rows ,products )
+        parsed =[item async for item in iter_csv_rows (io .BytesIO (data ))]
+        print (f"{'mode':>6} {'rows':>10} {'errors':>7} {'seconds':>8} {'rows/s':>10} {'db rows/s':>10}")
+        for mode in modes :
+            r =await _run_mode (mode ,user_id ,parsed )
+            print (
+            f"{r ['mode']:>6} {r ['rows']:>10} {r ['errors']:>7} {r ['seconds']:>8.2f} "
+            f"{r ['rows']/r ['seconds']:>10.0f} {r ['rows']/max (r ['write_seconds'],1e-9 ):>10.0f}"
+            )
+    finally :
+        await _teardown (user_id )
+        await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--rows",type =int ,default =500000 )
+    parser .add_argument ("--products",type =int ,default =5000 )
+    parser .add_argument ("--modes",nargs ="+",choices =sorted (MODES ),default =['bulk','copy'])
+    args =parser .parse_args ()
+    asyncio .run (main (args .rows ,args .products ,args .modes ))
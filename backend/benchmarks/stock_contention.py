@@ -0,0 +1,142 @@
+"""Concurrent sales of one hot product: read-modify-write vs. row locking vs. atomic decrement.
+
+Needs DATABASE_URL to point at a PostgreSQL database (postgresql+asyncpg://...). A
+throw-away user with a single product is created and `--workers` concurrent terminals
+each sell it `--sales` times, one unit per transaction (stock update + movement +
+commit), with every strategy in turn:
+
+    read-modify-write  load the quantity, check it in Python, write the new value back
+    row lock           SELECT ... FOR UPDATE, check, then UPDATE
+    atomic             crud.take_stock: UPDATE ... WHERE quantity >= n RETURNING
+
+"lost" counts decrements that were overwritten (expected minus actual units taken); the
+benchmark data is deleted again afterwards.
+
+    python -m benchmarks.stock_contention --workers 12 --sales 200
+"""
+import argparse 
+import asyncio 
+import time 
+import uuid 
+
+from sqlalchemy import delete ,func ,select ,update 
+
+from app import crud ,models 
+from app .database import Base ,async_session ,engine 
+
+
+async def _setup (stock :int )->tuple :
+    async with engine .begin ()as conn :
+        await conn .run_sync (Base .metadata .create_all )
+    async with async_session ()as db :
+        user =models .User (full_name ='bench',email =f"bench-{uuid .uuid4 ().hex }@example.com",password_hash ='x')
+        db .add (user )
+        await db .flush ()
+        product =models .Product (name ='Hot SKU',sku ='CONTENTION-1',price =9.99 ,quantity =stock ,user_id =user .id )
+        db .add (product )
+        await db .commit ()
+        return user .id ,product .id 
+
+
+async def _teardown (user_id :int ,product_id :int )->None :
+    async with async_session ()as db :
+        await db .execute (delete (models .InventorySnapshot ).where (models .InventorySnapshot .product_id ==product_id ))
+        await db .execute (delete (models .StockMovement ).where (models .StockMovement .product_id ==product_id ))
+        await db .execute (delete (models .Product ).where (models .Product .id ==product_id ))
+        await db .execute (delete (models .User ).where (models .User .id ==user_id ))
+        await db .commit ()
+
+
+async def _read_modify_write (db ,product_id :int )->tuple :
+    quantity =(await db .execute (select (models .Product .quantity ).where (models .Product .id ==product_id ))).scalar ()
+    if quantity <1 :
+        return None 
+    await db .execute (update (models .Product ).where (models .Product .id ==product_id ).values (quantity =quantity -1 ))
+    return quantity ,quantity -1 
+
+
+async def _row_lock (db ,product_id :int )->tuple :
+    stmt =select (models .Product .quantity ).where (models .Product .id ==product_id ).with_for_update ()
+    quantity =(await db .execute (stmt )).scalar ()
+    if quantity <1 :
+        return None 
+    await db .execute (update (models .Product ).where (models .Product .id ==product_id ).values (quantity =quantity -1 ))
+    return quantity ,quantity -1 
+
+
+async def _atomic (db ,product_id :int )->tuple :
+    row =await crud .take_stock (db ,product_id ,1 )
+    if row is None :
+        return None 
+    return row .quantity +1 ,row .quantity 
+
+
+STRATEGIES ={'read-modify-write':_read_modify_write ,'row lock':_row_lock ,'atomic':_atomic }
+
+
+async def _run (strategy ,user_id :int ,product_id :int ,workers :int ,sales :int ,stock :int )->dict :
+    async with async_session ()as db :
+        await db .execute (update (models .Product ).where (models .Product .id ==product_id ).values (quantity =stock ))
+        await db .execute (delete (models .StockMovement ).where (models .StockMovement .product_id ==product_id ))
+        await db .commit ()
+
+    async def terminal ():
+        sold =0 
+        async with async_session ()as db :
+            for _ in range (sales ):
+                taken =await strategy (db ,product_id )
+                if taken is None :
+                    await db .rollback ()
+                    continue 
+                db .add (models .StockMovement (
+                product_id =product_id ,user_id =user_id ,movement_type ='sale',quantity_change =-1 ,
+                quantity_before =taken [0 ],quantity_after =taken [1 ],reference_type ='sale'
+                ))
+                await db .commit ()
+                sold +=1 
+        return sold 
+
+    started =time .perf_counter ()
+    sold =sum (await asyncio .gather (*(terminal ()for _ in range (workers ))))
+    elapsed =time .perf_counter ()-started 
+
+    async with async_session ()as db :
+        quantity =await db .scalar (select (models .Product .quantity ).where (models .Product .id ==product_id ))
+        distinct_after =await db .scalar (
+        select (func .count (func .distinct (models .StockMovement .quantity_after )))
+        .where (models .StockMovement .product_id ==product_id )
+        )
+    return {
+    'seconds':elapsed ,
+    'sales_per_s':sold /elapsed ,
+    'sold':sold ,
+    'lost':sold -(stock -quantity ),
+    'duplicate_movements':sold -distinct_after ,
+    }
+
+
+async def main (workers :int ,sales :int )->None :
+    stock =workers *sales 
+    user_id ,product_id =await _setup (stock )
+    try :
+        results ={}
+        for name ,strategy in STRATEGIES .items ():
+            results [name ]=await _run (strategy ,user_id ,product_id ,workers ,sales ,stock )
+        print (f"{workers } workers x {sales } sales of one product")
+        print (f"{'strategy':>18} {'seconds':>8} {'sales/s':>9} {'sold':>6} {'lost':>6} {'dup moves':>9}")
+        for name ,r in results .items ():
+            print (f"{name :>18} {r ['seconds']:>8.2f} {r ['sales_per_s']:>9.0f} {r ['sold']:>6} {r ['lost']:>6} "
+            f"{r ['duplicate_movements']:>9}")
+        gain =results ['atomic']['sales_per_s']/results ['row lock']['sales_per_s']
+        print (f"atomic vs. row lock: {gain :.2f}x")
+    finally :
+        await _teardown (user_id ,product_id )
+        await engine .dispose ()
+
+
+if __name__ =="__main__":
+    parser =argparse .ArgumentParser (description =__doc__ .splitlines ()[0 ])
+    parser .add_argument ("--workers",type =int ,default =12 )
+    parser .add_argument ("--sales",type =int ,default =200 )
+    args =parser .parse_args ()
+    asyncio .run (main (args .workers ,args .sales ))
@@ -0,0 +1,38 @@
+from sqlalchemy import update 
+
+from app import models 
+from app .database import async_session 
+from app .utils .analytics_cache import analytics_cache 
+
+
+def test_cached_summary_is_recomputed_after_writes (client ,run ,user ,products ):
+    assert client .get ('/sales/summary').json ()['total_units']==0 
+    hits =analytics_cache .hits 
+    assert client .get ('/sales/summary').json ()['total_units']==0 
+    assert analytics_cache .hits ==hits +1 
+
+    csv =b"sku,quantity\nSKU1,2\nSKU2,1\n"
+    client .post ('/sales/upload',files ={'file':('sales.csv',csv )})
+    assert client .get ('/sales/summary').json ()['total_units']==3 
+
+    client .post (f"/sales/?product_id={products ['SKU1']}",json ={'quantity':4 })
+    assert client .get ('/sales/summary').json ()['total_units']==7 
+
+
+def test_rolled_back_writes_keep_the_cache (run ,user ,products ):
+    async def write (commit ):
+        async with async_session ()as db :
+            await db .execute (update (models .Product ).where (models .Product .id ==products ['SKU1']).values (quantity =1 ))
+            product =await db .get (models .Product ,products ['SKU2'])
+            product .quantity =1 
+            await db .flush ()
+            if commit :
+                await db .commit ()
+            else :
+                await db .rollback ()
+
+    version =analytics_cache .version (user .id )
+    run (write ,False )
+    assert analytics_cache .version (user .id )==version 
+    run (write ,True )
+    assert analytics_cache .version (user .id )==version +1 
@@ -0,0 +1,50 @@
+from sqlalchemy import func ,select 
+
+from app import models 
+from app .database import async_session 
+from app .utils .csv_upload import CSV_CHUNK_SIZE 
+
+
+def count_rows (run ,model ,user_id ):
+    async def count ():
+        async with async_session ()as db :
+            return await db .scalar (select (func .count ()).select_from (model ).where (model .user_id ==user_id ))
+
+    return run (count )
+
+
+def late_bad_csv (header ,make_row ):
+    """A CSV whose rows fill more than one read chunk, followed by a byte that is not UTF-8."""
+    lines =[header ]
+    while sum (len (l )+1 for l in lines )<=CSV_CHUNK_SIZE :
+        lines .append (make_row (len (lines )))
+    return ('\n'.join (lines )+'\n').encode ()+b'\xff,broken\n'
+
+
+def test_supplier_upload_reports_each_row (client ,run ,user ):
+    csv =b"name,email\nAcme,acme@example.com\nAcme,other@example.com\nGlobex,globex@example.com\n"
+    response =client .post ('/suppliers/upload',files ={'file':('s.csv',csv )})
+    assert response .status_code ==200 
+    results =response .json ()['results']
+    assert [r ['ok']for r in results ]==[True ,False ,True ]
+    assert results [1 ]['error']=='Supplier name already exists'
+    assert count_rows (run ,models .Supplier ,user .id )==2 
+
+
+def test_supplier_upload_with_unreadable_tail_writes_nothing (client ,run ,user ):
+    csv =late_bad_csv ('name,address',lambda i :f"Supplier {i },{'x'*500 }")
+    response =client .post ('/suppliers/upload',files ={'file':('s.csv',csv )})
+    assert response .status_code ==400 
+    assert 'UTF-8'in response .json ()['detail']
+    assert count_rows (run ,models .Supplier ,user .id )==0 
+
+
+def test_category_upload_with_unreadable_tail_writes_nothing (client ,run ,user ):
+    csv =late_bad_csv ('name,description',lambda i :f"Category {i },{'x'*500 }")
+    response =client .post ('/categories/upload',files ={'file':('c.csv',csv )})
+    assert response .status_code ==400 
+    assert count_rows (run ,models .ProductCategory ,user .id )==0 
+
+    response =client .post ('/categories/upload',files ={'file':('c.csv',b"name\nTools\nTools\n")})
+    assert [r ['ok']for r in response .json ()['results']]==[True ,False ]
+    assert count_rows (run ,models .ProductCategory ,user .id )==1 
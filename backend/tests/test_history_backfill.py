@@ -0,0 +1,78 @@
+from datetime import date ,datetime ,timezone 
+from decimal import Decimal 
+
+from sqlalchemy import select 
+
+from app import models 
+from app .database import async_session 
+from app .utils .inventory_snapshots import backfill_missing_snapshots 
+from app .utils .sales_rollup import backfill_missing_rollup ,verify_rollup 
+
+
+def test_users_without_snapshots_are_backfilled (run ,user ,products ):
+    def movement (change ,before ,moved_at ):
+        return models .StockMovement (
+        product_id =products ['SKU1'],user_id =user .id ,movement_type ='sale'if change <0 else 'restock',
+        quantity_change =change ,quantity_before =before ,quantity_after =before +change ,
+        transaction_date =moved_at ,
+        )
+
+    async def scenario ():
+        async with async_session ()as db :
+            db .add_all ([
+            movement (-2 ,10 ,datetime (2025 ,1 ,5 ,12 )),
+            movement (-2 ,8 ,datetime (2025 ,1 ,20 ,12 )),
+            movement (3 ,6 ,datetime (2025 ,2 ,3 ,12 )),
+            ])
+            await db .commit ()
+
+            await backfill_missing_snapshots (db )
+            await db .commit ()
+            stmt =select (
+            models .InventorySnapshot .month ,
+            models .InventorySnapshot .closing_quantity ,
+            models .InventorySnapshot .closing_value ,
+            ).where (models .InventorySnapshot .user_id ==user .id ).order_by (models .InventorySnapshot .month )
+            first =[tuple (r )for r in (await db .execute (stmt )).all ()]
+
+            db .add (movement (-1 ,9 ,datetime (2025 ,2 ,10 ,12 )))
+            await db .commit ()
+            await backfill_missing_snapshots (db )
+            await db .commit ()
+            second =[tuple (r )for r in (await db .execute (stmt )).all ()]
+            return first ,second 
+
+    first ,second =run (scenario )
+    assert first ==[(date (2025 ,1 ,1 ),6 ,15.0 ),(date (2025 ,2 ,1 ),9 ,22.5 )]
+    assert second ==first 
+
+
+def test_users_without_a_sales_rollup_are_backfilled (run ,user ,products ):
+    def sale (sku ,quantity ,day ):
+        return models .ProductSale (
+        product_id =products [sku ],user_id =user .id ,quantity =quantity ,sale_price =2.5 ,
+        sale_date =datetime (2025 ,3 ,day ,12 ,tzinfo =timezone .utc ),
+        )
+
+    async def scenario ():
+        async with async_session ()as db :
+            db .add_all ([sale ('SKU1',2 ,1 ),sale ('SKU1',3 ,1 ),sale ('SKU2',1 ,2 )])
+            await db .commit ()
+
+            await backfill_missing_rollup (db )
+            await db .commit ()
+            stmt =select (
+            models .DailySales .product_id ,
+            models .DailySales .day ,
+            models .DailySales .units ,
+            models .DailySales .revenue ,
+            ).where (models .DailySales .user_id ==user .id ).order_by (models .DailySales .day )
+            rows =[tuple (r )for r in (await db .execute (stmt )).all ()]
+            return rows ,await verify_rollup (db ,user .id )
+
+    rows ,mismatches =run (scenario )
+    assert rows ==[
+    (products ['SKU1'],date (2025 ,3 ,1 ),5 ,Decimal ('12.50')),
+    (products ['SKU2'],date (2025 ,3 ,2 ),1 ,Decimal ('2.50')),
+    ]
+    assert mismatches ==[]
@@ -0,0 +1,125 @@
+import asyncio 
+
+from sqlalchemy import select 
+from sqlalchemy .sql import Select 
+
+from app import crud ,models 
+from app .database import async_session 
+from app .utils .product_import import ProductImporter ,ProductSync 
+
+
+def stock_and_movements (run ,user_id ):
+    async def load ():
+        async with async_session ()as db :
+            stock =await db .execute (
+            select (models .Product .sku ,models .Product .quantity ).where (models .Product .user_id ==user_id )
+            )
+            movements =await db .execute (
+            select (
+            models .StockMovement .product_id ,
+            models .StockMovement .quantity_before ,
+            models .StockMovement .quantity_change ,
+            models .StockMovement .quantity_after ,
+            models .StockMovement .reference_type ,
+            ).where (models .StockMovement .user_id ==user_id ).order_by (models .StockMovement .id )
+            )
+            return dict (stock .all ()),[tuple (m )for m in movements .all ()]
+
+    return run (load )
+
+
+def test_sync_inserts_updates_and_counts_unchanged (client ,run ,user ,products ):
+    csv =(
+    b"name,sku,price,quantity\n"
+    b"Product 1,SKU1,2.5,15\n"
+    b"Product 2,SKU2,2.5,10\n"
+    b"Product 3,SKU3,3.0,10\n"
+    b"New,SKU9,1.0,4\n"
+    )
+    response =client .post ('/products/upload',files ={'file':('catalog.csv',csv )},data ={'mode':'sync'})
+    body =response .json ()
+    assert (body ['inserted'],body ['updated'],body ['unchanged'])==(1 ,2 ,1 )
+
+    stock ,movements =stock_and_movements (run ,user .id )
+    assert (stock ['SKU1'],stock ['SKU3'],stock ['SKU9'])==(15 ,10 ,4 )
+    assert movements ==[(products ['SKU1'],10 ,5 ,15 ,'catalog_sync')]
+
+
+def test_sync_does_not_overwrite_a_concurrent_sale (run ,user ,products ):
+    async def sell_two ():
+        async with async_session ()as other :
+            assert await crud .take_stock (other ,products ['SKU1'],2 )is not None 
+            await other .commit ()
+
+    async def scenario ():
+        async with async_session ()as db :
+            execute =db .execute 
+            sale =[]
+
+            async def racing_execute (stmt ,*args ,**kwargs ):
+                result =await execute (stmt ,*args ,**kwargs )
+                if isinstance (stmt ,Select )and not sale :
+                    sale .append (asyncio .create_task (sell_two ()))
+                    await asyncio .sleep (0.2 )
+                return result 
+
+            db .execute =racing_execute 
+            sync =ProductSync (db ,user .id )
+            await sync .add_row (2 ,{'name':'Product 1','sku':'SKU1','price':'2.5','quantity':'15'})
+            await sync .finish ()
+            await db .commit ()
+            await sale [0 ]
+
+    run (scenario )
+    stock ,movements =stock_and_movements (run ,user .id )
+    assert stock ['SKU1']==13 
+    assert movements ==[(products ['SKU1'],10 ,5 ,15 ,'catalog_sync')]
+
+
+def test_import_skip_leaves_existing_skus_alone (client ,run ,user ,products ):
+    csv =b"name,sku,price,quantity\nProduct 1,SKU1,9.0,15\nNew,SKU8,1.0,4\n"
+    body =client .post ('/products/upload',files ={'file':('p.csv',csv )},data ={'mode':'bulk'}).json ()
+    assert (body ['created'],body ['updated'],body ['skipped'])==(1 ,0 ,1 )
+    assert body ['results'][0 ]=={'row':2 ,'ok':False ,'error':'SKU already exists for this user'}
+
+    stock ,movements =stock_and_movements (run ,user .id )
+    assert (stock ['SKU1'],stock ['SKU8'])==(10 ,4 )
+    assert movements ==[]
+
+
+def test_import_update_records_quantity_changes (client ,run ,user ,products ):
+    csv =b"name,sku,price,quantity\nProduct 1,SKU1,9.0,15\nProduct 2,SKU2,9.0,10\nNew,SKU8,1.0,4\n"
+    data ={'mode':'bulk','on_conflict':'update'}
+    body =client .post ('/products/upload',files ={'file':('p.csv',csv )},data =data ).json ()
+    assert (body ['created'],body ['updated'],body ['skipped'])==(1 ,2 ,0 )
+
+    stock ,movements =stock_and_movements (run ,user .id )
+    assert (stock ['SKU1'],stock ['SKU2'],stock ['SKU8'])==(15 ,10 ,4 )
+    assert movements ==[(products ['SKU1'],10 ,5 ,15 ,'product_import')]
+
+
+def test_import_fail_stops_at_the_first_conflicting_batch (run ,user ,products ):
+    rows =[
+    {'name':'New 1','sku':'NEW1','price':'1','quantity':'1'},
+    {'name':'Product 1','sku':'SKU1','price':'1','quantity':'1'},
+    {'name':'New 2','sku':'NEW2','price':'1','quantity':'1'},
+    {'name':'New 3','sku':'NEW3','price':'x','quantity':'1'},
+    ]
+
+    async def scenario ():
+        async with async_session ()as db :
+            importer =ProductImporter (db ,user .id ,on_conflict ='fail',batch_size =2 )
+            for row_no ,row in enumerate (rows ,start =2 ):
+                await importer .add_row (row_no ,row )
+            summary =await importer .finish ()
+            await db .rollback ()
+            return summary 
+
+    summary =run (scenario )
+    assert summary ['committed']is False 
+    assert summary ['results']==[
+    {'row':2 ,'ok':True ,'product_id':summary ['results'][0 ]['product_id'],'action':'created'},
+    {'row':3 ,'ok':False ,'error':'SKU already exists for this user'},
+    ]
+    stock ,_ =stock_and_movements (run ,user .id )
+    assert 'NEW1'not in stock and 'NEW2'not in stock 
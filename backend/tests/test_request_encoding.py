@@ -0,0 +1,36 @@
+import asyncio 
+import gzip 
+
+from app .utils .request_encoding import GzipRequestMiddleware 
+
+
+def test_gzip_body_is_inflated_and_disconnect_still_arrives ():
+    body =b"sku,quantity\n"+b"".join (f"SKU{i },{i *7919 %1000 }\n".encode ()for i in range (5000 ))
+    compressed =gzip .compress (body )
+    server_messages =[
+    {'type':'http.request','body':compressed [:1000 ],'more_body':True },
+    {'type':'http.request','body':compressed [1000 :],'more_body':False },
+    {'type':'http.disconnect'},
+    ]
+    seen ={}
+
+    async def receive ():
+        return server_messages .pop (0 )
+
+    async def app (scope ,receive ,send ):
+        chunks =[]
+        while True :
+            message =await receive ()
+            chunks .append (message ['body'])
+            if not message ['more_body']:
+                break 
+        seen ['body']=b''.join (chunks )
+        seen ['headers']=dict (scope ['headers'])
+        seen ['after']=await asyncio .wait_for (receive (),1 )
+
+    scope ={'type':'http','headers':[(b'content-encoding',b'gzip'),(b'content-length',b'1')]}
+    asyncio .run (GzipRequestMiddleware (app ,chunk_size =4096 )(scope ,receive ,None ))
+
+    assert seen ['body']==body 
+    assert b'content-encoding'not in seen ['headers']
+    assert seen ['after']=={'type':'http.disconnect'}
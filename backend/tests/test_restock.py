@@ -0,0 +1,115 @@
+import pytest 
+from sqlalchemy import select 
+from sqlalchemy .sql import Update 
+
+from app import crud ,models 
+from app .database import async_session 
+from app .utils .sales_ingest import CLAIM_ATTEMPTS ,StockContentionError 
+
+
+def restock_movements (run ,user_id ):
+    async def load ():
+        async with async_session ()as db :
+            rows =await db .execute (
+            select (
+            models .StockMovement .product_id ,
+            models .StockMovement .quantity_before ,
+            models .StockMovement .quantity_change ,
+            models .StockMovement .quantity_after ,
+            models .StockMovement .reference_id ,
+            ).where (models .StockMovement .user_id ==user_id ).order_by (models .StockMovement .id )
+            )
+            return [tuple (r )for r in rows .all ()]
+
+    return run (load )
+
+
+def test_completing_an_order_adds_to_the_current_stock (client ,run ,user ,products ):
+    orders =client .post ('/restock/orders/batch',json ={'orders':[
+    {'product_id':products ['SKU1'],'quantity_ordered':5 },
+    ]}).json ()
+    order_id =orders [0 ]['id']
+
+    sale =client .post (f"/sales/?product_id={products ['SKU1']}",json ={'quantity':3 })
+    assert sale .status_code ==200 
+
+    response =client .put (f"/restock/orders/{order_id }",json ={'status':'completed'})
+    assert response .status_code ==200 
+    assert response .json ()['product']['quantity']==12 
+    assert restock_movements (run ,user .id )[-1 ]==(products ['SKU1'],7 ,5 ,12 ,order_id )
+
+
+def test_set_stock_gives_up_under_constant_contention (run ,user ,products ):
+    async def scenario ():
+        async with async_session ()as db :
+            product =await db .get (models .Product ,products ['SKU1'])
+            execute =db .execute 
+            updates =[]
+
+            async def racing_execute (stmt ,*args ,**kwargs ):
+                if isinstance (stmt ,Update ):
+                    updates .append (stmt )
+                    async with async_session ()as other :
+                        await crud .take_stock (other ,product .id ,1 )
+                        await other .commit ()
+                return await execute (stmt ,*args ,**kwargs )
+
+            db .execute =racing_execute 
+            with pytest .raises (StockContentionError ):
+                await crud .set_stock (db ,product ,20 )
+            await db .rollback ()
+            return len (updates )
+
+    assert run (scenario )==CLAIM_ATTEMPTS 
+
+
+def test_batch_orders_share_a_group_and_check_ownership (client ,run ,user ,products ):
+    async def foreign_product ():
+        async with async_session ()as db :
+            other =models .User (full_name ='other',email =f"other-{user .id }@example.com",password_hash ='x')
+            db .add (other )
+            await db .flush ()
+            product =models .Product (name ='Other',sku ='SKU1',price =1 ,quantity =1 ,user_id =other .id )
+            db .add (product )
+            await db .commit ()
+            return product .id 
+
+    foreign_id =run (foreign_product )
+    rejected =client .post ('/restock/orders/batch',json ={'orders':[
+    {'product_id':products ['SKU1'],'quantity_ordered':5 },
+    {'product_id':foreign_id ,'quantity_ordered':5 },
+    ]})
+    assert rejected .status_code ==404 
+    assert client .get ('/restock/orders').json ()==[]
+
+    orders =client .post ('/restock/orders/batch',json ={'orders':[
+    {'product_id':products ['SKU1'],'quantity_ordered':5 },
+    {'product_id':products ['SKU1'],'quantity_ordered':2 },
+    {'product_id':products ['SKU2'],'quantity_ordered':3 },
+    ]}).json ()
+    assert [o ['quantity_ordered']for o in orders ]==[5 ,2 ,3 ]
+    assert len ({o ['group_id']for o in orders })==1 
+    assert client .put (f"/restock/orders/group/{orders [0 ]['group_id']}x",json ={'status':'completed'}).status_code ==404 
+
+
+def test_completing_a_group_restocks_each_order_once (client ,run ,user ,products ):
+    orders =client .post ('/restock/orders/batch',json ={'orders':[
+    {'product_id':products ['SKU1'],'quantity_ordered':5 },
+    {'product_id':products ['SKU1'],'quantity_ordered':2 },
+    {'product_id':products ['SKU2'],'quantity_ordered':3 },
+    ]}).json ()
+    group_id =orders [0 ]['group_id']
+    ids =[o ['id']for o in orders ]
+
+    for _ in range (2 ):
+        response =client .put (f"/restock/orders/group/{group_id }",json ={'status':'completed'})
+        assert response .status_code ==200 
+        body =response .json ()
+        assert {o ['status']for o in body }=={'completed'}
+        assert {o ['product']['sku']:o ['product']['quantity']for o in body }=={'SKU1':17 ,'SKU2':13 }
+
+    assert restock_movements (run ,user .id )==[
+    (products ['SKU1'],10 ,5 ,15 ,ids [0 ]),
+    (products ['SKU1'],15 ,2 ,17 ,ids [1 ]),
+    (products ['SKU2'],10 ,3 ,13 ,ids [2 ]),
+    ]
@@ -0,0 +1,28 @@
+from datetime import date ,datetime ,timedelta ,timezone 
+
+from app import models 
+from app .database import async_session 
+from app .utils .sales_rollup import rebuild_rollup 
+
+
+def test_range_too_long_for_monthly_points (client ,run ,user ,products ):
+    async def old_sale ():
+        async with async_session ()as db :
+            db .add (models .ProductSale (
+            product_id =products ['SKU1'],user_id =user .id ,quantity =2 ,sale_price =2.5 ,
+            sale_date =datetime (2020 ,1 ,10 ,12 ,tzinfo =timezone .utc ),
+            ))
+            await db .commit ()
+            await rebuild_rollup (db ,user .id )
+            await db .commit ()
+
+    run (old_sale )
+    params ={'granularity':'day','max_points':12 }
+    explicit =client .get ('/sales/timeseries',params ={**params ,'start_date':'2020-01-01'})
+    assert explicit .status_code ==400 
+
+    body =client .get ('/sales/timeseries',params =params ).json ()
+    today =datetime .now (timezone .utc ).date ()
+    assert body ['granularity']=='month'
+    assert len (body ['points'])==12 
+    assert date .fromisoformat (body ['start_date'])>today -timedelta (days =366 )
@@ -0,0 +1,79 @@
+import gzip 
+
+from sqlalchemy import select 
+
+from app import models 
+from app .database import async_session 
+from app .utils .sales_ingest import SalesIngestor 
+
+
+def test_upload_gzip_compressed_csv (client ,user ,products ):
+    csv =b"sku,quantity,date\nSKU1,2,2025-01-05\nSKU2,3,2025-01-06\n"
+    response =client .post ('/sales/upload',files ={'file':('sales.csv.gz',gzip .compress (csv ),'application/gzip')})
+    assert response .status_code ==200 
+    body =response .json ()
+    assert body ['sales_created']==2 
+    assert body ['errors']==[]
+
+
+def test_upload_rejects_non_csv_names (client ,user ):
+    response =client .post ('/sales/upload',files ={'file':('sales.txt',b"sku,quantity\nSKU1,1\n")})
+    assert response .status_code ==400 
+
+
+def test_set_based_ingest_matches_row_by_row_errors_and_stock (run ,user ,products ):
+    rows =[
+    {'sku':'SKU1','quantity':'4','date':'2025-01-05'},
+    {'sku':'NOPE','quantity':'x','date':''},
+    {'sku':'SKU1','quantity':'x','date':''},
+    {'sku':'SKU1','quantity':'7','date':''},
+    {'sku':'','quantity':'1','date':''},
+    {'sku':'SKU2','quantity':'0','date':''},
+    {'sku':'SKU2','quantity':'3','date':'2025-13-45'},
+    {'sku':'SKU1','quantity':'6','date':'2025-01-06'},
+    ]
+
+    async def ingest ():
+        async with async_session ()as db :
+            ingestor =SalesIngestor (db ,user .id ,batch_size =3 )
+            for row_no ,row in enumerate (rows ,start =2 ):
+                await ingestor .add_row (row_no ,row )
+            result =await ingestor .finish ()
+            await db .commit ()
+            stock =dict ((await db .execute (
+            select (models .Product .sku ,models .Product .quantity ).where (models .Product .user_id ==user .id )
+            )).all ())
+            movements =(await db .execute (
+            select (
+            models .StockMovement .product_id ,
+            models .StockMovement .quantity_before ,
+            models .StockMovement .quantity_change ,
+            models .StockMovement .quantity_after ,
+            ).where (models .StockMovement .user_id ==user .id ).order_by (models .StockMovement .id )
+            )).all ()
+            return result ,stock ,[tuple (m )for m in movements ]
+
+    result ,stock ,movements =run (ingest )
+    assert (result ['sales_created'],result ['total_rows_processed'])==(2 ,8 )
+    assert result ['errors']==[
+    "Row 3: Product with SKU 'NOPE' not found for user",
+    "Row 4: Invalid quantity 'x' - must be a number",
+    "Row 5: Insufficient stock (available: 6, requested: 7)",
+    "Row 6: No SKU in CSV and no product_id/sku provided in upload request",
+    "Row 7: Quantity must be positive, got 0",
+    "Row 8: Invalid date format '2025-13-45'. Use YYYY-MM-DD format.",
+    ]
+    assert (stock ['SKU1'],stock ['SKU2'])==(0 ,10 )
+    assert movements ==[(products ['SKU1'],10 ,-4 ,6 ),(products ['SKU1'],6 ,-6 ,0 )]
+
+
+def test_upload_form_product_applies_to_rows_without_sku (client ,run ,user ,products ):
+    csv =b"quantity\n2\n3\n"
+    response =client .post ('/sales/upload',files ={'file':('sales.csv',csv )},data ={'sku':'SKU3'})
+    assert response .json ()['sales_created']==2 
+
+    async def quantity ():
+        async with async_session ()as db :
+            return await db .get (models .Product ,products ['SKU3'])
+
+    assert run (quantity ).quantity ==5 
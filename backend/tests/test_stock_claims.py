@@ -0,0 +1,59 @@
+from sqlalchemy import delete ,select 
+
+from app import models 
+from app .database import async_session 
+from app .utils import sales_ingest 
+from app .utils .sales_ingest import SalesIngestor 
+
+
+def delete_before_first_claim (monkeypatch ,product_id ):
+    """Make a concurrent request delete `product_id` right before the first stock claim."""
+    apply =sales_ingest .apply_quantity_deltas 
+    calls =[]
+
+    async def racing_apply (db ,deltas ,require_stock =False ,lock =False ):
+        if require_stock and not calls :
+            async with async_session ()as other :
+                await other .execute (delete (models .Product ).where (models .Product .id ==product_id ))
+                await other .commit ()
+        calls .append (dict (deltas ))
+        return await apply (db ,deltas ,require_stock =require_stock ,lock =lock )
+
+    monkeypatch .setattr (sales_ingest ,'apply_quantity_deltas',racing_apply )
+    return calls 
+
+
+def test_csv_claim_reports_products_deleted_concurrently (monkeypatch ,run ,user ,products ):
+    calls =delete_before_first_claim (monkeypatch ,products ['SKU2'])
+
+    async def ingest ():
+        async with async_session ()as db :
+            ingestor =SalesIngestor (db ,user .id )
+            await ingestor .add_row (2 ,{'sku':'SKU1','quantity':'2'})
+            await ingestor .add_row (3 ,{'sku':'SKU2','quantity':'1'})
+            result =await ingestor .finish ()
+            await db .commit ()
+            quantity =await db .scalar (select (models .Product .quantity ).where (models .Product .id ==products ['SKU1']))
+            return result ,quantity 
+
+    result ,quantity =run (ingest )
+    assert result ['sales_created']==1 
+    assert result ['errors']==[f"Row 3: Product with ID {products ['SKU2']} not found"]
+    assert quantity ==8 
+    assert len ([c for c in calls if all (v <0 for v in c .values ())])==2 
+
+
+def test_sale_batch_claim_reports_products_deleted_concurrently (monkeypatch ,client ,user ,products ):
+    calls =delete_before_first_claim (monkeypatch ,products ['SKU3'])
+    items =[
+    {'product_id':products ['SKU1'],'quantity':4 },
+    {'product_id':products ['SKU3'],'quantity':2 },
+    {'product_id':products ['SKU1'],'quantity':3 },
+    ]
+    response =client .post ('/sales/batch',json ={'items':items })
+    assert response .status_code ==200 
+    body =response .json ()
+    assert body ['sales_created']==2 
+    assert [r ['error']for r in body ['results']]==[None ,'Product not found',None ]
+    assert [r ['quantity_after']for r in body ['results']]==[6 ,None ,3 ]
+    assert calls [0 ]=={products ['SKU1']:-7 ,products ['SKU3']:-2 }
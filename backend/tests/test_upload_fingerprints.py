@@ -0,0 +1,58 @@
+import uuid 
+
+from sqlalchemy import func ,select 
+
+from app import models 
+from app .database import async_session 
+
+
+def product_csv ():
+    sku =f"FP-{uuid .uuid4 ().hex [:8 ]}"
+    return f"name,sku,price,quantity\nWidget,{sku },4.5,7\n".encode ()
+
+
+def test_same_products_file_is_a_duplicate (client ,user ):
+    csv =product_csv ()
+    first =client .post ('/products/upload',files ={'file':('p.csv',csv )},data ={'mode':'bulk'})
+    again =client .post ('/products/upload',files ={'file':('p.csv',csv )},data ={'mode':'bulk'})
+    assert first .json ()['created']==1 
+    assert again .json ()['duplicate']is True 
+    assert again .json ()['created']==1 
+
+
+def test_products_file_with_other_options_is_imported_again (client ,user ):
+    csv =product_csv ()
+    client .post ('/products/upload',files ={'file':('p.csv',csv )},data ={'mode':'bulk'})
+    update =client .post ('/products/upload',files ={'file':('p.csv',csv )},
+    data ={'mode':'bulk','on_conflict':'update'})
+    sync =client .post ('/products/upload',files ={'file':('p.csv',csv )},data ={'mode':'sync'})
+    assert 'duplicate'not in update .json ()
+    assert update .json ()['updated']==1 
+    assert 'duplicate'not in sync .json ()
+    assert sync .json ()['unchanged']==1 
+
+
+def test_sales_file_for_another_product_is_not_a_duplicate (client ,run ,user ,products ):
+    csv =b"quantity,date\n2,2025-01-05\n"
+    first =client .post ('/sales/upload',files ={'file':('s.csv',csv )},data ={'product_id':products ['SKU1']})
+    other =client .post ('/sales/upload',files ={'file':('s.csv',csv )},data ={'product_id':products ['SKU2']})
+    again =client .post ('/sales/upload',files ={'file':('s.csv',csv )},data ={'sku':'SKU2'})
+    assert first .json ()['sales_created']==1 
+    assert other .json ()['sales_created']==1 
+    assert again .json ()['sales_created']==1 
+    assert 'duplicate'not in again .json ()
+
+    async def quantities ():
+        async with async_session ()as db :
+            rows =await db .execute (
+            select (models .Product .sku ,models .Product .quantity ).where (models .Product .user_id ==user .id )
+            )
+            imports =await db .scalar (
+            select (func .count ()).select_from (models .CompletedImport ).where (models .CompletedImport .user_id ==user .id )
+            )
+            return dict (rows .all ()),imports 
+
+    stock ,imports =run (quantities )
+    assert stock ['SKU1']==8 
+    assert stock ['SKU2']==6 
+    assert imports ==3 
@@ -0,0 +1,86 @@
+import os 
+from datetime import date ,datetime ,timedelta 
+
+from sqlalchemy import select ,update 
+
+from app import models 
+from app .database import async_session 
+from app .utils import upload_sessions 
+
+
+def start_session (client ,**data ):
+    response =client .post ('/sales/upload/sessions',data =data )
+    assert response .status_code ==201 
+    return response .json ()['session_id']
+
+
+def put_chunk (client ,session_id ,offset ,chunk ):
+    return client .put (f"/sales/upload/sessions/{session_id }/chunks",data ={'offset':offset },
+    files ={'chunk':('chunk.csv',chunk )})
+
+
+def test_later_chunks_keep_the_date_format_of_the_first (client ,run ,user ,products ):
+    first =b"sku,quantity,date\nSKU1,1,13/02/2024\nSKU1,1,01/02/2024\n"
+    second =b"SKU2,1,01/02/2024\nSKU2,1,02/03/2024\n"
+    session_id =start_session (client )
+    assert put_chunk (client ,session_id ,0 ,first ).status_code ==200 
+    assert put_chunk (client ,session_id ,len (first ),second ).status_code ==200 
+    done =client .post (f"/sales/upload/sessions/{session_id }/complete",data ={'size':len (first )+len (second )})
+    assert done .json ()['sales_created']==4 
+
+    async def sale_days ():
+        async with async_session ()as db :
+            rows =await db .execute (
+            select (models .ProductSale .product_id ,models .ProductSale .sale_date )
+            .where (models .ProductSale .user_id ==user .id )
+            .order_by (models .ProductSale .id )
+            )
+            return [(pid ,moment .date ())for pid ,moment in rows .all ()]
+
+    assert run (sale_days )==[
+    (products ['SKU1'],date (2024 ,2 ,13 )),
+    (products ['SKU1'],date (2024 ,2 ,1 )),
+    (products ['SKU2'],date (2024 ,2 ,1 )),
+    (products ['SKU2'],date (2024 ,3 ,2 )),
+    ]
+
+
+def test_stored_errors_are_capped (monkeypatch ,client ,user ):
+    monkeypatch .setattr (upload_sessions ,'MAX_SESSION_ERRORS',2 )
+    first =b"sku,quantity\nSKU1,0\nNOPE,1\n"
+    second =b"SKU1,x\nSKU1,2\n"
+    session_id =start_session (client )
+    put_chunk (client ,session_id ,0 ,first )
+    summary =put_chunk (client ,session_id ,len (first ),second ).json ()
+    assert summary ['sales_created']==1 
+    assert summary ['errors_total']==3 
+    assert summary ['errors']==[
+    "Row 2: Quantity must be positive, got 0",
+    "Row 3: Product with SKU 'NOPE' not found for user",
+    ]
+
+
+def test_idle_open_sessions_expire (client ,run ,user ):
+    idle_id =start_session (client )
+    put_chunk (client ,idle_id ,0 ,b"sku,quantity\nSKU1,1\n")
+    busy_id =start_session (client )
+    long_ago =datetime .now ()-upload_sessions .UPLOAD_SESSION_TTL -timedelta (hours =1 )
+
+    async def backdate ():
+        async with async_session ()as db :
+            await db .execute (
+            update (models .SalesUploadSession )
+            .where (models .SalesUploadSession .id .in_ ([idle_id ,busy_id ]))
+            .values (updated_at =long_ago )
+            )
+            await db .commit ()
+
+    run (backdate )
+    idle_file =os .path .join (upload_sessions .UPLOAD_SESSION_DIR ,f"{idle_id }.csv")
+    os .utime (idle_file ,(long_ago .timestamp (),long_ago .timestamp ()))
+
+    start_session (client )
+    assert not os .path .exists (idle_file )
+    assert client .get (f"/sales/upload/sessions/{idle_id }").json ()['status']=='expired'
+    assert put_chunk (client ,idle_id ,20 ,b"SKU1,1\n").status_code ==409 
+    assert client .get (f"/sales/upload/sessions/{busy_id }").json ()['status']=='open'